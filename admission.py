@@ -0,0 +1,187 @@
+"""Admission control for the LLM-backed routes.
+
+RateLimiter
+    Token buckets per client (IP address, and session when the client sends
+    one). A client over its rate is refused with 429 and told when a token
+    will be available. Behind reverse proxies the address is taken from
+    X-Forwarded-For, trusting as many entries as there are proxies.
+
+AdmissionController
+    Caps the upstream calls in flight, globally and per feature, so a burst
+    of form uploads cannot take every slot from /chat. Requests that find
+    no free slot wait in a bounded FIFO queue; when the queue is full, or the
+    wait runs past queue_timeout, they are shed with 503 rather than left to
+    time out. Sync and async callers share the same slots.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class Rejected(Exception):
+    def __init__(self, status, message, retry_after, reason):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+class RateLimiter:
+    def __init__(self, per_minute, burst, max_clients=100000):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def check(self, *clients):
+        """Take a token from every client's bucket, or raise Rejected (429)."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            buckets = []
+            for client in clients:
+                tokens, updated = self._buckets.pop(client, (self.burst, now))
+                buckets.append((client, min(self.burst, tokens + (now - updated) * self.rate)))
+            wait = max((1 - tokens) / self.rate for _, tokens in buckets)
+            for client, tokens in buckets:
+                self._buckets[client] = (tokens - 1 if wait <= 0 else tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        if wait > 0:
+            raise Rejected(429, 'Too many requests, please slow down', wait, 'rate_limited')
+
+
+class _Waiter:
+    def __init__(self, feature, loop=None):
+        self.feature = feature
+        self.granted = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def grant(self):
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent, feature_limits=None, queue_size=64, queue_timeout=10.0):
+        self.max_concurrent = max_concurrent
+        self.feature_limits = dict(feature_limits or {})
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._active_by_feature = {}
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def _can_run(self, feature):
+        return (self.active < self.max_concurrent
+                and self._active_by_feature.get(feature, 0) < self.feature_limits.get(feature, math.inf))
+
+    def _take(self, feature):
+        self.active += 1
+        self._active_by_feature[feature] = self._active_by_feature.get(feature, 0) + 1
+
+    def _enter(self, feature, loop=None):
+        # Returns None when admitted straight away, else the queued waiter
+        with self._lock:
+            if self._can_run(feature):
+                self._take(feature)
+                return None
+            if len(self._waiters) >= self.queue_size:
+                raise Rejected(503, 'Server is busy, please try again shortly', self.queue_timeout, 'queue_full')
+            waiter = _Waiter(feature, loop)
+            self._waiters.append(waiter)
+            return waiter
+
+    def _abandon(self, waiter):
+        # True if the slot was granted while the waiter was giving up
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def _timed_out(self):
+        return Rejected(503, 'Server is busy, please try again shortly', self.queue_timeout, 'queue_timeout')
+
+    def acquire(self, feature):
+        """Take a slot for feature, waiting in the queue if needed; raises Rejected (503)."""
+        waiter = self._enter(feature)
+        if waiter is not None and not waiter.event.wait(self.queue_timeout) and not self._abandon(waiter):
+            raise self._timed_out()
+
+    async def acquire_async(self, feature):
+        waiter = self._enter(feature, asyncio.get_running_loop())
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not self._abandon(waiter):
+                raise self._timed_out()
+        except asyncio.CancelledError:
+            # The client went away; hand back a slot granted in the meantime
+            if self._abandon(waiter):
+                self.release(feature)
+            raise
+
+    def release(self, feature):
+        with self._lock:
+            self.active -= 1
+            self._active_by_feature[feature] -= 1
+            # Hand the freed slot to the longest-waiting request that can use it
+            for waiter in self._waiters:
+                if self._can_run(waiter.feature):
+                    self._waiters.remove(waiter)
+                    self._take(waiter.feature)
+                    waiter.grant()
+                    break
+
+
+def parse_limits(spec, cast=int):
+    """'form=4,chat=16' -> {'form': 4, 'chat': 16}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        feature, _, limit = item.partition('=')
+        limits[feature.strip()] = cast(limit)
+    return limits
+
+
+def forwarded_address(address, forwarded_for, trusted_proxies):
+    """The client address behind trusted_proxies reverse proxies, each appending to X-Forwarded-For."""
+    # As werkzeug's ProxyFix: entries beyond the trusted hops may be forged
+    if not trusted_proxies or not forwarded_for:
+        return address
+    hops = [hop.strip() for hop in forwarded_for.split(',')]
+    return hops[-trusted_proxies] if len(hops) >= trusted_proxies else address
+
+
+def client_keys(address, session_id=None):
+    """Rate-limit buckets a request draws from: its address, and its session if it names one."""
+    keys = [('ip', address)]
+    if session_id:
+        keys.append(('session', session_id[:128]))
+    return keys
@@ -0,0 +1,340 @@
+"""Answer packs: pregenerated answers to the standard questions of the guide pages.
+
+The guide routes (savings, fixed deposit, current account, ATM and
+insurance) mostly get the same few dozen questions. The build command asks
+each curated question in every supported locale, through the same prompts
+and system instructions as the live routes, and writes the answers to one
+pack file. The server memory-maps the pack and answers a question that
+matches one in it (after casefolding and dropping punctuation) without
+calling Gemini.
+
+A pack is one little-endian file: a header (magic, format version, entry
+count, metadata length), the metadata as JSON, the entries' 64-bit key
+hashes in sorted order, their offsets, and a blob of records, each the full
+key and the answer in UTF-8. A lookup is a binary search over the mapped
+hashes and a comparison of the record's key, so loading a pack reads only
+its header and worker processes share one copy through the page cache.
+
+The metadata records a digest of each (feature, language) prompt template
+and system instruction the answers were generated with. Answers whose
+prompts have changed since are not served. Packs are replaced by writing a
+new file and renaming it over the old one; the server notices the new file
+within check_interval seconds and switches to it without a restart.
+
+    python answers.py build data/answer_questions.json [--out cache/answers.pack] [--concurrency 8]
+    python answers.py show [--pack cache/answers.pack]
+    python answers.py lookup savings hi-IN "How do I open a savings account?"
+
+The questions file maps each feature to a list of questions, asked in every
+locale, or to an object mapping locales to their own lists.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+import metrics
+import prompts
+from faq import normalize
+
+logger = logging.getLogger(__name__)
+
+PACK_MAGIC = b'AAPK'
+PACK_VERSION = 1
+_HEADER = struct.Struct('<4sIII')
+_SEPARATOR = '\x1f'
+
+
+def pack_key(feature, language, question):
+    return f"{feature}{_SEPARATOR}{language}{_SEPARATOR}{normalize(question)}"
+
+
+def _key_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def prompt_digest(instruction, template):
+    """Digest of what a feature's answers depend on besides the question."""
+    return hashlib.sha256(f"{instruction or ''}\x00{template or ''}".encode('utf-8')).hexdigest()[:16]
+
+
+def write_pack(path, answers, meta):
+    """Writes {key: answer} to path, replacing any pack there in one rename."""
+    keyed = sorted((_key_hash(key), key, answer) for key, answer in answers.items())
+    records = [f"{key}\x00{answer}".encode('utf-8') for _, key, answer in keyed]
+    offsets = np.zeros(len(records) + 1, dtype='<u8')
+    offsets[1:] = np.cumsum([len(record) for record in records], dtype=np.uint64)
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    meta_bytes += b' ' * (-(_HEADER.size + len(meta_bytes)) % 8)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, 'wb') as f:
+        f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(records), len(meta_bytes)))
+        f.write(meta_bytes)
+        f.write(np.array([key for key, _, _ in keyed], dtype='<u8').tobytes())
+        f.write(offsets.tobytes())
+        for record in records:
+            f.write(record)
+    os.replace(temp, path)
+
+
+class AnswerPack:
+    """A pack file, memory-mapped read-only."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size:
+            raise ValueError(f"{path} is not an answer pack")
+        magic, version, count, meta_size = _HEADER.unpack_from(self._map)
+        if magic != PACK_MAGIC:
+            raise ValueError(f"{path} is not an answer pack")
+        if version != PACK_VERSION:
+            raise ValueError(f"{path} is pack format {version}; this server reads format {PACK_VERSION}")
+        start = _HEADER.size
+        self.meta = json.loads(self._map[start:start + meta_size])
+        start += meta_size
+        self._keys = np.frombuffer(self._map, dtype='<u8', count=count, offset=start)
+        start += 8 * count
+        self._offsets = np.frombuffer(self._map, dtype='<u8', count=count + 1, offset=start)
+        self._blob = start + 8 * (count + 1)
+        if self._blob + (int(self._offsets[-1]) if count else 0) > len(self._map):
+            raise ValueError(f"{path} is truncated")
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _record(self, i):
+        return self._map[self._blob + int(self._offsets[i]):self._blob + int(self._offsets[i + 1])]
+
+    def get(self, key):
+        """The answer stored under key (see pack_key), or None."""
+        target = np.uint64(_key_hash(key))
+        encoded = key.encode('utf-8') + b'\x00'
+        i = int(np.searchsorted(self._keys, target))
+        while i < len(self._keys) and self._keys[i] == target:
+            record = self._record(i)
+            if record.startswith(encoded):
+                return record[len(encoded):].decode('utf-8')
+            i += 1
+        return None
+
+    def items(self):
+        for i in range(len(self._keys)):
+            key, answer = self._record(i).decode('utf-8').split('\x00', 1)
+            yield key, answer
+
+
+class PackedAnswers:
+    """Serves lookups from the pack at path, switching to a new file when it is replaced.
+
+    digests maps (feature, language) to the current prompt_digest; answers
+    generated with other prompts are not served.
+    """
+
+    def __init__(self, path, digests, check_interval=5.0):
+        self.path = path
+        self.digests = digests
+        self.check_interval = check_interval
+        # The pack and the (feature, language) pairs it may answer, swapped together
+        self._state = (None, frozenset())
+        self._signature = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._check()
+
+    def __len__(self):
+        pack, _ = self._state
+        return 0 if pack is None else len(pack)
+
+    def lookup(self, feature, language, question):
+        if self.check_interval and time.monotonic() >= self._next_check:
+            self._check()
+        pack, current = self._state
+        if pack is None or (feature, language) not in current:
+            return None
+        return pack.get(pack_key(feature, language, question))
+
+    def _check(self):
+        # One thread looks at the file; the others keep using the pack they have
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                stat = os.stat(self.path)
+                signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            except FileNotFoundError:
+                signature = None
+            if signature != self._signature:
+                self._signature = signature
+                self._load()
+        finally:
+            self._lock.release()
+
+    def _load(self):
+        if self._signature is None:
+            if self._state[0] is not None:
+                logger.warning(f"Answer pack {self.path} was removed; answering live")
+            self._state = (None, frozenset())
+            return
+        try:
+            pack = AnswerPack(self.path)
+        except (OSError, ValueError) as e:
+            # Keep serving the previous pack until a good one replaces it
+            logger.error(f"Could not load answer pack {self.path}: {e}")
+            metrics.ANSWER_PACK_LOADS.inc(result='failed')
+            return
+        current, stale = set(), []
+        for name, digest in pack.meta.get('prompts', {}).items():
+            feature, language = name.split('|')
+            if self.digests.get((feature, language)) == digest:
+                current.add((feature, language))
+            else:
+                stale.append(name)
+        if stale:
+            logger.warning(f"Answer pack {self.path} has answers from older prompts for {', '.join(sorted(stale))}; "
+                           f"those are answered live until the pack is rebuilt")
+        # Readers holding the old pack finish with it; its mapping is closed
+        # once the last reference goes
+        self._state = (pack, frozenset(current))
+        metrics.ANSWER_PACK_LOADS.inc(result='loaded')
+        logger.info(f"Loaded answer pack {self.path}: {len(pack)} answers built {pack.meta.get('built', '?')}")
+
+
+def read_questions(path, languages):
+    """(feature, language, question) for each curated question, in each of its locales."""
+    with open(path, encoding='utf-8') as f:
+        curated = json.load(f)
+    for feature, questions in curated.items():
+        by_language = {language: questions for language in languages} if isinstance(questions, list) else questions
+        for language, items in by_language.items():
+            if language in languages:
+                for question in items:
+                    if question.strip():
+                        yield feature, language, question
+
+
+def build(args):
+    # The live app supplies the prompts, models and backend
+    os.environ.setdefault('AUDIT_LOG', '0')
+    os.environ['LLM_PRELOAD'] = '0'
+    import app as site
+    site.create_app()
+    logging.getLogger('PyPDF2').setLevel(logging.ERROR)
+    if site.app.config['LLM_BACKEND'] == 'gemini' and not site.app.config['GOOGLE_API_KEY']:
+        sys.exit("GOOGLE_API_KEY is not set (or use LLM_BACKEND=stub for a test pack)")
+
+    languages = args.languages.split(',') if args.languages else list(prompts.LANGUAGES)
+    items = list(read_questions(args.questions, languages))
+    unknown = sorted({feature for feature, _, _ in items} - set(site.PACK_FEATURES))
+    if unknown:
+        sys.exit(f"Not a guide feature: {', '.join(unknown)} (choose from {', '.join(site.PACK_FEATURES)})")
+    digests = site.pack_digests()
+    previous = None
+    if not args.fresh and os.path.exists(args.out):
+        try:
+            previous = AnswerPack(args.out)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Not reusing {args.out}: {e}")
+
+    answers, todo = {}, {}
+    for feature, language, question in items:
+        key = pack_key(feature, language, question)
+        if key in answers or key in todo:
+            continue
+        reused = None
+        if previous is not None and previous.meta.get('prompts', {}).get(f"{feature}|{language}") == digests[(feature, language)]:
+            reused = previous.get(key)
+        if reused is not None:
+            answers[key] = reused
+        else:
+            todo[key] = (feature, language, question)
+
+    def generate(item):
+        # On the feature's registered profile, never the light tier: each
+        # answer is generated once and served many times
+        call = site.pack_call(*item)
+        return site.llm.generate(call.feature, call.language, call.prompt).text
+
+    print(f"{len(answers) + len(todo)} questions: {len(answers)} reused, {len(todo)} to generate "
+          f"with concurrency {args.concurrency} on the {site.app.config['LLM_BACKEND']} backend")
+    started = time.perf_counter()
+    failed = 0
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        futures = {pool.submit(generate, item): key for key, item in todo.items()}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                answers[futures[future]] = future.result()
+            except Exception as e:
+                failed += 1
+                feature, language, question = todo[futures[future]]
+                logger.error(f"No answer for {feature} {language} {question!r}: {e}")
+            if done % 50 == 0:
+                print(f"  {done}/{len(futures)}")
+    if not answers:
+        sys.exit("No answers to write")
+
+    pairs = sorted({tuple(key.split(_SEPARATOR, 2)[:2]) for key in answers})
+    meta = {'built': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'backend': site.app.config['LLM_BACKEND'],
+            'questions': os.path.basename(args.questions),
+            'prompts': {f"{feature}|{language}": digests[(feature, language)] for feature, language in pairs}}
+    write_pack(args.out, answers, meta)
+    print(f"{len(todo) - failed} generated, {failed} failed in {time.perf_counter() - started:.1f} s; "
+          f"wrote {len(answers)} answers to {args.out} ({os.path.getsize(args.out) / 1024:.0f} KB)")
+    if failed:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help='generate answers to the curated questions into a pack')
+    build_parser.add_argument('questions', nargs='?', default=os.path.join('data', 'answer_questions.json'))
+    build_parser.add_argument('--out', default=os.path.join('cache', 'answers.pack'))
+    build_parser.add_argument('--concurrency', type=int, default=8, help='LLM calls in flight at once')
+    build_parser.add_argument('--languages', help='comma-separated subset of locales')
+    build_parser.add_argument('--fresh', action='store_true', help='regenerate answers the current pack already has')
+    show = commands.add_parser('show', help='summarize a pack')
+    show.add_argument('--pack', default=os.path.join('cache', 'answers.pack'))
+    lookup = commands.add_parser('lookup', help='print the packed answer to a question')
+    lookup.add_argument('feature')
+    lookup.add_argument('language')
+    lookup.add_argument('question')
+    lookup.add_argument('--pack', default=os.path.join('cache', 'answers.pack'))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(message)s')
+
+    if args.command == 'build':
+        build(args)
+        return
+    pack = AnswerPack(args.pack)
+    if args.command == 'show':
+        counts = {}
+        for key, _ in pack.items():
+            pair = tuple(key.split(_SEPARATOR, 2)[:2])
+            counts[pair] = counts.get(pair, 0) + 1
+        print(f"{args.pack}: format {PACK_VERSION}, {len(pack)} answers, built {pack.meta.get('built')} "
+              f"on {pack.meta.get('backend')} from {pack.meta.get('questions')}")
+        for (feature, language), count in sorted(counts.items()):
+            print(f"  {feature:<16} {language}  {count}")
+        return
+    answer = pack.get(pack_key(args.feature, args.language, args.question))
+    if answer is None:
+        sys.exit("No packed answer")
+    print(answer)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,72 +1,700 @@
-from flask import Flask, render_template, request, jsonify
-import google.generativeai as genai
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context, url_for
+from flask.json.provider import DefaultJSONProvider
 from dotenv import load_dotenv
 import os
-from google.api_core.exceptions import GoogleAPIError
-from werkzeug.exceptions import BadRequest, InternalServerError
+from werkzeug.exceptions import BadRequest, InternalServerError, NotFound
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
-import PyPDF2
-import io
-
-# Load environment variables from .env file
-load_dotenv()
+import atexit
+import json
+import contextvars
+import mimetypes
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from admission import AdmissionController, RateLimiter, Rejected, client_keys, parse_limits
+from answers import PackedAnswers, prompt_digest
+from audit import AuditLog, normalize_input
+from cache import FormCache, create_cache, make_key
+from faq import FaqIndex
+from jobs import FINISHED, JobQueue, create_job_store
+from knowledge import KnowledgeBase, describe_branches, describe_schemes, resolve_state
+from extraction import ImageOcr, PdfExtractor, ocr_languages
+from llm import Completion, ModelRegistry, create_backend, LONG_PROFILE
+import metrics
+import microloan
+from pages import PageStore
+import prompts
+import upstream
+from resilience import CircuitBreaker, ResilientBackend
+from router import ModelRouter
+from sessions import ChatSessions, create_session_store, format_turns
+from singleflight import SingleFlight
+from tokens import estimate_tokens, split_fields
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# Configure Gemini API
-try:
-    api_key = os.getenv('GOOGLE_API_KEY')
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY not found in .env file")
-    genai.configure(api_key=api_key)
-except ValueError as e:
-    print(f"Configuration error: {e}")
-    raise
-except Exception as e:
-    print(f"Failed to configure Gemini API: {e}")
-    raise
-
-# Supported languages and instructions
-language_instructions = {
-    "en-US": "You are a friendly financial advisor for Indian villagers with no prior financial knowledge. Provide simple, detailed, and patient responses in English related to financial planning, loans, investments, and banking, using examples relevant to rural life (e.g., farming loans, savings for crops). Explain basic concepts step-by-step, assuming the user knows nothing about finance. Do not answer queries unrelated to finance or loans; politely redirect to financial topics with encouragement to learn.",
-    "hi-IN": "आप एक मित्रवत वित्तीय सलाहकार हैं जो भारतीय ग्रामीणों के लिए हैं, जिन्हें वित्त का कोई पूर्व ज्ञान नहीं है। हिंदी में वित्तीय नियोजन, ऋण, निवेश और बैंकिंग से संबंधित सरल, विस्तृत और धैर्यपूर्ण उत्तर दें, ग्रामीण जीवन (जैसे खेती के ऋण, फसलों के लिए बचत) से संबंधित उदाहरणों का उपयोग करें। बुनियादी अवधारणाओं को चरण-दर-चरण समझाएं, यह मानते हुए कि उपयोगकर्ता को वित्त के बारे में कुछ भी नहीं पता है। वित्त या ऋण से असंबंधित प्रश्नों का उत्तर न दें; विनम्रता से वित्तीय विषयों की ओर पुनर्निर्देशित करें और सीखने के लिए प्रोत्साहित करें।",
-    "kn-IN": "ನೀವು ಭಾರತೀಯ ಗ್ರಾಮೀಣರಿಗಾಗಿ ಸ್ನೇಹಶೀಲ ಆರ್ಥಿಕ ಸಲಹೆಗಾರರಾಗಿದ್ದೀರಿ, ಅವರಿಗೆ ಆರ್ಥಿಕತೆಯ ಬಗ್ಗೆ ಯಾವುದೇ ಮುಂಚಿನ ಜ್ಞಾನ ಇಲ್ಲ. ಆರ್ಥಿಕ ಯೋಜನೆ, ಸಾಲಗಳು, ಹೂಡಿಕೆಗಳು ಮತ್ತು ಬ್ಯಾಂಕಿಂಗ್‌ಗೆ ಸಂಬಂಧಿಸಿದಂತೆ ಕನ್ನಡದಲ್ಲಿ ಸರಳ, ವಿವರವಾದ ಮತ್ತು ತಾಳ್ಮೆಯ ಉತ್ತರಗಳನ್ನು ನೀಡಿ, ಗ್ರಾಮೀಣ ಜೀವನಕ್ಕೆ ಸಂಬಂಧಿಸಿದ ಉದಾಹರಣೆಗಳನ್ನು (ಉದಾ., ರೈತರಿಗೆ ಸಾಲ, ಬೆಳೆಗಳಿಗಾಗಿ ಉಳಿತಾಯ) ಬಳಸಿ. ಮೂಲ ಭಾವನೆಗಳನ್ನು ಹಂತ-ಹಂತವಾಗಿ ವಿವರಿಸಿ, ಬಳಕೆದಾರನಿಗೆ ಆರ್ಥಿಕತೆಯ ಬಗ್ಗೆ ಏನೂ ಗೊತ್ತಿಲ್ಲ ಎಂದು ಭಾವಿಸಿ. ಹಣಕಾಸು ಅಥವಾ ಸಾಲಕ್ಕೆ ಸಂಬಂಧಿಸದ ಪ್ರಶ್ನೆಗಳಿಗೆ ಉತ್ತರಿಸಬೇಡಿ; ಆರ್ಥಿಕ ವಿಷಯಗಳಿಗೆ ಸೌಜನ್ಯದಿಂದ ಮರುನಿರ್ದೇಶಿಸಿ ಮತ್ತು ಕಲಿಯಲು ಪ್ರೋತ್ಸಾಹಿಸಿ.",
-    "ta-IN": "நீங்கள் இந்திய கிராமவாசிகளுக்காக உள்ள நட்பு நிதி ஆலோசகர், அவர்களுக்கு நிதி பற்றிய முந்தைய அறிவு இல்லை. நிதி திட்டமிடல், கடன்கள், முதலீடுகள் மற்றும் வங்கி சேவைகள் தொடர்பாக தமிழில் எளிமையான, விரிவான மற்றும் பொறுமையான பதில்களை வழங்கவும், கிராமப்புற வாழ்க்கைக்கு தொடர்புடைய எடுத்துக்காட்டுகளை (எ.கா., விவசாய கடன்கள், பயிர்களுக்கான சேமிப்பு) பயன்படுத்தவும். அடிப்படை கருத்துகளை படி-படியாக விளக்கவும், பயனருக்கு நிதி பற்றி எதுவும் தெரியாது என்று கருதவும். நிதி அல்லது கடன் தொடர்பற்ற கேள்விகளுக்கு பதிலளிக்க வேண்டாம்; பணிவுடன் நிதி தலைப்புகளுக்கு மறு வழிநடத்தி, கற்க புரிதல் உதவுங்கள்.",
-    "te-IN": "మీరు భారతీయ గ్రామస్తుల కోసం స్నేహపూర్వకమైన ఆర్థిక సలహాదారుడు, వీరికి ఆర్థిక జ్ఞానం లేదు. ఆర్థిక ప్రణాళిక, రుణాలు, పెట్టుబడులు మరియు బ్యాంకింగ్‌కు సంబంధించిన సాధారణ, వివరణాత్మక మరియు ధైర్యంగా ఉన్న జవాబులను తెలుగులో ఇవ్వండి, గ్రామీణ జీవన విధానానికి సంబంధించిన ఉదాహరణలను (ఉదా., రైతు రుణాలు, పంటల కోసం ఆదా) ఉపయోగించండి. మౌలిక భావనలను దశ-దశల వారీగా వివరించండి, వినియోగదారుడు ఆర్థిక విషయాల గురించి ఏమీ తెలియదని భావించండి. ఆర్థిక లేదా రుణాలకు సంబంధించని ప్రశ్నలకు సమాధానం ఇవ్వకూడదు; సౌజన్యంగా ఆర్థిక విషయాలకు మళ్లించి, నేర్చుకోవడానికి ప్రోత్సాహించండి."
-}
-
-language_instructions2 = {
-    "en-US": "You are a helpful assistant for Indian villagers with no prior financial knowledge. Extract key information (e.g., account number, name, address, date) from a bank-related form provided as text. Provide step-by-step guidance in English on how to fill out the form, using simple language and examples relevant to rural life (e.g., filling details for a farming loan). Assume the user knows nothing about forms.",
-    "hi-IN": "आप भारतीय ग्रामीणों के लिए एक सहायक हैं जिनका वित्तीय ज्ञान नहीं है। बैंक से संबंधित फॉर्म से मुख्य जानकारी (जैसे खाता संख्या, नाम, पता, तारीख) निकालें जो टेक्स्ट के रूप में प्रदान की गई है। हिंदी में फॉर्म भरने के लिए चरण-दर-चरण मार्गदर्शन करें, ग्रामीण जीवन (जैसे खेती के ऋण के लिए विवरण भरना) से संबंधित उदाहरणों का उपयोग करें। मान लें कि उपयोगकर्ता को फॉर्म के बारे में कुछ भी नहीं पता है।",
-    "kn-IN": "ನೀವು ಭಾರತೀಯ ಗ್ರಾಮೀಣರಿಗಾಗಿ ಸಹಾಯಕ ಸಹಾಯಕರಾಗಿದ್ದೀರಿ, ಅವರಿಗೆ ಆರ್ಥಿಕ ಜ್ಞಾನ ಇಲ್ಲ. ಬ್ಯಾಂಕ್ ಸಂಬಂಧಿತ ಫಾರ್ಮ್‌ನಿಂದ ಪ್ರಮುಖ ಮಾಹಿತಿಗಳನ್ನು (ಉದಾ., ಖಾತೆ ಸಂಖ್ಯೆ, ಹೆಸರು, ವಿಳಾಸ, ದಿನಾಂಕ) ಟೆಕ್ಸ್ಟ್ ರೂಪದಲ್ಲಿ ಒದಗಿಸಲಾಗಿದೆ. ಕನ್ನಡದಲ್ಲಿ ಫಾರ್ಮ್ ಭರ್ತಿ ಮಾಡುವ ಬಗ್ಗೆ ಹಂತ-ಹಂತದ ಮಾರ್ಗದರ್ಶನವನ್ನು ಒದಗಿಸಿ, ಗ್ರಾಮೀಣ ಜೀವನಕ್ಕೆ ಸಂಬಂಧಿಸಿದ ಉದಾಹರಣೆಗಳನ್ನು (ಉದಾ., ರೈತರಿಗೆ ಸಾಲದ ವಿವರಗಳನ್ನು ಭರ್ತಿ) ಬಳಸಿ. ಬಳಕೆದಾರನಿಗೆ ಫಾರ್ಮ್‌ಗಳ ಬಗ್ಗೆ ಏನೂ ಗೊತ್ತಿಲ್ಲ ಎಂದು ಭಾವಿಸಿ.",
-    "ta-IN": "நீங்கள் இந்திய கிராமவாசிகளுக்கு உதவி செய்யும் உதவியாளர், அவர்களுக்கு நிதி அறிவு இல்லை. வங்கி தொடர்பான படிவத்திலிருந்து முக்கிய தகவல்களை (எ.கா., கணக்கு எண், பெயர், முகவரி, தேதி) உரையாக வழங்கப்பட்டுள்ளது. தமிழில் படிவத்தை எப்படி நிரப்புவது என்பது பற்றி படி-படியாக வழிகாட்டுதலை வழங்கவும், கிராமப்புற வாழ்க்கைக்கு தொடர்புடைய எடுத்துக்காட்டுகளை (எ.கா., விவசாய கடன் விவரங்களை நிரப்புதல்) பயன்படுத்தவும். பயனருக்கு படிவங்கள் பற்றி எதுவும் தெரியாது என்று கருதவும்.",
-    "te-IN": "మీరు భారతీయ గ్రామస్తులకు సహాయపడే సహాయకుడు, వీరికి ఆర్థిక జ్ఞానం లేదు. బ్యాంక్ సంబంధిత ఫారమ్ నుండి ముఖ్య సమాచారాన్ని (ఉదా., ఖాతా సంఖ్య, పేరు, చిరునామా, తేదీ) టెక్స్ట్ రూపంలో అందించబడింది. తెలుగులో ఫారమ్ ఎలా పూరించాలో దశ-దశల వారీగా మార్గదర్శకం ఇవ్వండి, గ్రామీణ జీవన విధానానికి సంబంధించిన ఉదాహరణలను (ఉదా., రైతు రుణ వివరాలను పూరించడం) ఉపయోగించండి. బಳకాలకు ఫారమ్‌ల గురించి ఏమీ తెలియదని భావించండి."
-}
-
-# ATM-specific system instruction
-atm_instructions = {
-    "en-US": "You are a helpful assistant for Indian villagers with no prior financial knowledge. The user will describe what they see on an ATM interface (e.g., 'I see buttons: withdraw, balance'). Provide step-by-step guidance in English on how to operate the ATM based on the user's description, using simple language and examples relevant to rural life (e.g., withdrawing money for a farming purchase). Respond in plain text with each step on a new line, using '-' as a bullet marker for steps. Do not use Markdown formatting like '**' or '*' for emphasis. Assume the user knows nothing about ATMs.",
-    "hi-IN": "आप भारतीय ग्रामीणों के लिए एक सहायक हैं जिनका वित्तीय ज्ञान नहीं है। उपयोगकर्ता एटीएम इंटरफेस पर जो देखता है उसे वर्णन करेगा (जैसे, 'मैं बटन देखता हूँ: निकासी, शेष राशि')। उपयोगकर्ता के विवरण के आधार पर एटीएम को संचालित करने के लिए हिंदी में चरण-दर-चरण मार्गदर्शन करें, ग्रामीण जीवन (जैसे, खेती के लिए पैसे निकालना) से संबंधित उदाहरणों का उपयोग करें। सादे टेक्स्ट में जवाब दें, प्रत्येक चरण को नई पंक्ति पर लिखें, चरणों के लिए '-' बुलेट मार्कर का उपयोग करें। मार्कडाउन फॉर्मेटिंग जैसे '**' या '*' का उपयोग न करें। मान लें कि उपयोगकर्ता को एटीएम के बारे में कुछ भी नहीं पता है।",
-    "kn-IN": "ನೀವು ಭಾರತೀಯ ಗ್ರಾಮೀಣರಿಗಾಗಿ ಸಹಾಯಕ ಸಹಾಯಕರಾಗಿದ್ದೀರಿ, ಅವರಿಗೆ ಆರ್ಥಿಕ ಜ್ಞಾನ ಇಲ್ಲ. ಬಳಕೆದಾರ ಏಟಿಎಂ ಇಂಟರ್‌ಫೇಸ್‌ನಲ್ಲಿ ಏನು ಕಾಣುತ್ತಾನೆ ಎಂದು ವಿವರಿಸುತ್ತಾನೆ (ಉದಾ., 'ನಾನು ಬಟನ್‌ಗಳನ್ನು ಕಾಣುತ್ತೇನೆ: ಹಿಂಪಡೆಯುವುದು, ಶೇಷ ಲೆಕ್ಕ'). ಬಳಕೆದಾರರ ವಿವರಣೆಯ ಆಧಾರದ ಮೇಲೆ ಏಟಿಎಂ ಅನ್ನು ಆಪರೇಟ್ ಮಾಡುವ ಬಗ್ಗೆ ಕನ್ನಡದಲ್ಲಿ ಹಂತ-ಹಂತದ ಮಾರ್ಗದರ್ಶನವನ್ನು ಒದಗಿಸಿ, ಗ್ರಾಮೀಣ ಜೀವನಕ್ಕೆ ಸಂಬಂಧಿಸಿದ ಉದಾಹರಣೆಗಳನ್ನು (ಉದಾ., ರೈತರಿಗಾಗಿ ಹಣವನ್ನು ಹಿಂಪಡೆಯುವುದು) ಬಳಸಿ. ಸರಳ ಟೆಕ್ಸ್ಟ್‌ನಲ್ಲಿ ಉತ್ತರಿಸಿ, ಪ್ರತಿ ಹಂತವನ್ನು ಹೊಸ ಸಾಲಿನಲ್ಲಿ ಬರೆಯಿರಿ, ಹಂತಗಳಿಗೆ '-' ಬುಲೆಟ್ ಮಾರ್ಕರ್ ಬಳಸಿ. '**' ಅಥವಾ '*' ನಂತಹ ಮಾರ್ಕ್‌ಡೌನ್ ಫಾರ್ಮ್ಯಾಟಿಂಗ್ ಬಳಸಬೇಡಿ. ಬಳಕೆದಾರನಿಗೆ ಏಟಿಎಂ ಬಗ್ಗೆ ಏನೂ ಗೊತ್ತಿಲ್ಲ ಎಂದು ಭಾವಿಸಿ.",
-    "ta-IN": "நீங்கள் இந்திய கிராமவாசிகளுக்கு உதவி செய்யும் உதவியாளர், அவர்களுக்கு நிதி அறிவு இல்லை. பயனர் ஏ.டி.எம் இடைமுகத்தில் என்ன பார்க்கிறார் என விவரிக்கும் (எ.கா., 'நான் பட்டன்களை பார்க்கிறேன்: பணம் எடு, சமநிலை'). பயனரின் விவரணை அடிப்படையில் ஏ.டி.எம்-ஐ இயக்குவது பற்றி தமிழில் படி-படியாக வழிகாட்டுதலை வழங்கவும், கிராமப்புற வாழ்க்கைக்கு தொடர்புடைய எடுத்துக்காட்டுகளை (எ.கா., விவசாய வாங்குதலுக்கு பணம் எடுத்தல்) பயன்படுத்தவும். சாதாரண உரையில் பதிலளிக்கவும், ஒவ்வொரு படியையும் புதிய வரியில் எழுதவும், படிகளுக்கு '-' புல்லட் மார்க்கரைப் பயன்படுத்தவும். '**' அல்லது '*' போன்ற மார்க்டவுன் வடிவமைப்பைப் பயன்படுத்த வேண்டாம். பயனருக்கு ஏ.டி.எம்-ஐ பற்றி எதுவும் தெரியாது என்று கருதவும்.",
-    "te-IN": "మీరు భారతీయ గ్రామస్తులకు సహాయపడే సహాయకుడు, వీరికి ఆర్థిక జ్ఞానం లేదు. బಳకాలు ఏటిఎమ్ ఇంటర్ఫేస్‌లో ఏమి చూస్తున్నారో వివరిస్తారు (ఉదా., 'నేను బటన్‌లు చూశాను: డబ్బు తీసుకోవడం, బ్యాలెన్స్'). బಳకాల వివరణ ఆధారంగా ఏటిఎమ్‌ను ఆపరేట్ చేయడానికి తెలుగులో దశ-దశల వారీగా మార్గదర్శకం ఇవ్వండి, గ్రామీణ జీవన విధానానికి సంబంధించిన ఉదాహరణలను (ఉదా., రైతు కొనుగోలుకు డబ్బు తీసుకోవడం) ఉపయోగించండి. సాదా టెక్స్ట్‌లో సమాధానం ఇవ్వండి, ప్రతి దశను కొత్త లైన్‌లో రాయండి, దశలకు '-' బుల్లెట్ మార్కర్‌ని ఉపయోగించండి. '**' లేదా '*' వంటి మార్క్‌డౌన్ ఫార్మాటింగ్‌ని ఉపయోగించవద్దు. బಳకాలకు ఏటిఎమ్ గురించి ఏమీ తెలియదని భావించండి."
-}
 
-# Savings Account-specific system instruction
-savings_instructions = {
-    "en-US": "You are a helpful assistant for Indian villagers with no prior financial knowledge. The user will ask questions about managing a savings account (e.g., 'How do I check my balance?', 'What is interest?'). Provide step-by-step guidance in English on how to perform the task or understand the concept, using simple language and examples relevant to rural life (e.g., saving for a festival or buying seeds). Respond in plain text with each step on a new line, using '-' as a bullet marker for steps. Do not use Markdown formatting like '**' or '*' for emphasis. Assume the user knows nothing about savings accounts.",
-    "hi-IN": "आप भारतीय ग्रामीणों के लिए एक सहायक हैं जिनका वित्तीय ज्ञान नहीं है। उपयोगकर्ता बचत खाते के प्रबंधन के बारे में सवाल पूछेगा (जैसे, 'मैं अपना बैलेंस कैसे चेक करूं?', 'ब्याज क्या है?')। हिंदी में कार्य करने या अवधारणा को समझने के लिए चरण-दर-चरण मार्गदर्शन करें, ग्रामीण जीवन (जैसे, त्योहार के लिए बचत करना या बीज खरीदना) से संबंधित सरल भाषा और उदाहरणों का उपयोग करें। सादे टेक्स्ट में जवाब दें, प्रत्येक चरण को नई पंक्ति पर लिखें, चरणों के लिए '-' बुलेट मार्कर का उपयोग करें। मार्कडाउन फॉर्मेटिंग जैसे '**' या '*' का उपयोग न करें। मान लें कि उपयोगकर्ता को बचत खातों के बारे में कुछ भी नहीं पता है।",
-    "kn-IN": "ನೀವು ಭಾರತೀಯ ಗ್ರಾಮೀಣರಿಗಾಗಿ ಸಹಾಯಕ ಸಹಾಯಕರಾಗಿದ್ದೀರಿ, ಅವರಿಗೆ ಆರ್ಥಿಕ ಜ್ಞಾನ ಇಲ್ಲ. ಬಳಕೆದಾರರು ಉಳಿತಾಯ ಖಾತೆಯನ್ನು ನಿರ್ವಹಿಸುವ ಬಗ್ಗೆ ಪ್ರಶ್ನೆಗಳನ್ನು ಕೇಳುತ್ತಾರೆ (ಉದಾ., 'ನಾನು ನನ್ನ ಬ್ಯಾಲೆನ್ಸ್ ಹೇಗೆ ಪರಿಶೀಲಿಸುವುದು?', 'ಬಡ್ಡಿ ಎಂದರೇನು?'). ಕನ್ನಡದಲ್ಲಿ ಕಾರ್ಯವನ್ನು ಮಾಡುವ ಅಥವಾ ಪರಿಕಲ್ಪನೆಯನ್ನು ಅರ್ಥಮಾಡಿಕೊಳ್ಳುವ ಬಗ್ಗೆ ಹಂತ-ಹಂತದ ಮಾರ್ಗದರ್ಶನವನ್ನು ಒದಗಿಸಿ, ಗ್ರಾಮೀಣ ಜೀವನಕ್ಕೆ ಸಂಬಂಧಿಸಿದ ಸರಳ ಭಾಷೆ ಮತ್ತು ಉದಾಹರಣೆಗಳನ್ನು ಬಳಸಿ (ಉದಾ., ಹಬ್ಬಕ್ಕಾಗಿ ಉಳಿತಾಯ ಮಾಡುವುದು ಅಥವಾ ಬೀಜಗಳನ್ನು ಖರೀದಿಸುವುದು). ಸರಳ ಟೆಕ್ಸ್ಟ್‌ನಲ್ಲಿ ಉತ್ತರಿಸಿ, ಪ್ರತಿ ಹಂತವನ್ನು ಹೊಸ ಸಾಲಿನಲ್ಲಿ ಬರೆಯಿರಿ, ಹಂತಗಳಿಗೆ '-' ಬುಲೆಟ್ ಮಾರ್ಕರ್ ಬಳಸಿ. '**' ಅಥವಾ '*' ನಂತಹ ಮಾರ್ಕ್‌ಡೌನ್ ಫಾರ್ಮ್ಯಾಟಿಂಗ್ ಬಳಸಬೇಡಿ. ಬಳಕೆದಾರನಿಗೆ ಉಳಿತಾಯ ಖಾತೆಗಳ ಬಗ್ಗೆ ಏನೂ ಗೊತ್ತಿಲ್ಲ ಎಂದು ಭಾವಿಸಿ.",
-    "ta-IN": "நீங்கள் இந்திய கிராமவாசிகளுக்கு உதவி செய்யும் உதவியாளர், அவர்களுக்கு நிதி அறிவு இல்லை. பயனர் சேமிப்பு கணக்கை நிர்வகிப்பது பற்றி கேள்விகளைக் கேட்பார் (எ.கா., 'நான் என் பேலன்ஸை எப்படி பார்ப்பது?', 'வட்டி என்றால் என்ன?'). தமிழில் பணியைச் செய்வது அல்லது கருத்தைப் புரிந்துகொள்வது பற்றி படி-படியாக வழிகாட்டுதலை வழங்கவும், கிராமப்புற வாழ்க்கைக்கு தொடர்புடைய எளிய மொழி மற்றும் எடுத்துக்காட்டுகளைப் பயன்படுத்தவும் (எ.கா., பண்டிகைக்காக சேமிப்பது அல்லது விதைகளை வாங்குவது). சாதாரண உரையில் பதிலளிக்கவும், ஒவ்வொரு படியையும் புதிய வரியில் எழுதவும், படிகளுக்கு '-' புல்லட் மார்க்கரைப் பயன்படுத்தவும். '**' அல்லது '*' போன்ற மார்க்டவுன் வடிவமைப்பைப் பயன்படுத்த வேண்டாம். பயனருக்கு சேமிப்பு கணக்குகள் பற்றி எதுவும் தெரியாது என்று கருதவும்.",
-    "te-IN": "మీరు భారతీయ గ్రామస్తులకు సహాయపడే సహాయకుడు, వీరికి ఆర్థిక జ్ఞానం లేదు. బಳకాలు ఆదాయ ఖాతాన్ని నిర్వహించడం గురించి ప్రశ్నలు అడుగుతారు (ఉదా., 'నేను నా బ్యాలెన్స్‌ను ఎలా చెక్ చేయాలి?', 'వడ్డీ అంటే ఏమిటి?'). తెలుగులో ఆ పనిని ఎలా చేయాలి లేదా భావనను ఎలా అర్థం చేసుకోవాలి అనే దానిపై దశ-దశల వారీగా మార్గదర్శకం ఇవ్వండి, గ్రామీణ జీవన విధానానికి సంబంధించిన సరళమైన భాష మరియు ఉదాహరణలను ఉపయోగించండి (ఉదా., పండుగ కోసం ఆదా చేయడం లేదా విత్తనాలు కొనుగోలు చేయడం). సాదా టెక్స్ట్‌లో సమాధానం ఇవ్వండి, ప్రతి దశను కొత్త లైన్‌లో రాయండి, దశలకు '-' బుల్లెట్ మార్కర్‌ని ఉపయోగించండి. '**' లేదా '*' వంటి మార్క్‌డౌన్ ఫార్మాటింగ్‌ని ఉపయోగించవద్దు. బಳకాలకు ఆదాయ ఖాతాల గురించి ఏమీ తెలియదని భావించండి."
-}
+def load_config(config):
+    """Reads the settings from the environment (and a .env file)."""
+    load_dotenv()
+    config['UPLOAD_FOLDER'] = 'uploads'
+    config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    config['RESPONSE_CACHE_BACKEND'] = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')  # 'memory' or 'sqlite'
+    config['RESPONSE_CACHE_PATH'] = os.getenv('RESPONSE_CACHE_PATH', os.path.join('cache', 'responses.sqlite3'))
+    config['RESPONSE_CACHE_SIZE'] = int(os.getenv('RESPONSE_CACHE_SIZE', '2048'))
+    config['CHAT_SESSION_BACKEND'] = os.getenv('CHAT_SESSION_BACKEND', 'memory')  # 'memory' or 'sqlite'
+    config['CHAT_SESSION_PATH'] = os.getenv('CHAT_SESSION_PATH', os.path.join('cache', 'sessions.sqlite3'))
+    config['CHAT_SESSION_MAX'] = int(os.getenv('CHAT_SESSION_MAX', '10000'))
+    config['CHAT_SESSION_IDLE_SECONDS'] = int(os.getenv('CHAT_SESSION_IDLE_SECONDS', '1800'))
+    config['CHAT_HISTORY_TOKENS'] = int(os.getenv('CHAT_HISTORY_TOKENS', '1500'))  # recent turns kept per session
+    config['CHAT_SUMMARY_TOKENS'] = int(os.getenv('CHAT_SUMMARY_TOKENS', '300'))  # summary of older turns
+    config['FAQ_FEATURES'] = set(filter(None, os.getenv('FAQ_FEATURES', 'chat,savings,fixed_deposit,current_account,insurance').split(',')))
+    config['FAQ_THRESHOLD'] = float(os.getenv('FAQ_THRESHOLD', '0.85'))  # cosine similarity for a near-duplicate
+    config['FAQ_MAX_ENTRIES'] = int(os.getenv('FAQ_MAX_ENTRIES', '100000'))  # per feature and language; oldest evicted first
+    config['FAQ_MAX_AGE_SECONDS'] = int(os.getenv('FAQ_MAX_AGE_SECONDS', str(24 * 3600)))  # 0 keeps answers until evicted
+    config['FAQ_INDEX_PATH'] = os.getenv('FAQ_INDEX_PATH', '')  # SQLite file; empty keeps the index in memory
+    config['PDF_WORKERS'] = int(os.getenv('PDF_WORKERS', '0')) or None  # default: one per CPU
+    config['PDF_PAGE_TIMEOUT'] = float(os.getenv('PDF_PAGE_TIMEOUT', '5'))  # seconds per page
+    config['PDF_MAX_PAGES'] = int(os.getenv('PDF_MAX_PAGES', '50'))
+    config['OCR_WORKERS'] = int(os.getenv('OCR_WORKERS', '0')) or None  # default: one per CPU
+    config['OCR_IMAGE_TIMEOUT'] = float(os.getenv('OCR_IMAGE_TIMEOUT', '20'))  # seconds per uploaded photo
+    config['OCR_MAX_SIDE'] = int(os.getenv('OCR_MAX_SIDE', '2000'))  # photos are downscaled to this many pixels across
+    config['FORM_MAX_CHARS'] = int(os.getenv('FORM_MAX_CHARS', '50000'))
+    config['FORM_CACHE_DIR'] = os.getenv('FORM_CACHE_DIR', os.path.join('cache', 'forms'))
+    config['FORM_CACHE_MAX_MB'] = int(os.getenv('FORM_CACHE_MAX_MB', '256'))
+    config['FORM_TOKEN_BUDGET'] = int(os.getenv('FORM_TOKEN_BUDGET', '6000'))  # larger forms are chunked
+    config['FORM_CHUNK_TOKENS'] = int(os.getenv('FORM_CHUNK_TOKENS', '2500'))
+    config['FORM_CHUNK_CONCURRENCY'] = int(os.getenv('FORM_CHUNK_CONCURRENCY', '4'))
+    config['JOB_BACKEND'] = os.getenv('JOB_BACKEND', 'memory')  # 'memory' or 'sqlite' (survives restarts, shared by processes)
+    config['JOB_DB_PATH'] = os.getenv('JOB_DB_PATH', os.path.join('cache', 'jobs.sqlite3'))
+    config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', '4'))
+    config['JOB_MAX_ATTEMPTS'] = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+    config['JOB_RETRY_BACKOFF'] = float(os.getenv('JOB_RETRY_BACKOFF', '2'))  # seconds, doubled per retry
+    config['JOB_TTL_SECONDS'] = int(os.getenv('JOB_TTL_SECONDS', '3600'))  # finished jobs are kept this long
+    config['JOB_LEASE_SECONDS'] = int(os.getenv('JOB_LEASE_SECONDS', '600'))  # a job is rerun if its worker is gone this long
+    config['LLM_BACKEND'] = os.getenv('LLM_BACKEND', 'gemini')  # 'gemini' or 'stub' (offline, for benchmarks)
+    config['GOOGLE_API_KEY'] = os.getenv('GOOGLE_API_KEY', '')  # needed by the gemini backend, checked on its first call
+    config['LLM_PRELOAD'] = os.getenv('LLM_PRELOAD', '1') == '1'  # import the Gemini client in the background after startup
+    config['STUB_LATENCY_MS'] = int(os.getenv('STUB_LATENCY_MS', '1000'))
+    config['STUB_TOKENS_PER_SEC'] = float(os.getenv('STUB_TOKENS_PER_SEC', '0'))  # 0 = no per-token delay
+    config['STUB_ERROR_RATE'] = float(os.getenv('STUB_ERROR_RATE', '0'))
+    config['STUB_SEED'] = int(os.getenv('STUB_SEED', '0'))
+    config['STUB_MODEL_LATENCY_MS'] = parse_limits(os.getenv('STUB_MODEL_LATENCY_MS', ''), float)  # per model name, e.g. gemini-2.0-flash-lite=400
+    config['MODEL_ROUTING_PATH'] = os.getenv('MODEL_ROUTING_PATH', 'model_routing.json')  # empty: every feature keeps its registered profile
+    config['ROUTER_MAX_ERROR_RATE'] = float(os.getenv('ROUTER_MAX_ERROR_RATE', '0.2'))  # light tier is skipped above this
+    config['RATE_LIMIT_PER_MIN'] = float(os.getenv('RATE_LIMIT_PER_MIN', '60'))  # per client; 0 disables
+    config['RATE_LIMIT_BURST'] = int(os.getenv('RATE_LIMIT_BURST', '20'))
+    config['TRUSTED_PROXIES'] = int(os.getenv('TRUSTED_PROXIES', '0'))  # reverse proxies in front setting X-Forwarded-For
+    config['MAX_CONCURRENT_LLM'] = int(os.getenv('MAX_CONCURRENT_LLM', '256'))
+    config['FEATURE_CONCURRENCY'] = parse_limits(os.getenv('FEATURE_CONCURRENCY', 'form=8'))  # per-feature caps
+    config['ADMISSION_QUEUE_SIZE'] = int(os.getenv('ADMISSION_QUEUE_SIZE', '512'))
+    config['ADMISSION_QUEUE_TIMEOUT'] = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '10'))  # seconds
+    config['LLM_DEADLINES'] = parse_limits(os.getenv('LLM_DEADLINES', 'default=20,form=60,form_fields=30'), float)
+    config['LLM_RETRIES'] = int(os.getenv('LLM_RETRIES', '2'))
+    config['LLM_RETRY_BACKOFF'] = float(os.getenv('LLM_RETRY_BACKOFF', '0.5'))  # seconds, doubled per retry
+    config['LLM_HEDGE'] = os.getenv('LLM_HEDGE', '0') == '1'  # second request once p95 latency has passed
+    config['BREAKER_FAILURES'] = int(os.getenv('BREAKER_FAILURES', '5'))
+    config['BREAKER_RESET_SECONDS'] = float(os.getenv('BREAKER_RESET_SECONDS', '30'))
+    config['KNOWLEDGE_DIR'] = os.getenv('KNOWLEDGE_DIR', 'data')  # villages.csv, branches.csv, schemes.json
+    config['KNOWLEDGE_PACK'] = os.getenv('KNOWLEDGE_PACK', os.path.join('cache', 'knowledge.npz'))  # built by knowledge.py; used if present
+    config['ANSWER_PACK'] = os.getenv('ANSWER_PACK', os.path.join('cache', 'answers.pack'))  # built by answers.py; empty disables
+    config['ANSWER_PACK_CHECK_SECONDS'] = float(os.getenv('ANSWER_PACK_CHECK_SECONDS', '5'))  # how often a replaced pack is noticed; 0 never
+    config['MICROLOAN_BULK_MAX_ROWS'] = int(os.getenv('MICROLOAN_BULK_MAX_ROWS', '100000'))  # rows accepted by /microloan_bulk
+    config['AUDIT_LOG'] = os.getenv('AUDIT_LOG', '1') == '1'  # JSONL record of every API call
+    config['AUDIT_DIR'] = os.getenv('AUDIT_DIR', 'logs')
+    config['AUDIT_QUEUE_SIZE'] = int(os.getenv('AUDIT_QUEUE_SIZE', '10000'))  # records beyond this are dropped, not waited for
+    config['AUDIT_BATCH_SIZE'] = int(os.getenv('AUDIT_BATCH_SIZE', '256'))
+    config['AUDIT_FLUSH_SECONDS'] = float(os.getenv('AUDIT_FLUSH_SECONDS', '1'))
+    config['AUDIT_MAX_MB'] = int(os.getenv('AUDIT_MAX_MB', '64'))  # file size before rotation
+    config['AUDIT_MAX_AGE_SECONDS'] = int(os.getenv('AUDIT_MAX_AGE_SECONDS', '3600'))  # file age before rotation
+    config['AUDIT_KEEP_FILES'] = int(os.getenv('AUDIT_KEEP_FILES', '48'))
+    config['AUDIT_MAX_INPUT_CHARS'] = int(os.getenv('AUDIT_MAX_INPUT_CHARS', '2000'))  # per input string
+    config['PRERENDER_PAGES'] = os.getenv('PRERENDER_PAGES', '1') == '1'  # render GET pages once at startup
+    config['PAGE_MAX_AGE'] = int(os.getenv('PAGE_MAX_AGE', '300'))  # seconds a browser reuses a page before revalidating
+
+def validate_config(config):
+    """Raises ValueError naming every setting the app cannot start with."""
+    problems = []
+    for name, allowed in (('LLM_BACKEND', ('gemini', 'stub')), ('RESPONSE_CACHE_BACKEND', ('memory', 'sqlite')),
+                          ('CHAT_SESSION_BACKEND', ('memory', 'sqlite')), ('JOB_BACKEND', ('memory', 'sqlite'))):
+        if config[name] not in allowed:
+            problems.append(f"{name} must be one of {', '.join(allowed)}, not {config[name]!r}")
+    for name in ('RESPONSE_CACHE_SIZE', 'CHAT_SESSION_MAX', 'CHAT_HISTORY_TOKENS', 'FAQ_MAX_ENTRIES', 'PDF_MAX_PAGES',
+                 'OCR_MAX_SIDE', 'FORM_MAX_CHARS', 'FORM_TOKEN_BUDGET', 'FORM_CHUNK_TOKENS', 'FORM_CHUNK_CONCURRENCY',
+                 'JOB_WORKERS', 'JOB_MAX_ATTEMPTS', 'MAX_CONCURRENT_LLM', 'ADMISSION_QUEUE_SIZE', 'BREAKER_FAILURES',
+                 'AUDIT_QUEUE_SIZE', 'AUDIT_BATCH_SIZE', 'AUDIT_KEEP_FILES'):
+        if config[name] < 1:
+            problems.append(f"{name} must be at least 1, not {config[name]}")
+    if config['TRUSTED_PROXIES'] < 0:
+        problems.append(f"TRUSTED_PROXIES must be 0 or more, not {config['TRUSTED_PROXIES']}")
+    for name in ('FAQ_THRESHOLD', 'STUB_ERROR_RATE', 'ROUTER_MAX_ERROR_RATE'):
+        if not 0 <= config[name] <= 1:
+            problems.append(f"{name} must be between 0 and 1, not {config[name]}")
+    if config['MODEL_ROUTING_PATH'] and not os.path.isfile(config['MODEL_ROUTING_PATH']):
+        problems.append(f"MODEL_ROUTING_PATH {config['MODEL_ROUTING_PATH']!r} does not exist")
+    if problems:
+        raise ValueError("Invalid configuration:\n  " + '\n  '.join(problems))
+    if config['LLM_BACKEND'] == 'gemini' and not config['GOOGLE_API_KEY']:
+        app.logger.warning("GOOGLE_API_KEY is not set; AI answers will fail until it is")
+
+def prepare_directories(config):
+    """Creates the folders the app writes to, so an unwritable one stops it at startup."""
+    folders = [config['UPLOAD_FOLDER'], config['FORM_CACHE_DIR']]
+    if config['AUDIT_LOG']:
+        folders.append(config['AUDIT_DIR'])
+    for backend, path in ((config['RESPONSE_CACHE_BACKEND'], config['RESPONSE_CACHE_PATH']),
+                          (config['CHAT_SESSION_BACKEND'], config['CHAT_SESSION_PATH']),
+                          (config['JOB_BACKEND'], config['JOB_DB_PATH']),
+                          ('sqlite' if config['FAQ_INDEX_PATH'] else 'memory', config['FAQ_INDEX_PATH'])):
+        if backend == 'sqlite':
+            folders.append(os.path.dirname(path))
+    for folder in filter(None, folders):
+        os.makedirs(folder, exist_ok=True)
+        if not os.access(folder, os.W_OK):
+            raise ValueError(f"Cannot write to {folder}")
+
+# Prebuilt model handles shared by all requests, one registered per
+# LLM-backed feature
+models = ModelRegistry()
+models.register('chat', prompts.SYSTEM_INSTRUCTIONS['chat'])
+models.register('chat_summary')
+models.register('schemes')
+models.register('form', prompts.SYSTEM_INSTRUCTIONS['form'], LONG_PROFILE)
+models.register('form_fields')
+models.register('atm', prompts.SYSTEM_INSTRUCTIONS['atm'])
+models.register('savings', prompts.SYSTEM_INSTRUCTIONS['savings'])
+models.register('fixed_deposit', prompts.SYSTEM_INSTRUCTIONS['fixed_deposit'])
+models.register('current_account', prompts.SYSTEM_INSTRUCTIONS['current_account'])
+models.register('microloan', prompts.SYSTEM_INSTRUCTIONS['microloan'])
+models.register('locker')
+models.register('insurance', prompts.SYSTEM_INSTRUCTIONS['insurance'])
+
+# Concurrent identical LLM calls (same route, language, instructions and
+# prompt) wait on a single upstream call
+inflight = SingleFlight()
+
+# Prerendered, precompressed GET pages and the CSS/JS bundles they share
+static_pages = PageStore()
+
+# Runs a queued form upload for form_jobs
+def run_form_job(params, data):
+    token = metrics.start_request('job:form')
+    status = 500
+    try:
+        admission.acquire('form')
+        try:
+            result = analyze_form(params['filename'], data, params['language'])
+        finally:
+            admission.release('form')
+        status = 200
+        return result
+    finally:
+        metrics.finish_request(token, status)
+
+# Folds older /chat turns into a session's summary for chat_sessions
+def summarize_chat(summary, turns):
+    prompt = prompts.render('chat_summary', 'en-US', summary=summary or 'None', conversation=format_turns(turns))
+    choice = router.choose('chat_summary', text=prompt)
+    with router.timed(choice):
+        return llm.generate('chat_summary', 'en-US', prompt, choice.profile).text
+
+def start_services(config):
+    """Builds the shared services the routes use, from the checked settings."""
+    global llm, router, pdf_extractor, image_ocr, response_cache, faq_index, knowledge, rate_limiter, admission
+    global form_chunk_pool, form_cache, form_jobs, chat_sessions, audit_log, answer_pack
+    # Every route gets its answers through this backend, behind deadlines,
+    # retries and a circuit breaker
+    llm = ResilientBackend(
+        create_backend(
+            config['LLM_BACKEND'], models,
+            api_key=config['GOOGLE_API_KEY'],
+            latency=config['STUB_LATENCY_MS'] / 1000,
+            tokens_per_second=config['STUB_TOKENS_PER_SEC'],
+            error_rate=config['STUB_ERROR_RATE'],
+            seed=config['STUB_SEED'],
+            model_latency={model: ms / 1000 for model, ms in config['STUB_MODEL_LATENCY_MS'].items()}
+        ),
+        deadlines=config['LLM_DEADLINES'],
+        retries=config['LLM_RETRIES'],
+        backoff=config['LLM_RETRY_BACKOFF'],
+        hedge=config['LLM_HEDGE'],
+        breaker=CircuitBreaker(config['BREAKER_FAILURES'], config['BREAKER_RESET_SECONDS']),
+        # A thread for each admitted call, and as many again for retries,
+        # hedges and attempts abandoned at their deadline
+        workers=2 * config['MAX_CONCURRENT_LLM']
+    )
+
+    # Picks the model tier and output budget for each call, from the routing
+    # config and each tier's recent latency and errors
+    router = (ModelRouter.from_file(models, config['MODEL_ROUTING_PATH'], max_error_rate=config['ROUTER_MAX_ERROR_RATE'])
+              if config['MODEL_ROUTING_PATH'] else ModelRouter(models))
+
+    # Page-parallel PDF text extraction for uploaded forms
+    pdf_extractor = PdfExtractor(
+        workers=config['PDF_WORKERS'],
+        page_timeout=config['PDF_PAGE_TIMEOUT'],
+        max_pages=config['PDF_MAX_PAGES'],
+        max_chars=config['FORM_MAX_CHARS']
+    )
+
+    # OCR of photographed forms, on its own bounded process pool
+    image_ocr = ImageOcr(
+        workers=config['OCR_WORKERS'],
+        image_timeout=config['OCR_IMAGE_TIMEOUT'],
+        max_side=config['OCR_MAX_SIDE'],
+        max_chars=config['FORM_MAX_CHARS']
+    )
+    if not image_ocr.available:
+        app.logger.warning("Tesseract OCR is not installed; photographed forms cannot be read")
+
+    # Cache for repeat answers (same route, language, instructions and prompt)
+    response_cache = create_cache(
+        config['RESPONSE_CACHE_BACKEND'],
+        config['RESPONSE_CACHE_PATH'],
+        config['RESPONSE_CACHE_SIZE']
+    )
+
+    # Earlier answers to paraphrases of the same question, per feature and language
+    faq_index = FaqIndex(
+        config['FAQ_THRESHOLD'],
+        config['FAQ_MAX_ENTRIES'],
+        path=config['FAQ_INDEX_PATH'] or None,
+        max_age=config['FAQ_MAX_AGE_SECONDS']
+    )
+
+    # Schemes and bank branches by state, district and village, so /get_schemes
+    # and /get_locker_facilities only need the model to translate
+    knowledge = KnowledgeBase.load(config['KNOWLEDGE_DIR'], config['KNOWLEDGE_PACK'])
+    if not len(knowledge) or not knowledge.branch_count:
+        app.logger.warning(f"The knowledge base has {len(knowledge)} villages and {knowledge.branch_count} branches; "
+                           "until villages.csv and branches.csv are filled, village and locker lookups ask Gemini")
+
+    # Per-client rate limits, and slots for LLM-backed requests (globally and per
+    # feature) with a bounded wait queue
+    rate_limiter = RateLimiter(config['RATE_LIMIT_PER_MIN'], config['RATE_LIMIT_BURST'])
+    admission = AdmissionController(
+        config['MAX_CONCURRENT_LLM'],
+        config['FEATURE_CONCURRENCY'],
+        queue_size=config['ADMISSION_QUEUE_SIZE'],
+        queue_timeout=config['ADMISSION_QUEUE_TIMEOUT']
+    )
+
+    # Runs field extraction on the chunks of long forms concurrently
+    form_chunk_pool = ThreadPoolExecutor(config['FORM_CHUNK_CONCURRENCY'])
+
+    # Extracted text and guidance for uploaded forms, keyed by content hash
+    form_cache = FormCache(config['FORM_CACHE_DIR'], config['FORM_CACHE_MAX_MB'] * 1024 * 1024)
+
+    # Form uploads sent with 'Prefer: respond-async' (or mode=async) run here;
+    # the upload is spooled to UPLOAD_FOLDER until its job finishes
+    form_jobs = JobQueue(
+        create_job_store(config['JOB_BACKEND'], config['JOB_DB_PATH']),
+        {'form': run_form_job},
+        config['UPLOAD_FOLDER'],
+        workers=config['JOB_WORKERS'],
+        max_attempts=config['JOB_MAX_ATTEMPTS'],
+        retry_backoff=config['JOB_RETRY_BACKOFF'],
+        ttl=config['JOB_TTL_SECONDS'],
+        lease=config['JOB_LEASE_SECONDS'],
+        # A function, so the upstream errors load only when a job fails
+        retry_on=lambda e: isinstance(e, (upstream.GoogleAPIError, Rejected))
+    )
+
+    # Multi-turn /chat history per session id; older turns are summarized in the
+    # background once a session outgrows its token budget
+    chat_sessions = ChatSessions(
+        create_session_store(
+            config['CHAT_SESSION_BACKEND'],
+            config['CHAT_SESSION_PATH'],
+            config['CHAT_SESSION_MAX'],
+            config['CHAT_SESSION_IDLE_SECONDS']
+        ),
+        token_budget=config['CHAT_HISTORY_TOKENS'],
+        summary_tokens=config['CHAT_SUMMARY_TOKENS'],
+        summarize=summarize_chat,
+        executor=ThreadPoolExecutor(2, thread_name_prefix='chat-compact')
+    )
+
+    # Append-only log of API calls, written in batches by a background thread
+    audit_log = AuditLog(
+        config['AUDIT_DIR'],
+        queue_size=config['AUDIT_QUEUE_SIZE'],
+        batch_size=config['AUDIT_BATCH_SIZE'],
+        flush_interval=config['AUDIT_FLUSH_SECONDS'],
+        max_bytes=config['AUDIT_MAX_MB'] * 1024 * 1024,
+        max_age=config['AUDIT_MAX_AGE_SECONDS'],
+        keep=config['AUDIT_KEEP_FILES']
+    ) if config['AUDIT_LOG'] else None
+    if audit_log is not None:
+        atexit.register(audit_log.close)
+
+    # Pregenerated answers to the guide pages' standard questions, memory-mapped
+    # and switched for a rebuilt pack while running
+    answer_pack = PackedAnswers(
+        config['ANSWER_PACK'],
+        pack_digests(),
+        check_interval=config['ANSWER_PACK_CHECK_SECONDS']
+    ) if config['ANSWER_PACK'] else None
+
+# A validated LLM request: which feature answers it, in which language, the
+# prompt to send, the JSON key the answer is returned under, for FAQ-style
+# and guide features the user's own question, and for chat sessions the
+# (session id, message) the answer is recorded under
+LLMCall = namedtuple('LLMCall', ['feature', 'language', 'prompt', 'response_key', 'question', 'session'],
+                     defaults=(None, None))
+
+def faq_enabled(call):
+    return call.question is not None and call.feature in app.config['FAQ_FEATURES'] and call.language in prompts.LANGUAGES
+
+def packed_answer(call):
+    if answer_pack is None or call.question is None or call.feature not in PACK_FEATURES:
+        return None
+    text = answer_pack.lookup(call.feature, prompts.resolve_language(call.language), call.question)
+    if len(answer_pack):
+        metrics.record_cache('pack', text is not None)
+    return text
+
+def cached_text(call, system_instruction):
+    metrics.set_language(call.language)
+    text = packed_answer(call)
+    if text is not None:
+        return text
+    text = response_cache.get(call.feature, call.language, system_instruction, call.prompt)
+    metrics.record_cache('response', text is not None)
+    if text is None and faq_enabled(call):
+        with metrics.phase('faq'):
+            text = faq_index.lookup(call.feature, call.language, call.question)
+        metrics.record_cache('faq', text is not None)
+    return text
+
+def store_answer(call, system_instruction, text):
+    response_cache.set(call.feature, call.language, system_instruction, call.prompt, text)
+    if faq_enabled(call):
+        faq_index.add(call.feature, call.language, call.question, text)
+
+def route_call(call):
+    # Short inputs are judged by the user's own words where the call has them
+    return router.choose(call.feature, metrics.labels()['route'], call.question or call.prompt)
+
+def record_usage(completion, choice):
+    metrics.record_tokens(completion.input_tokens, completion.output_tokens)
+    router.record_usage(choice, completion)
+
+def record_llm_error(e):
+    metrics.record_error('google_api' if isinstance(e, upstream.GoogleAPIError) else 'other')
+
+def stale_answer(call, system_instruction, error):
+    # When the upstream fails (or the circuit is open), an expired answer to
+    # the same prompt beats an error
+    if not isinstance(error, upstream.GoogleAPIError):
+        return None
+    text = response_cache.get_stale(call.feature, call.language, system_instruction, call.prompt)
+    if text is not None:
+        metrics.RESILIENCE_EVENTS.inc(event='stale_answer', **metrics.labels())
+        metrics.note_cache('response', 'stale')
+        app.logger.warning(f"Serving a stale {call.feature} answer after upstream error: {error}")
+    return text
+
+def generate_completion(call):
+    system_instruction = models.instruction(call.feature, call.language)
+    cached = cached_text(call, system_instruction)
+    if cached is not None:
+        return Completion(cached, 0, 0)
+
+    def generate():
+        choice = route_call(call)
+        with router.timed(choice):
+            completion = llm.generate(call.feature, call.language, call.prompt, choice.profile)
+        record_usage(completion, choice)
+        store_answer(call, system_instruction, completion.text)
+        return completion
+
+    key = make_key(call.feature, call.language, system_instruction, call.prompt)
+    try:
+        with metrics.phase('llm'):
+            completion, shared = inflight.do(key, generate)
+    except Exception as e:
+        record_llm_error(e)
+        stale = stale_answer(call, system_instruction, e)
+        if stale is None:
+            raise
+        return Completion(stale, 0, 0)
+    if shared:
+        metrics.COALESCED.inc(**metrics.labels())
+        metrics.note_cache('inflight', 'shared')
+        return Completion(completion.text, 0, 0)
+    return completion
+
+def remember_turn(call, text):
+    if call.session is not None and text:
+        session_id, message = call.session
+        chat_sessions.record(session_id, message, text)
+
+def generate_text(call):
+    text = generate_completion(call).text
+    remember_turn(call, text)
+    return text
+
+async def generate_text_async(call):
+    text = await answer_text_async(call)
+    remember_turn(call, text)
+    return text
+
+async def answer_text_async(call):
+    system_instruction = models.instruction(call.feature, call.language)
+    cached = cached_text(call, system_instruction)
+    if cached is not None:
+        return cached
+
+    async def generate():
+        choice = route_call(call)
+        with router.timed(choice):
+            completion = await llm.generate_async(call.feature, call.language, call.prompt, choice.profile)
+        record_usage(completion, choice)
+        store_answer(call, system_instruction, completion.text)
+        return completion
+
+    key = make_key(call.feature, call.language, system_instruction, call.prompt)
+    try:
+        with metrics.phase('llm'):
+            completion, shared = await inflight.do_async(key, generate)
+    except Exception as e:
+        record_llm_error(e)
+        stale = stale_answer(call, system_instruction, e)
+        if stale is None:
+            raise
+        return stale
+    if shared:
+        metrics.COALESCED.inc(**metrics.labels())
+        metrics.note_cache('inflight', 'shared')
+    return completion.text
+
+def streamed_completion(call, parts):
+    # Streams carry no usage metadata, so their tokens are estimated locally
+    text = ''.join(parts)
+    return Completion(text, estimate_tokens(call.prompt), estimate_tokens(text))
+
+def stream_text(call):
+    parts = []
+    for text in stream_answer(call):
+        parts.append(text)
+        yield text
+    remember_turn(call, ''.join(parts))
+
+async def stream_text_async(call):
+    parts = []
+    async for text in stream_answer_async(call):
+        parts.append(text)
+        yield text
+    remember_turn(call, ''.join(parts))
+
+def stream_answer(call):
+    system_instruction = models.instruction(call.feature, call.language)
+    cached = cached_text(call, system_instruction)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    choice = route_call(call)
+    try:
+        with metrics.phase('llm'), router.timed(choice):
+            for text in llm.stream(call.feature, call.language, call.prompt, choice.profile):
+                parts.append(text)
+                yield text
+    except Exception as e:
+        record_llm_error(e)
+        # Only an answer that hasn't started can be replaced
+        stale = None if parts else stale_answer(call, system_instruction, e)
+        if stale is None:
+            raise
+        yield stale
+        return
+    completion = streamed_completion(call, parts)
+    record_usage(completion, choice)
+    store_answer(call, system_instruction, completion.text)
+
+async def stream_answer_async(call):
+    system_instruction = models.instruction(call.feature, call.language)
+    cached = cached_text(call, system_instruction)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    choice = route_call(call)
+    try:
+        with metrics.phase('llm'), router.timed(choice):
+            async for text in llm.stream_async(call.feature, call.language, call.prompt, choice.profile):
+                parts.append(text)
+                yield text
+    except Exception as e:
+        record_llm_error(e)
+        # Only an answer that hasn't started can be replaced
+        stale = None if parts else stale_answer(call, system_instruction, e)
+        if stale is None:
+            raise
+        yield stale
+        return
+    completion = streamed_completion(call, parts)
+    record_usage(completion, choice)
+    store_answer(call, system_instruction, completion.text)
+
+def wants_stream(data):
+    # Streaming is opt-in, so existing clients keep getting a single JSON body
+    return data.get('stream') is True or 'text/event-stream' in request.headers.get('Accept', '')
+
+def sse_event(payload, event=None):
+    prefix = f"event: {event}\n" if event else ''
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+def sse_response(chunks):
+    # Wait for the first chunk here so upstream failures still surface as
+    # regular JSON errors from the route
+    first = next(chunks, '')
+    # The request is torn down before the body is sent, so the stream itself
+    # records the request's metrics and audit entry once it ends
+    request_metrics = metrics.current()
+    g.streaming = True
+    audited = (request.path, request.get_json(silent=True), request.headers.get('Accept', ''),
+               request.headers.get('Prefer', ''))
+
+    def events():
+        with metrics.resumed(request_metrics):
+            try:
+                yield sse_event({'text': first})
+                for text in chunks:
+                    yield sse_event({'text': text})
+                yield sse_event({}, 'done')
+            except Exception as e:
+                app.logger.error(f"Server error while streaming response: {e}")
+                yield sse_event({'error': 'Internal server error'}, 'error')
+            finally:
+                if request_metrics is not None:
+                    audit_request(metrics.record_request(request_metrics), *audited)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+class TimedJSONProvider(DefaultJSONProvider):
+    # Request bodies are decoded and answers encoded through the app's JSON
+    # provider, which makes it the place to time the parse/serialize phases
+    def loads(self, s, **kwargs):
+        with metrics.phase('parse'):
+            return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        with metrics.phase('serialize'):
+            return super().response(*args, **kwargs)
+
+app.json = TimedJSONProvider(app)
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_token = metrics.start_request(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+def record_response_status(response):
+    metrics.set_status(response.status_code)
+    return response
+
+def audit_request(finished, route, data, accept='', prefer='', upload=None):
+    """Queues the audit record of a finished API call (data is its JSON body, upload a file's metadata)."""
+    if audit_log is None or finished is None:
+        return
+    entry = {
+        'ts': round(time.time() - finished.seconds, 3),
+        'route': route,
+        'status': finished.status,
+        'language': finished.language,
+        'latency_ms': round(finished.seconds * 1000, 1),
+        'input_tokens': finished.input_tokens,
+        'output_tokens': finished.output_tokens,
+        'cache': finished.cache,
+        # Only the headers that change how a route answers
+        'headers': {name: value for name, value in (('Accept', accept if 'text/event-stream' in accept else ''),
+                                                    ('Prefer', prefer)) if value},
+    }
+    if isinstance(data, dict):
+        entry['input'] = normalize_input(data, app.config['AUDIT_MAX_INPUT_CHARS'])
+    if upload is not None:
+        entry['upload'] = upload
+    audit_log.record(entry)
+
+def request_upload():
+    # Uploaded bodies are recorded by their form fields and size only
+    if request.is_json:
+        return None
+    upload = {'bytes': request.content_length or 0, 'content_type': request.mimetype,
+              'form': normalize_input(request.form.to_dict(), app.config['AUDIT_MAX_INPUT_CHARS'])}
+    if 'file' in request.files:
+        upload['filename'] = request.files['file'].filename
+    return upload
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    # Streamed answers are recorded by their stream once it ends instead
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        streaming = g.pop('streaming', False)
+        finished = metrics.finish_request(token, 500 if exc is not None else None, deferred=streaming)
+        if request.method == 'POST' and not streaming:
+            audit_request(finished, request.path, request.get_json(silent=True) if request.is_json else None,
+                          request.headers.get('Accept', ''), request.headers.get('Prefer', ''), request_upload())
+
+def shed(e):
+    metrics.ADMISSION_REJECTED.inc(reason=e.reason, **metrics.labels())
+    metrics.record_error(e.reason)
+    app.logger.warning(f"Shedding request ({e.reason}): {e}")
+
+@app.before_request
+def admit_request():
+    feature = ADMISSION_FEATURES.get(request.path) if request.method == 'POST' else None
+    if feature is None:
+        return None
+    try:
+        rate_limiter.check(*client_keys(request.remote_addr, request.headers.get('X-Session-Id')))
+        with metrics.phase('queue'):
+            admission.acquire(feature)
+    except Rejected as e:
+        shed(e)
+        return jsonify({'error': str(e)}), e.status, {'Retry-After': str(e.retry_after)}
+    g.admitted_feature = feature
+
+@app.teardown_request
+def release_admission(exc):
+    feature = g.pop('admitted_feature', None)
+    if feature is not None:
+        admission.release(feature)
+
+def render_page(template):
+    # Served from the prerendered copy when there is one
+    response = static_pages.response(template)
+    return render_template(template) if response is None else response
+
+@app.template_global()
+def asset_url(name):
+    # Versioned by content hash, so browsers can keep a bundle until it changes
+    key = f"asset:{name}"
+    return url_for('asset', name=name, v=static_pages.digest(key)[:12] if key in static_pages else None)
+
+@app.route('/assets/<name>')
+def asset(name):
+    response = static_pages.response(f"asset:{name}")
+    if response is None:
+        raise NotFound()
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
     try:
-        return render_template('index.html')
+        return render_page('index.html')
     except Exception as e:
         app.logger.error(f"Error rendering index page: {e}")
         raise InternalServerError("Failed to load the home page")
@@ -74,39 +702,47 @@ def index():
 @app.route('/chatbot')
 def chatbot():
     try:
-        return render_template('chatbot.html')
+        return render_page('chatbot.html')
     except Exception as e:
         app.logger.error(f"Error rendering chatbot page: {e}")
         raise InternalServerError("Failed to load the chatbot page")
 
+def chat_call(data):
+    user_input = data.get('message')
+    language = data.get('language', 'en-US')
+    if not user_input or not isinstance(user_input, str) or not user_input.strip():
+        raise BadRequest("Invalid or empty message")
+    session_id = data.get('session_id')
+    if session_id is None:
+        return LLMCall('chat', language, user_input, 'response', user_input)
+    if not isinstance(session_id, str) or not 0 < len(session_id) <= 128:
+        raise BadRequest("Invalid session_id")
+
+    summary, turns = chat_sessions.context(session_id)
+    if not summary and not turns:
+        return LLMCall('chat', language, user_input, 'response', user_input, (session_id, user_input))
+    # Follow-ups depend on the conversation, so they skip the FAQ index
+    prompt = prompts.render('chat_followup', language, summary=summary or 'None',
+                            history=format_turns(turns), message=user_input)
+    return LLMCall('chat', language, prompt, 'response', None, (session_id, user_input))
+
 @app.route('/chat', methods=['POST'])
 def chat():
     try:
         if not request.is_json:
             raise BadRequest("Request must be JSON")
         data = request.json
-        user_input = data.get('message')
-        language = data.get('language', 'en-US')
-        if not user_input or not isinstance(user_input, str) or not user_input.strip():
-            raise BadRequest("Invalid or empty message")
-
-        system_instruction = language_instructions.get(language, language_instructions['en-US'])
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash',
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.5,
-                max_output_tokens=1000
-            ),
-            system_instruction=system_instruction
-        )
-
-        response = model.generate_content(user_input)
-        bot_response = response.text
-
-        return jsonify({'response': bot_response})
+        call = chat_call(data)
+
+        if wants_stream(data):
+            return sse_response(stream_text(call))
+        return jsonify({call.response_key: generate_text(call)})
     except BadRequest as e:
         app.logger.warning(f"Bad request: {e}")
         return jsonify({'error': str(e)}), 400
+    except upstream.GoogleAPIError as e:
+        app.logger.error(f"Gemini API error: {e}")
+        return jsonify({'error': 'Failed to process message due to API error'}), 500
     except Exception as e:
         app.logger.error(f"Server error in chat route: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -114,56 +750,61 @@ def chat():
 @app.route('/schemes')
 def schemes():
     try:
-        return render_template('schemes.html')
+        return render_page('schemes.html')
     except Exception as e:
         app.logger.error(f"Error rendering schemes page: {e}")
         raise InternalServerError("Failed to load the schemes page")
 
+def get_schemes_call(data):
+    state = data.get('state')
+    village = data.get('village')
+
+    if not state or not village:
+        raise BadRequest("State and village/town are required")
+
+    language = prompts.state_language(state)
+    query = prompts.render('schemes', language, village=village, state=state)
+    return LLMCall('schemes', language, query, 'schemes')
+
+def village_match(data, state):
+    """The knowledge base's closest match for the requested village, or None."""
+    district = data.get('district')
+    with metrics.phase('knowledge'):
+        matches = knowledge.find_villages(state, data['village'], district if isinstance(district, str) else None)
+    metrics.note_cache('knowledge', 'hit' if matches else 'miss')
+    return matches[0] if matches else None
+
+def phrase_facts(feature, language, facts):
+    # The model only rewrites what the knowledge base found, and only for
+    # languages other than English
+    if language == prompts.DEFAULT_LANGUAGE:
+        return facts
+    try:
+        return generate_text(LLMCall(feature, language, prompts.render(f"{feature}_phrase", language, facts=facts), None))
+    except upstream.GoogleAPIError as e:
+        app.logger.warning(f"Gemini API error, answering in English: {e}")
+        return facts
+
 @app.route('/get_schemes', methods=['POST'])
 def get_schemes():
     try:
         data = request.json
-        state = data.get('state')
-        village = data.get('village')
-
-        if not state or not village:
-            raise BadRequest("State and village/town are required")
-
-        # Determine language based on state (simplified for this context)
-        state_normalized = state.lower().strip()
-        language = {
-            'karnataka': 'kn-IN',
-            'tamil nadu': 'ta-IN',
-            'telangana': 'te-IN',
-            'andhra pradesh': 'te-IN',
-            'maharashtra': 'hi-IN',
-            'gujarat': 'hi-IN',
-            'madhya pradesh': 'hi-IN',
-            'uttar pradesh': 'hi-IN',
-            'bihar': 'hi-IN',
-            'rajasthan': 'hi-IN'
-        }.get(state_normalized, 'en-US')
-
-        query = (f"List the Government of India (GOI) schemes available for the village/town {village} in the state {state}, "
-                 "focusing on rural financial schemes like farming loans, housing, or subsidies. Provide the scheme names and a brief description "
-                 "in a bulleted list format using '-' as the bullet marker. Use simple language suitable for villagers with no prior knowledge. "
-                 f"Respond in {language}. Do not use Markdown formatting like '**' for emphasis; use plain text instead.")
-        
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash',
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.5,
-                max_output_tokens=1000
-            )
-        )
-
-        response = model.generate_content(query)
-        schemes_response = response.text
-
-        return jsonify({'schemes': schemes_response})
+        call = get_schemes_call(data)
+
+        # States the knowledge base knows are answered from it
+        state = resolve_state(data['state'])
+        if state is None or not knowledge.schemes_for(state):
+            return jsonify({call.response_key: generate_text(call)})
+        match = village_match(data, state)
+        schemes = knowledge.schemes_for(state, match and match.district)
+        text = phrase_facts('schemes', prompts.state_language(state), describe_schemes(schemes, state, match))
+        return jsonify({'schemes': text, 'village': match._asdict() if match else None})
     except BadRequest as e:
         app.logger.warning(f"Bad request: {e}")
         return jsonify({'error': str(e)}), 400
+    except upstream.GoogleAPIError as e:
+        app.logger.error(f"Gemini API error: {e}")
+        return jsonify({'error': 'Failed to fetch schemes due to API error'}), 500
     except Exception as e:
         app.logger.error(f"Server error in get_schemes route: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -179,75 +820,119 @@ def upload_form():
                 raise BadRequest("No file selected")
             if file and allowed_file(file.filename):
                 filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-
-                # Read file content (supporting PDF for now)
-                text = extract_text_from_file(filepath)
+                data = file.read()
                 language = request.form.get('language', 'en-US')
 
-                system_instruction = language_instructions.get(language, language_instructions2['en-US'])
-                model = genai.GenerativeModel(
-                    'gemini-2.0-flash',
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.5,
-                        max_output_tokens=2000
-                    ),
-                    system_instruction=system_instruction
-                )
-
-                query = f"Extract key information (e.g., account number, name, address, date) from the following bank-related form text: {text}. Provide step-by-step guidance in {language} on how to fill out this form, using simple language suitable for villagers with no prior knowledge."
-                response = model.generate_content(query)
-                guidance = response.text
+                if wants_async():
+                    job_id = form_jobs.submit('form', {'filename': filename, 'language': language}, data,
+                                              os.path.splitext(filename)[1])
+                    status_url = url_for('job_status', job_id=job_id)
+                    return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': status_url,
+                                    'events_url': url_for('job_events', job_id=job_id)}), 202, {'Location': status_url}
+                return jsonify(analyze_form(filename, data, language))
 
-                os.remove(filepath)  # Clean up uploaded file
-                return jsonify({'guidance': guidance})
-
-        return render_template('upload_form.html')
+        return render_page('upload_form.html')
     except BadRequest as e:
         app.logger.warning(f"Bad request: {e}")
         return jsonify({'error': str(e)}), 400
+    except upstream.GoogleAPIError as e:
+        app.logger.error(f"Gemini API error: {e}")
+        return jsonify({'error': 'Failed to process form due to API error'}), 500
     except Exception as e:
         app.logger.error(f"Server error in upload_form route: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def wants_async():
+    # Job mode is opt-in too; everyone else still waits for the guidance
+    return 'respond-async' in request.headers.get('Prefer', '') or request.form.get('mode') == 'async'
+
+def analyze_form(filename, data, language):
+    # Repeat uploads of a known form skip extraction and the LLM call
+    digest = form_cache.digest(data)
+    system_instruction = models.instruction('form', language)
+    guidance = form_cache.get_guidance(digest, language, system_instruction)
+    metrics.set_language(language)
+    metrics.record_cache('form', guidance is not None)
+    usage = {'input_tokens': 0, 'output_tokens': 0, 'chunks': 0}
+    if guidance is None:
+        # Read file content straight from the upload: PDF text, or OCR for photos
+        with metrics.phase('extract'):
+            text = extract_text_from_file(filename, data, digest, language)
+
+        if text in UNREADABLE or not text.strip():
+            # Nothing for the model to work with; the message is the answer
+            app.logger.warning(f"No text read from uploaded form {filename}")
+            return {'guidance': text if text.strip() else NO_TEXT_FOUND, 'usage': usage}
+        guidance, usage = form_guidance(text, language)
+        form_cache.set_guidance(digest, language, system_instruction, guidance)
+    return {'guidance': guidance, 'usage': usage}
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    status = form_jobs.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    status = form_jobs.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+
+    def events(status):
+        # Sends the status whenever it changes, with a comment line in between
+        # so proxies keep the connection open
+        last = None
+        while status is not None:
+            if status != last:
+                yield sse_event(status, 'status')
+                last = status
+                if status['status'] in FINISHED:
+                    return
+            else:
+                yield ': waiting\n\n'
+            time.sleep(0.5)
+            status = form_jobs.status(job_id)
+        yield sse_event({'error': 'Unknown or expired job'}, 'error')
+
+    return Response(stream_with_context(events(status)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/atm_guide')
 def atm_guide():
     try:
-        return render_template('atm_guide.html')
+        return render_page('atm_guide.html')
     except Exception as e:
         app.logger.error(f"Error rendering atm_guide page: {e}")
         raise InternalServerError("Failed to load the ATM guide page")
 
+def process_atm_voice_call(data):
+    transcript = data.get('transcript')
+    language = data.get('language', 'en-US')
+    if not transcript or not isinstance(transcript, str) or not transcript.strip():
+        raise BadRequest("Invalid or empty transcript")
+
+    query = prompts.render('atm', language, transcript=transcript)
+    return LLMCall('atm', language, query, 'guidance', transcript)
+
 @app.route('/process_atm_voice', methods=['POST'])
 def process_atm_voice():
     try:
         if not request.is_json:
             raise BadRequest("Request must be JSON")
         data = request.json
-        transcript = data.get('transcript')
-        language = data.get('language', 'en-US')
-        if not transcript or not isinstance(transcript, str) or not transcript.strip():
-            raise BadRequest("Invalid or empty transcript")
-
-        system_instruction = atm_instructions.get(language, atm_instructions['en-US'])
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash',
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.5,
-                max_output_tokens=1000
-            ),
-            system_instruction=system_instruction
-        )
-
-        query = f"The user described the ATM interface as: {transcript}. Provide step-by-step guidance on how to operate the ATM based on this description."
-        response = model.generate_content(query)
-        guidance = response.text
-
-        return jsonify({'guidance': guidance})
+        call = process_atm_voice_call(data)
+
+        if wants_stream(data):
+            return sse_response(stream_text(call))
+        return jsonify({call.response_key: generate_text(call)})
     except BadRequest as e:
         app.logger.warning(f"Bad request: {e}")
         return jsonify({'error': str(e)}), 400
+    except upstream.GoogleAPIError as e:
+        app.logger.error(f"Gemini API error: {e}")
+        return jsonify({'error': 'Failed to process transcript due to API error'}), 500
     except Exception as e:
         app.logger.error(f"Server error in process_atm_voice route: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -256,11 +941,20 @@ def process_atm_voice():
 @app.route('/savings_guide')
 def savings_guide():
     try:
-        return render_template('savings_guide.html')
+        return render_page('savings_guide.html')
     except Exception as e:
         app.logger.error(f"Error rendering savings_guide page: {e}")
         raise InternalServerError("Failed to load the savings guide page")
 
+def process_savings_query_call(data):
+    query = data.get('query')
+    language = data.get('language', 'en-US')
+    if not query or not isinstance(query, str) or not query.strip():
+        raise BadRequest("Invalid or empty query")
+
+    prompt = prompts.render('savings', language, query=query)
+    return LLMCall('savings', language, prompt, 'guidance', query)
+
 # New route to process savings account queries
 @app.route('/process_savings_query', methods=['POST'])
 def process_savings_query():
@@ -268,30 +962,15 @@ def process_savings_query():
         if not request.is_json:
             raise BadRequest("Request must be JSON")
         data = request.json
-        query = data.get('query')
-        language = data.get('language', 'en-US')
-        if not query or not isinstance(query, str) or not query.strip():
-            raise BadRequest("Invalid or empty query")
-
-        system_instruction = savings_instructions.get(language, savings_instructions['en-US'])
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash',
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.5,
-                max_output_tokens=1000
-            ),
-            system_instruction=system_instruction
-        )
-
-        prompt = f"The user asked the following about their savings account: {query}. Provide step-by-step guidance on how to perform the task or understand the concept based on this query."
-        response = model.generate_content(prompt)
-        guidance = response.text
-
-        return jsonify({'guidance': guidance})
+        call = process_savings_query_call(data)
+
+        if wants_stream(data):
+            return sse_response(stream_text(call))
+        return jsonify({call.response_key: generate_text(call)})
     except BadRequest as e:
         app.logger.warning(f"Bad request: {e}")
         return jsonify({'error': str(e)}), 400
-    except GoogleAPIError as e:
+    except upstream.GoogleAPIError as e:
         app.logger.error(f"Gemini API error: {e}")
         return jsonify({'error': 'Failed to process query due to API error'}), 500
     except Exception as e:
@@ -301,188 +980,252 @@ def process_savings_query():
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'pdf', 'jpg', 'jpeg', 'png'}
 
-def extract_text_from_file(filepath):
-    try:
-        if filepath.lower().endswith('.pdf'):
-            with open(filepath, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                text = ''
-                for page in reader.pages:
-                    text += page.extract_text() or ''
-                return text
-        else:  # For images, you'd need OCR (e.g., Tesseract), but for simplicity, return a placeholder
-            return "Image file uploaded; text extraction not supported yet. Please upload a PDF."
+def form_guidance(text, language):
+    """Guidance for a form's text, and the tokens spent producing it.
+
+    Text within FORM_TOKEN_BUDGET goes to the model in one prompt. Longer
+    text is split into field-bearing chunks whose fields are extracted
+    concurrently, then merged into a single guidance answer.
+    """
+    if estimate_tokens(text) <= app.config['FORM_TOKEN_BUDGET']:
+        query = prompts.render('form', language, text=text)
+        completions = [generate_completion(LLMCall('form', language, query, 'guidance'))]
+        chunks = 1
+    else:
+        chunks = split_fields(text, app.config['FORM_CHUNK_TOKENS'])
+        calls = [LLMCall('form_fields', language, prompts.render('form_fields', language, chunk=chunk), 'fields') for chunk in chunks]
+        # Each chunk runs in a copy of this request's context so its timings and
+        # tokens are still attributed to it
+        futures = [form_chunk_pool.submit(contextvars.copy_context().run, generate_completion, call) for call in calls]
+        completions = [future.result() for future in futures]
+        fields = '\n'.join(completion.text.strip() for completion in completions)
+        query = prompts.render('form_merge', language, fields=fields)
+        completions.append(generate_completion(LLMCall('form', language, query, 'guidance')))
+        chunks = len(chunks)
+
+    usage = {
+        'input_tokens': sum(completion.input_tokens for completion in completions),
+        'output_tokens': sum(completion.output_tokens for completion in completions),
+        'chunks': chunks
+    }
+    app.logger.info(f"Form guidance: {chunks} chunk(s), {usage['input_tokens']} input / {usage['output_tokens']} output tokens")
+    return completions[-1].text, usage
+
+EXTRACTION_ERROR = "Error extracting text from the uploaded file."
+OCR_UNAVAILABLE = "Photos of forms cannot be read on this server yet. Please upload a PDF."
+OCR_TIMEOUT = "The photo took too long to read. Please upload a smaller or clearer photo, or a PDF."
+PDF_TIMEOUT = "The PDF took too long to read. Please upload a smaller PDF or a photo of the form."
+NO_TEXT_FOUND = "No text could be read from the uploaded file. Please upload a clearer photo or a PDF."
+UNREADABLE = (EXTRACTION_ERROR, OCR_UNAVAILABLE, OCR_TIMEOUT, PDF_TIMEOUT)
+
+def extract_text_from_file(filename, data, digest=None, language='en-US'):
+    try:
+        if filename.lower().endswith('.pdf'):
+            text = form_cache.get_text(digest) if digest else None
+            if text is None:
+                text = pdf_extractor.extract(data)
+                if digest:
+                    form_cache.set_text(digest, text)
+            return text
+        if not image_ocr.available:
+            return OCR_UNAVAILABLE
+        # OCR output depends on the language packs used, so it is cached per set
+        languages = ocr_languages(language)
+        key = f"{digest}.{languages}" if digest else None
+        text = form_cache.get_text(key) if key else None
+        if text is None:
+            text = image_ocr.extract(data, languages)
+            if key:
+                form_cache.set_text(key, text)
+        return text
+    except TimeoutError:
+        return PDF_TIMEOUT if filename.lower().endswith('.pdf') else OCR_TIMEOUT
     except Exception as e:
         app.logger.error(f"Error extracting text from file: {e}")
-        return "Error extracting text from the uploaded file."
+        return EXTRACTION_ERROR
     
-# Add this with your other system instructions
-fixed_deposit_instructions = {
-    "en-US": "You are a helpful assistant for Indian villagers with no prior financial knowledge. The user will ask questions about managing a fixed deposit (e.g., 'How do I open a fixed deposit?', 'When will my deposit mature?'). Provide step-by-step guidance in English on how to perform the task or understand the concept, using simple language and examples relevant to rural life (e.g., saving for a wedding or buying a tractor). Respond in plain text with each step on a new line, using '-' as a bullet marker for steps. Do not use Markdown formatting like '**' or '*' for emphasis. Assume the user knows nothing about fixed deposits.",
-    "hi-IN": "आप भारतीय ग्रामीणों के लिए एक सहायक हैं जिनका वित्तीय ज्ञान नहीं है। उपयोगकर्ता निश्चित जमा (फिक्स्ड डिपॉजिट) के प्रबंधन के बारे में सवाल पूछेगा (जैसे, 'मैं निश्चित जमा कैसे खोलूं?', 'मेरी जमा कब परिपक्व होगी?')। हिंदी में कार्य करने या अवधारणा को समझने के लिए चरण-दर-चरण मार्गदर्शन करें, ग्रामीण जीवन (जैसे, शादी के लिए बचत करना या ट्रैक्टर खरीदना) से संबंधित सरल भाषा और उदाहरणों का उपयोग करें। सादे टेक्स्ट में जवाब दें, प्रत्येक चरण को नई पंक्ति पर लिखें, चरणों के लिए '-' बुलेट मार्कर का उपयोग करें। मार्कडाउन फॉर्मेटिंग जैसे '**' या '*' का उपयोग न करें। मान लें कि उपयोगकर्ता को निश्चित जमा के बारे में कुछ भी नहीं पता है।",
-    "kn-IN": "ನೀವು ಭಾರತೀಯ ಗ್ರಾಮೀಣರಿಗಾಗಿ ಸಹಾಯಕ ಸಹಾಯಕರಾಗಿದ್ದೀರಿ, ಅವರಿಗೆ ಆರ್ಥಿಕ ಜ್ಞಾನ ಇಲ್ಲ. ಬಳಕೆದಾರರು ನಿಶ್ಚಿತ ಠೇವಣಿ (ಫಿಕ್ಸ್ಡ್ ಡಿಪಾಜಿಟ್) ನಿರ್ವಹಣೆಯ ಬಗ್ಗೆ ಪ್ರಶ್ನೆಗಳನ್ನು ಕೇಳುತ್ತಾರೆ (ಉದಾ., 'ನಾನು ನಿಶ್ಚಿತ ಠೇವಣಿ ಹೇಗೆ ತೆರೆಯಬೇಕು?', 'ನನ್ನ ಠೇವಣಿ ಯಾವಾಗ ಪರಿಪಕ್ವವಾಗುತ್ತದೆ?'). ಕನ್ನಡದಲ್ಲಿ ಕಾರ್ಯವನ್ನು ಮಾಡುವ ಅಥವಾ ಪರಿಕಲ್ಪನೆಯನ್ನು ಅರ್ಥಮಾಡಿಕೊಳ್ಳುವ ಬಗ್ಗೆ ಹಂತ-ಹಂತದ ಮಾರ್ಗದರ್ಶನವನ್ನು ಒದಗಿಸಿ, ಗ್ರಾಮೀಣ ಜೀವನಕ್ಕೆ ಸಂಬಂಧಿಸಿದ ಸರಳ ಭಾಷೆ ಮತ್ತು ಉದಾಹರಣೆಗಳನ್ನು ಬಳಸಿ (ಉದಾ., ಮದುವೆಗಾಗಿ ಉಳಿತಾಯ ಮಾಡುವುದು ಅಥವಾ ಟ್ರಾಕ್ಟರ್ ಖರೀದಿಸುವುದು). ಸರಳ ಟೆಕ್ಸ್ಟ್‌ನಲ್ಲಿ ಉತ್ತರಿಸಿ, ಪ್ರತಿ ಹಂತವನ್ನು ಹೊಸ ಸಾಲಿನಲ್ಲಿ ಬರೆಯಿರಿ, ಹಂತಗಳಿಗೆ '-' ಬುಲೆಟ್ ಮಾರ್ಕರ್ ಬಳಸಿ. '**' ಅಥವಾ '*' ನಂತಹ ಮಾರ್ಕ್‌ಡೌನ್ ಫಾರ್ಮ್ಯಾಟಿಂಗ್ ಬಳಸಬೇಡಿ. ಬಳಕೆದಾರನಿಗೆ ನಿಶ್ಚಿತ ಠೇವಣಿಗಳ ಬಗ್ಗೆ ಏನೂ ಗೊತ್ತಿಲ್ಲ ಎಂದು ಭಾವಿಸಿ.",
-    "ta-IN": "நீங்கள் இந்திய கிராமவாசிகளுக்கு உதவி செய்யும் உதவியாளர், அவர்களுக்கு நிதி அறிவு இல்லை. பயனர் நிர்ணயிக்கப்பட்ட கடனை (ஃபிக்ஸ்ட் டெபாசிட்) நிர்வகிப்பது பற்றி கேள்விகளைக் கேட்பார் (எ.கா., 'நான் நிர்ணயிக்கப்பட்ட கடனை எப்படி திறப்பது?', 'எப்போது என் கடன் முடியும்?'). தமிழில் பணியைச் செய்வது அல்லது கருத்தைப் புரிந்துகொள்வது பற்றி படி-படியாக வழிகாட்டுதலை வழங்கவும், கிராமப்புற வாழ்க்கைக்கு தொடர்புடைய எளிய மொழி மற்றும் எடுத்துக்காட்டுகளைப் பயன்படுத்தவும் (எ.கா., திருமணத்திற்காக சேமிப்பது அல்லது டிராக்டரை வாங்குவது). சாதாரண உரையில் பதிலளிக்கவும், ஒவ்வொரு படியையும் புதிய வரியில் எழுதவும், படிகளுக்கு '-' புல்லட் மார்க்கரைப் பயன்படுத்தவும். '**' அல்லது '*' போன்ற மார்க்டவுன் வடிவமைப்பைப் பயன்படுத்த வேண்டாம். பயனருக்கு நிர்ணயிக்கப்பட்ட கடன்கள் பற்றி எதுவும் தெரியாது என்று கருதவும்.",
-    "te-IN": "మీరు భారతీయ గ్రామస్తులకు సహాయపడే సహాయకుడు, వీరికి ఆర్థిక జ్ఞానం లేదు. బಳకాలు స్థిర డిపాజిట్‌ను నిర్వహించడం గురించి ప్రశ్నలు అడుగుతారు (ఉదా., 'నేను స్థిర డిపాజిట్‌ను ఎలా తెరవాలి?', 'నా డిపాజిట్ ఎప్పుడు మెచ్యూర్ అవుతుంది?'). తెలుగులో ఆ పనిని ఎలా చేయాలి లేదా భావనను ఎలా అర్థం చేసుకోవాలి అనే దానిపై దశ-దశల వారీగా మార్గదర్శకం ఇవ్వండి, గ్రామీణ జీవన విధానానికి సంబంధించిన సరళమైన భాష మరియు ఉదాహరణలను ఉపయోగించండి (ఉదా., వివాహానికి ఆదా చేయడం లేదా ట్రాక్టర్ కొనుగోలు చేయడం). సాదా టెక్స్ట్‌లో సమాధానం ఇవ్వండి, ప్రతి దశను కొత్త లైన్‌లో రాయండి, దశలకు '-' బుల్లెట్ మార్కర్‌ని ఉపయోగించండి. '**' లేదా '*' వంటి మార్క్‌డౌన్ ఫార్మాటింగ్‌ని ఉపయోగించవద్దు. బಳకాలకు స్థిర డిపాజిట్‌ల గురించి ఏమీ తెలియదని భావించండి."
-}
-
 # Add these routes with your other routes
 @app.route('/fixed_deposit_guide')
 def fixed_deposit_guide():
     try:
-        return render_template('fixed_deposit_guide.html')
+        return render_page('fixed_deposit_guide.html')
     except Exception as e:
         app.logger.error(f"Error rendering fixed_deposit_guide page: {e}")
         raise InternalServerError("Failed to load the fixed deposit guide page")
 
+def process_fixed_deposit_query_call(data):
+    query = data.get('query')
+    language = data.get('language', 'en-US')
+    if not query or not isinstance(query, str) or not query.strip():
+        raise BadRequest("Invalid or empty query")
+
+    prompt = prompts.render('fixed_deposit', language, query=query)
+    return LLMCall('fixed_deposit', language, prompt, 'guidance', query)
+
 @app.route('/process_fixed_deposit_query', methods=['POST'])
 def process_fixed_deposit_query():
     try:
         if not request.is_json:
             raise BadRequest("Request must be JSON")
         data = request.json
-        query = data.get('query')
-        language = data.get('language', 'en-US')
-        if not query or not isinstance(query, str) or not query.strip():
-            raise BadRequest("Invalid or empty query")
-
-        system_instruction = fixed_deposit_instructions.get(language, fixed_deposit_instructions['en-US'])
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash',
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.5,
-                max_output_tokens=1000
-            ),
-            system_instruction=system_instruction
-        )
-
-        prompt = f"The user asked the following about their fixed deposit: {query}. Provide step-by-step guidance on how to perform the task or understand the concept based on this query."
-        response = model.generate_content(prompt)
-        guidance = response.text
-
-        return jsonify({'guidance': guidance})
+        call = process_fixed_deposit_query_call(data)
+
+        if wants_stream(data):
+            return sse_response(stream_text(call))
+        return jsonify({call.response_key: generate_text(call)})
     except BadRequest as e:
         app.logger.warning(f"Bad request: {e}")
         return jsonify({'error': str(e)}), 400
-    except GoogleAPIError as e:
+    except upstream.GoogleAPIError as e:
         app.logger.error(f"Gemini API error: {e}")
         return jsonify({'error': 'Failed to process query due to API error'}), 500
     except Exception as e:
         app.logger.error(f"Server error in process_fixed_deposit_query route: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-# Add this with your other system instructions
-current_account_instructions = {
-    "en-US": "You are a helpful assistant for Indian villagers with no prior financial knowledge. The user will ask questions about managing a current account (e.g., 'How do I check my balance?', 'How do I issue a cheque?'). Provide step-by-step guidance in English on how to perform the task or understand the concept, using simple language and examples relevant to rural life (e.g., paying for shop supplies or receiving payment for crops). Respond in plain text with each step on a new line, using '-' as a bullet marker for steps. Do not use Markdown formatting like '**' or '*' for emphasis. Assume the user knows nothing about current accounts.",
-    "hi-IN": "आप भारतीय ग्रामीणों के लिए एक सहायक हैं जिनका वित्तीय ज्ञान नहीं है। उपयोगकर्ता चालू खाते के प्रबंधन के बारे में सवाल पूछेगा (जैसे, 'मैं अपना बैलेंस कैसे चेक करूं?', 'मैं चेक कैसे जारी करूं?')। हिंदी में कार्य करने या अवधारणा को समझने के लिए चरण-दर-चरण मार्गदर्शन करें, ग्रामीण जीवन (जैसे, दुकान के लिए सामान का भुगतान करना या फसल के लिए भुगतान प्राप्त करना) से संबंधित सरल भाषा और उदाहरणों का उपयोग करें। सादे टेक्स्ट में जवाब दें, प्रत्येक चरण को नई पंक्ति पर लिखें, चरणों के लिए '-' बुलेट मार्कर का उपयोग करें। मार्कडाउन फॉर्मेटिंग जैसे '**' या '*' का उपयोग न करें। मान लें कि उपयोगकर्ता को चालू खातों के बारे में कुछ भी नहीं पता है।",
-    "kn-IN": "ನೀವು ಭಾರತೀಯ ಗ್ರಾಮೀಣರಿಗಾಗಿ ಸಹಾಯಕ ಸಹಾಯಕರಾಗಿದ್ದೀರಿ, ಅವರಿಗೆ ಆರ್ಥಿಕ ಜ್ಞಾನ ಇಲ್ಲ. ಬಳಕೆದಾರರು ಪ್ರಸ್ತುತ ಖಾತೆಯನ್ನು ನಿರ್ವಹಿಸುವ ಬಗ್ಗೆ ಪ್ರಶ್ನೆಗಳನ್ನು ಕೇಳುತ್ತಾರೆ (ಉದಾ., 'ನಾನು ನನ್ನ ಬ್ಯಾಲೆನ್ಸ್ ಹೇಗೆ ಪರಿಶೀಲಿಸುವುದು?', 'ನಾನು ಚೆಕ್ ಹೇಗೆ an issue ಮಾಡುವುದು?'). ಕನ್ನಡದಲ್ಲಿ ಕಾರ್ಯವನ್ನು ಮಾಡುವ ಅಥವಾ ಪರಿಕಲ್ಪನೆಯನ್ನು ಅರ್ಥಮಾಡಿಕೊಳ್ಳುವ ಬಗ್ಗೆ ಹಂತ-ಹಂತದ ಮಾರ್ಗದರ್ಶನವನ್ನು ಒದಗಿಸಿ, ಗ್ರಾಮೀಣ ಜೀವನಕ್ಕೆ ಸಂಬಂಧಿಸಿದ ಸರಳ ಭಾಷೆ ಮತ್ತು ಉದಾಹರಣೆಗಳನ್ನು ಬಳಸಿ (ಉದಾ., ಅಂಗಡಿಗಳ ಸರಕುಗಳನ್ನು ಪಾವತಿಸುವುದು ಅಥವಾ ಬೆಳೆಗೆ ಪಾವತಿ ಪಡೆಯುವುದು). ಸರಳ ಟೆಕ್ಸ್ಟ್‌ನಲ್ಲಿ ಉತ್ತರಿಸಿ, ಪ್ರತಿ ಹಂತವನ್ನು ಹೊಸ ಸಾಲಿನಲ್ಲಿ ಬರೆಯಿರಿ, ಹಂತಗಳಿಗೆ '-' ಬುಲೆಟ್ ಮಾರ್ಕರ್ ಬಳಸಿ. '**' ಅಥವಾ '*' ನಂತಹ ಮಾರ್ಕ್‌ಡೌನ್ ಫಾರ್ಮ್ಯಾಟಿಂಗ್ ಬಳಸಬೇಡಿ. ಬಳಕೆದಾರನಿಗೆ ಪ್ರಸ್ತುತ ಖಾತೆಗಳ ಬಗ್ಗೆ ಏನೂ ಗೊತ್ತಿಲ್ಲ ಎಂದು ಭಾವಿಸಿ.",
-    "ta-IN": "நீங்கள் இந்திய கிராமவாசிகளுக்கு உதவி செய்யும் உதவியாளர், அவர்களுக்கு நிதி அறிவு இல்லை. பயனர் தற்போதைய கணக்கை நிர்வகிப்பது பற்றி கேள்விகளைக் கேட்பார் (எ.கா., 'நான் என் பேலன்ஸை எப்படி பார்ப்பது?', 'நான் ஒரு செக் எப்படி வெளியிடுவது?'). தமிழில் பணியைச் செய்வது அல்லது கருத்தைப் புரிந்துகொள்வது பற்றி படி-படியாக வழிகாட்டுதலை வழங்கவும், கிராமப்புற வாழ்க்கைக்கு தொடர்புடைய எளிய மொழி மற்றும் எடுத்துக்காட்டுகளைப் பயன்படுத்தவும் (எ.கா., கடைகளுக்கான பொருட்களைச் செலுத்துதல் அல்லது பயிர்களுக்கான பணம் பெறுதல்). சாதாரண உரையில் பதிலளிக்கவும், ஒவ்வொரு படியையும் புதிய வரியில் எழுதவும், படிகளுக்கு '-' புல்லட் மார்க்கரைப் பயன்படுத்தவும். '**' அல்லது '*' போன்ற மார்க்டவுன் வடிவமைப்பைப் பயன்படுத்த வேண்டாம். பயனருக்கு தற்போதைய கணக்குகள் பற்றி எதுவும் தெரியாது என்று கருதவும்.",
-    "te-IN": "మీరు భారతీయ గ్రామస్తులకు సహాయపడే సహాయకుడు, వీరికి ఆర్థిక జ్ఞానం లేదు. బಳకాలు ప్రస్తుత ఖాతాను నిర్వహించడం గురించి ప్రశ్నలు అడుగుతారు (ఉదా., 'నేను నా బ్యాలెన్స్‌ను ఎలా చెక్ చేయాలి?', 'నేను చెక్‌ను ఎలా జారీ చేయాలి?'). తెలుగులో ఆ పనిని ఎలా చేయాలి లేదా భావనను ఎలా అర్థం చేసుకోవాలి అనే దానిపై దశ-దశల వారీగా మార్గదర్శకం ఇవ్వండి, గ్రామీణ జీవన విధానానికి సంబంధించిన సరళమైన భాష మరియు ఉదాహరణలను ఉపయోగించండి (ఉదా., షాప్ సరకులకు చెల్లింపు చేయడం లేదా పంటలకు చెల్లింపు పొందడం). సాదా టెక్స్ట్‌లో సమాధానం ఇవ్వండి, ప్రతి దశను కొత్త లైన్‌లో రాయండి, దశలకు '-' బుల్లెట్ మార్కర్‌ని ఉపయోగించండి. '**' లేదా '*' వంటి మార్క్‌డౌన్ ఫార్మాటింగ్‌ని ఉపయోగించవద్దు. బళకాలకు ప్రస్తుత ఖాతాల గురించి ఏమీ తెలియదని భావించండి."
-}
-
 # Add these routes with your other routes
 @app.route('/current_account_guide')
 def current_account_guide():
     try:
-        return render_template('current_account_guide.html')
+        return render_page('current_account_guide.html')
     except Exception as e:
         app.logger.error(f"Error rendering current_account_guide page: {e}")
         raise InternalServerError("Failed to load the current account guide page")
 
+def process_current_account_query_call(data):
+    query = data.get('query')
+    language = data.get('language', 'en-US')
+    if not query or not isinstance(query, str) or not query.strip():
+        raise BadRequest("Invalid or empty query")
+
+    prompt = prompts.render('current_account', language, query=query)
+    return LLMCall('current_account', language, prompt, 'guidance', query)
+
 @app.route('/process_current_account_query', methods=['POST'])
 def process_current_account_query():
     try:
         if not request.is_json:
             raise BadRequest("Request must be JSON")
         data = request.json
-        query = data.get('query')
-        language = data.get('language', 'en-US')
-        if not query or not isinstance(query, str) or not query.strip():
-            raise BadRequest("Invalid or empty query")
-
-        system_instruction = current_account_instructions.get(language, current_account_instructions['en-US'])
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash',
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.5,
-                max_output_tokens=1000
-            ),
-            system_instruction=system_instruction
-        )
-
-        prompt = f"The user asked the following about their current account: {query}. Provide step-by-step guidance on how to perform the task or understand the concept based on this query."
-        response = model.generate_content(prompt)
-        guidance = response.text
-
-        return jsonify({'guidance': guidance})
+        call = process_current_account_query_call(data)
+
+        if wants_stream(data):
+            return sse_response(stream_text(call))
+        return jsonify({call.response_key: generate_text(call)})
     except BadRequest as e:
         app.logger.warning(f"Bad request: {e}")
         return jsonify({'error': str(e)}), 400
-    except GoogleAPIError as e:
+    except upstream.GoogleAPIError as e:
         app.logger.error(f"Gemini API error: {e}")
         return jsonify({'error': 'Failed to process query due to API error'}), 500
     except Exception as e:
         app.logger.error(f"Server error in process_current_account_query route: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-# Add this with your other system instructions
-# Add this with your other system instructions
-microloan_instructions = {
-    "en-US": "You are a helpful assistant for Indian villagers with no prior financial knowledge. The user will provide answers to a microloan eligibility questionnaire: - Owns land or business (yes/no), - Steady income (yes/no), - Existing loans (yes/no), - Dependents (number), - Has bank account (yes/no), - Monthly earnings (in rupees), - Job (e.g., farmer, shopkeeper), - Loan purpose (e.g., to buy a cow or seeds). Based on these answers, estimate their eligibility for a microloan and provide a simple explanation in English, using plain text with '-' as bullet markers for reasons. Do not use stars (*) or any Markdown formatting. Use examples relevant to rural life (e.g., buying seeds, starting a small shop). Assume the user knows nothing about loans. If monthly earnings are low (e.g., less than 5000 rupees) or family size is large (e.g., more than 6) with existing loans, lean toward 'Not Eligible' unless other factors (e.g., steady income, clear loan purpose) strongly support eligibility.",
-    "hi-IN": "आप भारतीय ग्रामीणों के लिए एक सहायक हैं जिनका वित्तीय ज्ञान नहीं है। उपयोगकर्ता माइक्रो ऋण पात्रता प्रश्नावली के जवाब देगा: - भूमि या व्यवसाय का स्वामित्व (हाँ/नहीं), - नियमित आय (हाँ/नहीं), - मौजूदा ऋण (हाँ/नहीं), - आश्रितों की संख्या (संख्या), - बैंक खाता है (हाँ/नहीं), - मासिक आय (रुपये में), - नौकरी (जैसे, किसान, दुकानदार), - ऋण का उद्देश्य (जैसे, गाय खरीदने के लिए या बीज खरीदने के लिए)। इन जवाबों के आधार पर, माइक्रो ऋण के लिए उनकी पात्रता का अनुमान लगाएं और हिंदी में सरल व्याख्या प्रदान करें, सादे टेक्स्ट में '-' बुलेट मार्कर का उपयोग करके कारण बताएं। तारांकन (*) या किसी मार्कडाउन फॉर्मेटिंग का उपयोग न करें। ग्रामीण जीवन (जैसे, बीज खरीदना, छोटी दुकान शुरू करना) से संबंधित उदाहरणों का उपयोग करें। मान लें कि उपयोगकर्ता को ऋण के बारे में कुछ भी नहीं पता है। यदि मासिक आय कम है (जैसे, 5000 रुपये से कम) या परिवार बड़ा है (जैसे, 6 से अधिक) और मौजूदा ऋण हैं, तो 'अनुपयुक्त' की ओर झुकें, जब तक कि अन्य कारक (जैसे, नियमित आय, स्पष्ट ऋण उद्देश्य) पात्रता को मजबूती से समर्थन न करें।",
-    "kn-IN": "ನೀವು ಭಾರತೀಯ ಗ್ರಾಮೀಣರಿಗಾಗಿ ಸಹಾಯಕ ಸಹಾಯಕರಾಗಿದ್ದೀರಿ, ಅವರಿಗೆ ಆರ್ಥಿಕ ಜ್ಞಾನ ಇಲ್ಲ. ಬಳಕೆದಾರರು ಮೈಕ್ರೋ ಸಾಲದ ಆಯ್ಕೆಯ ಪ್ರಶ್ನಾವಳಿಗೆ ಉತ್ತರಗಳನ್ನು ನೀಡುತ್ತಾರೆ: - ಭೂಮಿ ಅಥವಾ ವ್ಯಾಪಾರದ ಸ್ವಾಮ್ಯತ್ವ (ಹೌದು/ಇಲ್ಲ), - ಸ್ಥಿರ ಆದಾಯ (ಹೌದು/ಇಲ್ಲ), - ಇರುವ ಸಾಲಗಳು (ಹೌದು/ಇಲ್ಲ), - ಆಶ್ರಿತರ ಸಂಖ್ಯೆ (ಸಂಖ್ಯೆ), - ಬ್ಯಾಂಕ್ ಖಾತೆ ಇದೆಯೇ (ಹೌದು/ಇಲ್ಲ), - ತಿಂಗಳ ಆದಾಯ (ರೂಪಾಯಿಗಳಲ್ಲಿ), - ಉದ್ಯೋಗ (ಉದಾ., ರೈತ, ಅಂಗಡಿ ಮಾಲೀಕ), - ಸಾಲದ ಉದ್ದೇಶ (ಉದಾ., ಒಂದು ಹಸು ಅಥವಾ ಬೀಜಗಳನ್ನು ಖರೀದಿಸಲು). ಈ ಉತ್ತರಗಳ ಆಧಾರದ ಮೇಲೆ, ಮೈಕ್ರೋ ಸಾಲಕ್ಕೆ ಅವರ ಆಯ್ಕೆಯನ್ನು ಅಂದಾಜಿಸಿ ಮತ್ತು ಕನ್ನಡದಲ್ಲಿ ಸರಳ ವಿವರಣೆಯನ್ನು ಒದಗಿಸಿ, '-' ಬುಲೆಟ್ ಮಾರ್ಕರ್‌ಗಳೊಂದಿಗೆ ಕಾರಣಗಳನ್ನು ಉಲ್ಲೇಖಿಸಿ. ತಾರಾಕಾರ (*) ಅಥವಾ ಯಾವುದೇ ಮಾರ್ಕ್‌ಡೌನ್ ಫಾರ್ಮ್ಯಾಟಿಂಗ್‌ನನ್ನು ಬಳಸಬೇಡಿ. ಗ್ರಾಮೀಣ ಜೀವನಕ್ಕೆ ಸಂಬಂಧಿಸಿದ ಉದಾಹರಣೆಗಳನ್ನು ಬಳಸಿ (ಉದಾ., ಬೀಜ ಖರೀದಿಸುವುದು, ಸಣ್ಣ ಅಂಗಡಿ ಆರಂಭಿಸುವುದು). ಬಳಕೆದಾರನಿಗೆ ಸಾಲಗಳ ಬಗ್ಗೆ ಏನೂ ಗೊತ್ತಿಲ್ಲ ಎಂದು ಭಾವಿಸಿ. ತಿಂಗಳ ಆದಾಯ ಕಡಿಮೆಯಿದ್ದರೆ (ಉದಾ., 5000 ರೂಪಾಯಿಗಳಿಗಿಂತ ಕಡಿಮೆ) ಅಥವಾ ಕುಟುಂಬ ದೊಡ್ಡದಾಗಿದ್ದರೆ (ಉದಾ., 6ಕ್ಕಿಂತ ಹೆಚ್ಚು) ಇರುವ ಸಾಲಗಳೊಂದಿಗೆ, 'ಆಯ್ಕೆಯಾಗದ' ಎಂಬತ್ತಿಗೆ ಒಲವು ತೋರಿಸಿ, ಇತರ ಕಾರಣಗಳು (ಉದಾ., ಸ್ಥಿರ ಆದಾಯ, ಸ್ಪಷ್ಟ ಸಾಲದ ಉದ್ದೇಶ) ಆಯ್ಕೆಗೆ ದೃಢ ಬೆಂಬಲ ನೀಡದೆ ಇದ್ದರೆ.",
-    "ta-IN": "நீங்கள் இந்திய கிராமவாசிகளுக்கு உதவி செய்யும் உதவியாளர், அவர்களுக்கு நிதி அறிவு இல்லை. பயனர் மைக்ரோ கடன் தகுதி கேள்விப்பட்டியை பூர்த்தி செய்யும்: - நிலம் அல்லது வணிக உரிமை (ஆம்/இல்லை), - நிலையான வருமானம் (ஆம்/இல்லை), - உள்ள கடன்கள் (ஆம்/இல்லை), - சார்ந்திருப்பவர்களின் எண்ணிக்கை (எண்), - வங்கி கணக்கு உள்ளதா (ஆம்/இல்லை), - மாதாந்திர வருமானம் (ரூபாயில்), - வேலை (எ.கா., விவசாயி, கடை வைத்திருப்பவர்), - கடன் வேண்டும் காரணம் (எ.கா., ஒரு பசுவை அல்லது விதைகளை வாங்குவதற்கு). இந்த பதில்களின் அடிப்படையில், மைக்ரோ கடனுக்கு அவர்களின் தகுதியை மதிப்பிடவும், தமிழில் எளிய விளக்கத்தை வழங்கவும், '-' புல்லட் மார்க்கர்களுடன் காரணங்களை குறிப்பிடவும். நட்சத்திரங்கள் (*) அல்லது ஏதேனும் மார்க்டவுன் வடிவமைப்பை பயன்படுத்த வேண்டாம். கிராமப்புற வாழ்க்கைக்கு தொடர்புடைய எடுத்துக்காட்டுகளை பயன்படுத்தவும் (எ.கா., விதைகளை வாங்குதல், சிறு கடை தொடங்குதல்). பயனருக்கு கடன்கள் பற்றி எதுவும் தெரியாது என்று கருதவும். மாதாந்திர வருமானம் குறைவாக இருந்தால் (எ.கா., 5000 ரூபாய்க்கு குறைவாக) அல்லது குடும்பம் பெரியதாக இருந்தால் (எ.கா., 6க்கு மேல்) உள்ள கடன்களுடன், 'தகுதியற்றவர்' என்று கருதவும், மற்ற காரணங்கள் (எ.கா., நிலையான வருமானம், தெளிவான கடன் காரணம்) தகுதிக்கு வலுவான ஆதரவு அளிக்காவிட்டால்.",
-    "te-IN": "మీరు భారతీయ గ్రామస్తులకు సహాయపడే సహాయకుడు, వీరికి ఆర్థిక జ్ఞానం లేదు. బళకాలు మైక్రో లోన్ అర్హత ప్రశ్నావళి కి జవాబులు ఇస్తారు: - భూమి లేదా వ్యాపార యాజమాన్యం (అవును/కాదు), - స్థిర ఆదాయం (అవును/కాదు), - ఉన్న రుణాలు (అవును/కాదు), - ఆధారపడిన వారి సంఖ్య (సంఖ్య), - బ్యాంక్ ఖాతా ఉందా (అవును/కాదు), - నెలవారీ ఆదాయం (రూపాయల్లో), - ఉద్యోగం (ఉదా., రైతు, షాప్ కీపర్), - రుణం కావాలని ఎందుకు (ఉదా., ఒక ఆవు లేదా విత్తనాలు కొనడానికి). ఈ జవాబుల ఆధారంగా, మైక్రో లోన్ కి అర్హతను అంచనా వేసి, తెలుగులో సరళమైన వివరణను ఇవ్వండి, '-' బుల్లెట్ మార్కర్‌లతో కారణాలను పేర్కొనండి. తారాకార (*) లేదా ఏదైనా మార్క్‌డౌన్ ఫార్మాటింగ్‌ని ఉపయోగించవద్దు. గ్రామీణ జీవన విధానానికి సంబంధించిన ఉదాహరణలను ఉపయోగించండి (ఉదా., విత్తనాలు కొనడం, చిన్న దుకాణం ప్రారంభించడం). బళకాలకు రుణాల గురించి ఏమీ తెలియదని భావించండి. నెలవారీ ఆదాయం తక్కువగా ఉంటే (ఉదా., 5000 రూపాయల కంటే తక్కువ) లేదా కుటుంబం పెద్దదై ఉంటే (ఉదా., 6 కంటే ఎక్కువ) ఉన్న రుణాలతో, 'అర్హత లేదు' అని భావించండి, మరి కారణాలు (ఉదా., స్థిర ఆదాయం, స్పష్టమైన రుణ ఉద్దేశ్యం) అర్హతకు బలమైన మద్దతు ఇవ్వకపోతే."
-}
-
 # Add these routes with your other routes
 @app.route('/microloan_eligibility')
 def microloan_eligibility():
     try:
-        return render_template('microloan_eligibility.html')
+        return render_page('microloan_eligibility.html')
     except Exception as e:
         app.logger.error(f"Error rendering microloan_eligibility page: {e}")
         raise InternalServerError("Failed to load the microloan eligibility page")
 
+def estimate_microloan_eligibility_call(data):
+    query = data.get('query')
+    language = data.get('language', 'en-US')
+    if not query or not isinstance(query, str) or not query.strip():
+        raise BadRequest("Invalid or empty query")
+    return LLMCall('microloan', language, query, 'eligibility')
+
+def microloan_answers(data):
+    # Structured answers, or the questionnaire text the web form builds, are
+    # scored locally; None means a free-form question for the model
+    if 'answers' in data:
+        if not isinstance(data['answers'], dict):
+            raise BadRequest("answers must be an object")
+        try:
+            return microloan.parse_answers(data['answers'])
+        except microloan.InvalidAnswers as e:
+            raise BadRequest(str(e))
+    query = data.get('query')
+    return microloan.parse_query(query) if isinstance(query, str) else None
+
+def microloan_explanation_call(assessment, language):
+    reasons = ' '.join(microloan.REASON_TEXT[code] for code in assessment.reasons)
+    prompt = prompts.render('microloan_explain', language, verdict=assessment.verdict, reasons=reasons)
+    return LLMCall('microloan', language, prompt, 'eligibility')
+
 @app.route('/estimate_microloan_eligibility', methods=['POST'])
 def estimate_microloan_eligibility():
     try:
         if not request.is_json:
             raise BadRequest("Request must be JSON")
         data = request.json
-        query = data.get('query')
+        answers = microloan_answers(data)
+        if answers is None:
+            call = estimate_microloan_eligibility_call(data)
+            return jsonify({call.response_key: generate_text(call)})
+
+        with metrics.phase('rules'):
+            assessment = microloan.assess(answers)
         language = data.get('language', 'en-US')
-        if not query or not isinstance(query, str) or not query.strip():
-            raise BadRequest("Invalid or empty query")
-
-        system_instruction = microloan_instructions.get(language, microloan_instructions['en-US'])
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash',
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.5,
-                max_output_tokens=1000
-            ),
-            system_instruction=system_instruction
-        )
-
-        response = model.generate_content(query)
-        eligibility = response.text
-
-        return jsonify({'eligibility': eligibility})
+        eligibility = microloan.explain(assessment)
+        # The model only rephrases the verdict, by default just for other languages
+        if data.get('explain', language != 'en-US'):
+            try:
+                eligibility = generate_text(microloan_explanation_call(assessment, language))
+            except upstream.GoogleAPIError as e:
+                app.logger.warning(f"Gemini API error, answering with the English explanation: {e}")
+        return jsonify({'eligibility': eligibility, 'verdict': assessment.verdict, 'reasons': assessment.reasons})
     except BadRequest as e:
         app.logger.warning(f"Bad request: {e}")
         return jsonify({'error': str(e)}), 400
-    except GoogleAPIError as e:
+    except upstream.GoogleAPIError as e:
         app.logger.error(f"Gemini API error: {e}")
         return jsonify({'error': 'Failed to process query due to API error'}), 500
     except Exception as e:
         app.logger.error(f"Server error in estimate_microloan_eligibility route: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/microloan_bulk', methods=['POST'])
+def microloan_bulk():
+    """Score a JSONL or CSV batch of questionnaires, one JSON result per line."""
+    try:
+        upload = request.files.get('file')
+        if upload is not None:
+            body, content_type = upload.read(), f"{upload.mimetype} {upload.filename}"
+        else:
+            body, content_type = request.get_data(), request.mimetype
+        if not body.strip():
+            raise BadRequest("Empty batch")
+        with metrics.phase('parse'):
+            rows = list(microloan.read_batch(body, content_type))
+        if len(rows) > app.config['MICROLOAN_BULK_MAX_ROWS']:
+            raise BadRequest(f"Batch has more than {app.config['MICROLOAN_BULK_MAX_ROWS']} rows")
+        with metrics.phase('rules'):
+            results = list(microloan.score_batch(rows))
+
+        def lines():
+            for result in results:
+                yield json.dumps(result) + '\n'
+
+        return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
+    except UnicodeDecodeError:
+        app.logger.warning("Bad request: batch is not UTF-8")
+        return jsonify({'error': 'Batch must be UTF-8 text'}), 400
+    except BadRequest as e:
+        app.logger.warning(f"Bad request: {e}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Server error in microloan_bulk route: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 # Add this route with your other routes
 @app.route('/tips')
 def tips():
     try:
-        return render_template('tips.html')
+        return render_page('tips.html')
     except Exception as e:
         app.logger.error(f"Error rendering tips page: {e}")
         raise InternalServerError("Failed to load the savings and budgeting tips page")
@@ -491,61 +1234,45 @@ def tips():
 @app.route('/locker')
 def locker():
     try:
-        return render_template('locker.html')
+        return render_page('locker.html')
     except Exception as e:
         app.logger.error(f"Error rendering locker page: {e}")
         raise InternalServerError("Failed to load the locker facility page")
     
+def get_locker_facilities_call(data):
+    state = data.get('state')
+    village = data.get('village')
+    language = data.get('language', 'en-US')
+
+    if not state or not village:
+        raise BadRequest("State and village/town are required")
+
+    # Fallback to English if unsupported language
+    language = prompts.resolve_language(language)
+    query = prompts.render('locker', language, village=village, state=state)
+    return LLMCall('locker', language, query, 'facilities')
+
 @app.route('/get_locker_facilities', methods=['POST'])
 def get_locker_facilities():
     try:
         if not request.is_json:
             raise BadRequest("Request must be JSON")
         data = request.json
-        state = data.get('state')
-        village = data.get('village')
-        language = data.get('language', 'en-US')
-
-        if not state or not village:
-            raise BadRequest("State and village/town are required")
-
-        # Supported languages and instructions
-        language_instructions = {
-            "en-US": "You are a helpful assistant for Indian villagers with no prior financial knowledge. Provide information in simple English suitable for rural life, using examples relevant to villagers (e.g., farming-related scenarios).",
-            "hi-IN": "आप भारतीय ग्रामीणों के लिए एक सहायक हैं जिनका वित्तीय ज्ञान नहीं है। ग्रामीण जीवन के लिए उपयुक्त सरल हिंदी में जानकारी प्रदान करें, ग्रामीणों से संबंधित उदाहरणों (जैसे खेती से संबंधित परिदृश्य) का उपयोग करें।",
-            "kn-IN": "ನೀವು ಭಾರತೀಯ ಗ್ರಾಮೀಣರಿಗಾಗಿ ಸಹಾಯಕ ಸಹಾಯಕರಾಗಿದ್ದೀರಿ, ಅವರಿಗೆ ಆರ್ಥಿಕ ಜ್ಞಾನ ಇಲ್ಲ. ಗ್ರಾಮೀಣ ಜೀವನಕ್ಕೆ ಸೂಕ್ತವಾದ ಸರಳ ಕನ್ನಡದಲ್ಲಿ ಮಾಹಿತಿಯನ್ನು ಒದಗಿಸಿ, ಗ್ರಾಮೀಣರಿಗೆ ಸಂಬಂಧಿಸಿದ ಉದಾಹರಣೆಗಳನ್ನು (ಉದಾ., ಕೃಷಿ ಸಂಬಂಧಿತ ದೃಶ್ಯಗಳು) ಬಳಸಿ.",
-            "ta-IN": "நீங்கள் இந்திய கிராமவாசிகளுக்கு உதவி செய்யும் உதவியாளர், அவர்களுக்கு நிதி அறிவு இல்லை. கிராம வாழ்க்கைக்கு ஏற்ற எளிய தமிழில் தகவல்களை வழங்கவும், கிராமவாசிகளுக்கு தொடர்புடைய எடுத்துக்காட்டுகளை (எ.கா., விவசாயம் தொடர்பான காட்சிகள்) பயன்படுத்தவும்.",
-            "te-IN": "మీరు భారతీయ గ్రామీణుల కోసం సహాయక సహాయకులు, వారికి ఆర్థిక జ్ఞానం లేదు. గ్రామీణ జీవితానికి తగిన సరళమైన తెలుగులో సమాచారాన్ని అందించండి, గ్రామీణులకు సంబంధించిన ఉదాహరణలను (ఉదా., వ్యవసాయ సంబంధిత దృశ్యాలు) ఉపయోగించండి."
-        }
-
-        # Validate language
-        if language not in language_instructions:
-            language = 'en-US'  # Fallback to English if unsupported language
-
-        instruction = language_instructions[language]
-        query = (f"{instruction} List the locker facilities (e.g., banks offering locker services) available in the village/town {village} in the state {state}. "
-                 "Include the bank name, address, approximate locker fees (if known), and contact details if available. "
-                 "Provide the information in a bulleted list format using '-' as the bullet marker. "
-                 "Use simple language suitable for villagers with no prior knowledge. "
-                 "Do not use Markdown formatting like '**' or '*' for emphasis; use plain text instead. "
-                 "If no specific locker facilities are found, suggest general steps to inquire at local banks.")
-
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash',
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.5,
-                max_output_tokens=1000
-            )
-        )
-
-        response = model.generate_content(query)
-        facilities_response = response.text
-
-        return jsonify({'facilities': facilities_response})
+        call = get_locker_facilities_call(data)
+
+        # Branches the knowledge base lists for the village, or else its
+        # district, are answered from it
+        state = resolve_state(data['state'])
+        match = village_match(data, state) if state else None
+        branches, scope = knowledge.branches_near(match, lockers=True) if match else ([], None)
+        if not branches:
+            return jsonify({call.response_key: generate_text(call)})
+        text = phrase_facts('locker', call.language, describe_branches(branches, match, scope))
+        return jsonify({'facilities': text, 'village': match._asdict()})
     except BadRequest as e:
         app.logger.warning(f"Bad request: {e}")
         return jsonify({'error': str(e)}), 400
-    except GoogleAPIError as e:
+    except upstream.GoogleAPIError as e:
         app.logger.error(f"Gemini API error: {e}")
         return jsonify({'error': 'Failed to fetch locker facilities due to API error'}), 500
     except Exception as e:
@@ -555,70 +1282,196 @@ def get_locker_facilities():
 
 @app.route('/account_guide')
 def account_guide():
-    return render_template('account_guide.html')
+    return render_page('account_guide.html')
 
 
 @app.route('/fraud_alerts')
 def fraud_alerts():
     try:
-        return render_template('fraud_alerts.html')
+        return render_page('fraud_alerts.html')
     except Exception as e:
         app.logger.error(f"Error rendering fraud_alerts page: {e}")
         raise InternalServerError("Failed to load the fraud alerts page")
 
 
-insurance_instructions = {
-    "en-US": "You are a helpful assistant for Indian villagers with no prior financial knowledge. The user will ask questions about insurance (e.g., 'I want crop insurance for my rice field', 'How much does health insurance cost?'). Provide step-by-step guidance in English on how to understand or get the insurance, using simple language and examples relevant to rural life (e.g., protecting crops from drought, paying for a doctor). Respond in plain text with each step on a new line, using '-' as a bullet marker for steps. Do not use Markdown formatting like '**' or '*' for emphasis. Assume the user knows nothing about insurance.",
-    "hi-IN": "आप भारतीय ग्रामीणों के लिए एक सहायक हैं जिनका वित्तीय ज्ञान नहीं है। उपयोगकर्ता बीमा के बारे में सवाल पूछेगा (जैसे, 'मैं अपने चावल के खेत के लिए फसल बीमा चाहता हूँ', 'स्वास्थ्य बीमा की लागत कितनी है?')। बीमा को समझने या प्राप्त करने के लिए हिंदी में चरण-दर-चरण मार्गदर्शन करें, ग्रामीण जीवन (जैसे, सूखे से फसलों की रक्षा, डॉक्टर का भुगतान) से संबंधित सरल भाषा और उदाहरणों का उपयोग करें। सादे टेक्स्ट में जवाब दें, प्रत्येक चरण को नई पंक्ति पर लिखें, चरणों के लिए '-' बुलेट मार्कर का उपयोग करें। मार्कडाउन फॉर्मेटिंग जैसे '**' या '*' का उपयोग न करें। मान लें कि उपयोगकर्ता को बीमा के बारे में कुछ भी नहीं पता है।",
-    "kn-IN": "ನೀವು ಭಾರತೀಯ ಗ್ರಾಮೀಣರಿಗಾಗಿ ಸಹಾಯಕ ಸಹಾಯಕರಾಗಿದ್ದೀರಿ, ಅವರಿಗೆ ಆರ್ಥಿಕ ಜ್ಞಾನ ಇಲ್ಲ. ಬಳಕೆದಾರರು ಇನ್ಶೂರೆನ್ಸ್ ಬಗ್ಗೆ ಪ್ರಶ್ನೆಗಳನ್ನು ಕೇಳುತ್ತಾರೆ (ಉದಾ., 'ನಾನು ನನ್ನ ಧಾನ್ಯ ಫೀಲ್ಡ್‌ಗಾಗಿ ಪರಿಶಿಷ್ಟ ಇನ್ಶೂರೆನ್ಸ್ ಇಚ್ಚಿಸುತ್ತೇನೆ', 'ಆರೋಗ್ಯ ಇನ್ಶೂರೆನ್ಸ್ ಎಷ್ಟು ಖರ್ಚು?'). ಇನ್ಶೂರೆನ್ಸ್ ಅನ್ನು ಅರ್ಥಮಾಡಿಕೊಳ್ಳುವುದು ಅಥವಾ ಪಡೆಯುವುದಕ್ಕೆ ಕನ್ನಡದಲ್ಲಿ ಹಂತ-ಹಂತದ ಮಾರ್ಗದರ್ಶನವನ್ನು ಒದಗಿಸಿ, ಗ್ರಾಮೀಣ ಜೀವನಕ್ಕೆ ಸಂಬಂಧಿಸಿದ ಸರಳ ಭಾಷೆ ಮತ್ತು ಉದಾಹರಣೆಗಳನ್ನು ಬಳಸಿ (ಉದಾ., ಬರದಿಂದ ಪ್ರತ್ಯೇಕತೆಯನ್ನು ರಕ್ಷಿಸುವುದು, ಡಾಕ್ಟರ್‌ಗೆ ಪಾವತಿಸುವುದು). ಸರಳ ಟೆಕ್ಸ್ಟ್‌ನಲ್ಲಿ ಉತ್ತರಿಸಿ, ಪ್ರತಿ ಹಂತವನ್ನು ಹೊಸ ಸಾಲಿನಲ್ಲಿ ಬರೆಯಿರಿ, ಹಂತಗಳಿಗೆ '-' ಬುಲೆಟ್ ಮಾರ್ಕರ್ ಬಳಸಿ. '**' ಅಥವಾ '*' ನಂತಹ ಮಾರ್ಕ್‌ಡೌನ್ ಫಾರ್ಮ್ಯಾಟಿಂಗ್ ಬಳಸಬೇಡಿ. ಬಳಕೆದಾರನಿಗೆ ಇನ್ಶೂರೆನ್ಸ್ ಬಗ್ಗೆ ಏನೂ ಗೊತ್ತಿಲ್ಲ ಎಂದು ಭಾವಿಸಿ.",
-    "ta-IN": "நீங்கள் இந்திய கிராமவாசிகளுக்கு உதவி செய்யும் உதவியாளர், அவர்களுக்கு நிதி அறிவு இல்லை. பயனர் காப்பீடு பற்றி கேள்விகளைக் கேட்பார் (எ.கா., 'நான் என் அரிசி வயலைக்கு பயிர் காப்பீடு வேண்டும்', 'ஆரோக்கிய காப்பீடு எவ்வளவு செலவு?'). காப்பீட்டை புரிந்துகொள்ளவோ அல்லது பெறவோ தமிழில் படி-படியாக வழிகாட்டுதலை வழங்கவும், கிராமப்புற வாழ்க்கைக்கு தொடர்புடைய எளிய மொழி மற்றும் எடுத்துக்காட்டுகளை பயன்படுத்தவும் (எ.கா., வறட்சியிலிருந்து பயிர்களை பாதுகாக்குதல், மருத்துவருக்கு பணம் செலுத்துதல்). சாதாரண உரையில் பதிலளிக்கவும், ஒவ்வொரு படியையும் புதிய வரியில் எழுதவும், படிகளுக்கு '-' புல்லட் மார்க்கரைப் பயன்படுத்தவும். '**' அல்லது '*' போன்ற மார்க்டவுன் வடிவமைப்பை பயன்படுத்த வேண்டாம். பயனருக்கு காப்பீடு பற்றி எதுவும் தெரியாது என்று கருதவும்.",
-    "te-IN": "మీరు భారతీయ గ్రామస్తులకు సహాయపడే సహాయకుడు, వీరికి ఆర్థిక జ్ఞానం లేదు. బళకాలు బీమా గురించి ప్రశ్నలు అడుగుతారు (ఉదా., 'నేను నా బియ్యం ఫీల్డ్‌కు పంట బీమా అవసరం', 'ఆరోగ్య బీమా ఖర్చు ఎంత?'). బీమాను అర్థం చేసుకోవడానికి లేదా పొందడానికి తెలుగులో దశ-దశల వారీగా మార్గదర్శకం ఇవ్వండి, గ్రామీణ జీవన విధానానికి సంబంధించిన సరళమైన భాష మరియు ఉదాహరణలను ఉపయోగించండి (ఉదా., ఎండఫాటిలో పంటలను రక్షించడం, డాక్టర్‌కు చెల్లించడం). సాదా టెక్స్ట్‌లో సమాధానం ఇవ్వండి, ప్రతి దశను కొత్త లైన్‌లో రాయండి, దశలకు '-' బుల్లెట్ మార్కర్‌ని ఉపయోగించండి. '**' లేదా '*' వంటి మార్క్‌డౌన్ ఫార్మాటింగ్‌ని ఉపయోగించవద్దు. బళకాలకు బీమా గురించి ఏమీ తెలియదని భావించండి."
-}
-
 @app.route('/insurance_guide')
 def insurance_guide():
     try:
-        return render_template('insurance.html')
+        return render_page('insurance.html')
     except Exception as e:
         app.logger.error(f"Error rendering insurance_guide page: {e}")
         raise InternalServerError("Failed to load the insurance guide page")
 
+def insurance_chat_call(data):
+    user_input = data.get('message')
+    language = data.get('language', 'en-US')
+    if not user_input or not isinstance(user_input, str) or not user_input.strip():
+        raise BadRequest("Invalid or empty message")
+    return LLMCall('insurance', language, user_input, 'response', user_input)
+
 @app.route('/insurance_chat', methods=['POST'])
 def insurance_chat():
     try:
         if not request.is_json:
             raise BadRequest("Request must be JSON")
         data = request.json
-        user_input = data.get('message')
-        language = data.get('language', 'en-US')
-        if not user_input or not isinstance(user_input, str) or not user_input.strip():
-            raise BadRequest("Invalid or empty message")
-
-        system_instruction = insurance_instructions.get(language, insurance_instructions['en-US'])
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash',
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.5,
-                max_output_tokens=1000
-            ),
-            system_instruction=system_instruction
-        )
-
-        response = model.generate_content(user_input)
-        bot_response = response.text
-
-        return jsonify({'response': bot_response})
+        call = insurance_chat_call(data)
+
+        if wants_stream(data):
+            return sse_response(stream_text(call))
+        return jsonify({call.response_key: generate_text(call)})
     except BadRequest as e:
         app.logger.warning(f"Bad request: {e}")
         return jsonify({'error': str(e)}), 400
-    except GoogleAPIError as e:
+    except upstream.GoogleAPIError as e:
         app.logger.error(f"Gemini API error: {e}")
         return jsonify({'error': 'Failed to process message due to API error'}), 500
     except Exception as e:
         app.logger.error(f"Server error in insurance_chat route: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+# JSON routes whose answer is a single LLM call, for the async server (asgi.py)
+LLM_ROUTES = {
+    '/chat': chat_call,
+    '/process_atm_voice': process_atm_voice_call,
+    '/process_savings_query': process_savings_query_call,
+    '/process_fixed_deposit_query': process_fixed_deposit_query_call,
+    '/process_current_account_query': process_current_account_query_call,
+    '/insurance_chat': insurance_chat_call,
+}
+
+# Feature whose admission slots each LLM-backed POST route uses
+ADMISSION_FEATURES = {
+    '/chat': 'chat',
+    '/get_schemes': 'schemes',
+    '/upload_form': 'form',
+    '/process_atm_voice': 'atm',
+    '/process_savings_query': 'savings',
+    '/process_fixed_deposit_query': 'fixed_deposit',
+    '/process_current_account_query': 'current_account',
+    '/estimate_microloan_eligibility': 'microloan',
+    '/get_locker_facilities': 'locker',
+    '/insurance_chat': 'insurance',
+}
+
+# Routes that can answer as Server-Sent Events
+STREAMING_ROUTES = {'/chat', '/process_atm_voice', '/process_savings_query', '/process_fixed_deposit_query',
+                    '/process_current_account_query', '/insurance_chat'}
+
+# Guide features an answer pack can hold: the call builder each one's
+# questions go through, and the request field the question is sent in
+PACK_FEATURES = {
+    'savings': (process_savings_query_call, 'query'),
+    'fixed_deposit': (process_fixed_deposit_query_call, 'query'),
+    'current_account': (process_current_account_query_call, 'query'),
+    'atm': (process_atm_voice_call, 'transcript'),
+    'insurance': (insurance_chat_call, 'message'),
+}
+
+def pack_call(feature, language, question):
+    """The LLMCall the live route would make for question."""
+    build, field = PACK_FEATURES[feature]
+    return build({field: question, 'language': language})
+
+def pack_digests():
+    return {(feature, language): prompt_digest(models.instruction(feature, language), prompts.TEMPLATES.get((feature, language)))
+            for feature in PACK_FEATURES for language in prompts.LANGUAGES}
+
+# GET pages whose HTML is the same on every request, by path
+PAGE_TEMPLATES = {
+    '/': 'index.html',
+    '/chatbot': 'chatbot.html',
+    '/schemes': 'schemes.html',
+    '/upload_form': 'upload_form.html',
+    '/atm_guide': 'atm_guide.html',
+    '/savings_guide': 'savings_guide.html',
+    '/fixed_deposit_guide': 'fixed_deposit_guide.html',
+    '/current_account_guide': 'current_account_guide.html',
+    '/microloan_eligibility': 'microloan_eligibility.html',
+    '/tips': 'tips.html',
+    '/locker': 'locker.html',
+    '/account_guide': 'account_guide.html',
+    '/fraud_alerts': 'fraud_alerts.html',
+    '/insurance_guide': 'insurance.html',
+}
+
+# CSS and JS shared by the pages, served from /assets
+STATIC_BUNDLES = ('base.css', 'base.js', 'chatbot.css')
+
+def load_bundles():
+    for name in STATIC_BUNDLES:
+        with open(os.path.join(app.static_folder, name), 'rb') as f:
+            static_pages.add(f"asset:{name}", f.read(), mimetypes.guess_type(name)[0],
+                             'public, max-age=31536000, immutable')
+
+def prerender_pages():
+    failed = []
+    with app.test_request_context():
+        for template in PAGE_TEMPLATES.values():
+            try:
+                static_pages.add(template, render_template(template), 'text/html',
+                                 f"public, max-age={app.config['PAGE_MAX_AGE']}")
+            except Exception as e:
+                failed.append(f"{template} ({e})")
+    if failed:
+        app.logger.warning(f"Pages rendered per request instead: {', '.join(failed)}")
+
+def preload_llm():
+    # The first Gemini call would otherwise pay for importing its client
+    try:
+        llm.warm()
+    except Exception as e:
+        app.logger.warning(f"Could not preload the Gemini models: {e}")
+
+_startup_lock = threading.Lock()
+_started = False
+
+def create_app():
+    """The app, configured from the environment with its services started.
+
+    Importing this module only defines the routes; gunicorn runs
+    'app:create_app()', and the first call here does the startup work.
+    Later calls return the same app. If the module-level app is served
+    without calling this, StartOnFirstRequest calls it before the first
+    request reaches Flask.
+    """
+    global _started
+    with _startup_lock:
+        if not _started:
+            load_config(app.config)
+            validate_config(app.config)
+            prepare_directories(app.config)
+            start_services(app.config)
+            if app.config['TRUSTED_PROXIES']:
+                # Client addresses (for rate limits) and schemes as the proxies saw them
+                hops = app.config['TRUSTED_PROXIES']
+                app.wsgi_app.inner = ProxyFix(app.wsgi_app.inner, x_for=hops, x_proto=hops)
+            load_bundles()
+            if app.config['PRERENDER_PAGES']:
+                prerender_pages()
+            if app.config['LLM_BACKEND'] == 'gemini' and app.config['GOOGLE_API_KEY'] and app.config['LLM_PRELOAD']:
+                threading.Thread(target=preload_llm, name='llm-preload', daemon=True).start()
+            _started = True
+    return app
+
+class StartOnFirstRequest:
+    """WSGI middleware that calls create_app() before the first request.
+
+    Servers that load the module-level app ('gunicorn app:app', 'flask --app
+    app run') never call create_app(). Installed at import, this starts the
+    app before any request is handled, so the first request already passes
+    through the middleware create_app() adds (ProxyFix) to inner.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def __call__(self, environ, start_response):
+        if not _started:
+            create_app()
+        return self.inner(environ, start_response)
+
+app.wsgi_app = StartOnFirstRequest(app.wsgi_app)
+
 if __name__ == '__main__':
-    if not os.path.exists(app.config['UPLOAD_FOLDER']):
-        os.makedirs(app.config['UPLOAD_FOLDER'])
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
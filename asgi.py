@@ -0,0 +1,165 @@
+"""ASGI entry point with a non-blocking path for the LLM-backed routes.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+The JSON routes listed in app.LLM_ROUTES are answered here with
+generate_content_async, so a waiting Gemini call only holds a coroutine and
+one process can keep hundreds of generations in flight. Everything else
+(pages, /upload_form, ...) is passed to the Flask app through asgiref's WSGI
+adapter and behaves exactly as under a WSGI server.
+"""
+import json
+import logging
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+
+import metrics
+import upstream
+from admission import Rejected, client_keys, forwarded_address
+from app import (ADMISSION_FEATURES, LLM_ROUTES, STREAMING_ROUTES, audit_request, create_app, generate_text_async, shed,
+                 sse_event, stream_text_async)
+
+logger = logging.getLogger(__name__)
+
+app = create_app()
+flask_app = WsgiToAsgi(app)
+
+# Built by create_app, so imported after it
+from app import admission, rate_limiter  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] in LLM_ROUTES:
+        await llm_route(scope, receive, send)
+    else:
+        await flask_app(scope, receive, send)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def llm_route(scope, receive, send):
+    token = metrics.start_request(scope['path'])
+    feature = ADMISSION_FEATURES[scope['path']]
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+    data = None
+    try:
+        session_id = headers.get('x-session-id')
+        try:
+            address = forwarded_address((scope.get('client') or ('unknown',))[0], headers.get('x-forwarded-for'),
+                                        app.config['TRUSTED_PROXIES'])
+            rate_limiter.check(*client_keys(address, session_id))
+            with metrics.phase('queue'):
+                await admission.acquire_async(feature)
+        except Rejected as e:
+            shed(e)
+            await json_response(send, e.status, {'error': str(e)}, [(b'retry-after', str(e.retry_after).encode())])
+            return
+        try:
+            data = await answer_llm_route(scope, headers, receive, send)
+        finally:
+            admission.release(feature)
+    except Exception:
+        metrics.set_status(500)
+        raise
+    finally:
+        audit_request(metrics.finish_request(token), scope['path'], data, headers.get('accept', ''),
+                      headers.get('prefer', ''))
+
+
+async def answer_llm_route(scope, headers, receive, send):
+    # Returns the parsed body, for the audit log
+    path = scope['path']
+    data = None
+    try:
+        if not headers.get('content-type', '').startswith('application/json'):
+            raise BadRequest("Request must be JSON")
+        try:
+            body = await read_body(receive, headers.get('content-length'), app.config['MAX_CONTENT_LENGTH'])
+            with metrics.phase('parse'):
+                data = json.loads(body)
+        except ValueError:
+            raise BadRequest("Invalid JSON body")
+        if not isinstance(data, dict):
+            raise BadRequest("Invalid JSON body")
+        call = LLM_ROUTES[path](data)
+
+        if path in STREAMING_ROUTES and (data.get('stream') is True or 'text/event-stream' in headers.get('accept', '')):
+            await stream_response(send, stream_text_async(call))
+            return data
+        await json_response(send, 200, {call.response_key: await generate_text_async(call)})
+    except RequestEntityTooLarge as e:
+        logger.warning(f"Request too large: {e}")
+        await json_response(send, 413, {'error': str(e)})
+    except BadRequest as e:
+        logger.warning(f"Bad request: {e}")
+        await json_response(send, 400, {'error': str(e)})
+    except upstream.GoogleAPIError as e:
+        logger.error(f"Gemini API error: {e}")
+        await json_response(send, 500, {'error': 'Failed to process query due to API error'})
+    except Exception as e:
+        logger.error(f"Server error in {path} route: {e}")
+        await json_response(send, 500, {'error': 'Internal server error'})
+    return data
+
+
+async def read_body(receive, length, limit):
+    # As Flask does with MAX_CONTENT_LENGTH, a body declared or found to be
+    # over the limit is refused before the rest of it is read
+    if limit is not None and length is not None and length.isdigit() and int(length) > limit:
+        raise RequestEntityTooLarge()
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if limit is not None and size > limit:
+            raise RequestEntityTooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def json_response(send, status, payload, headers=()):
+    with metrics.phase('serialize'):
+        body = json.dumps(payload).encode('utf-8')
+    metrics.set_status(status)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()), *headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def stream_response(send, chunks):
+    # As in the WSGI path, the first chunk is awaited before the headers go
+    # out so upstream failures still become a JSON error
+    first = await anext(chunks, '')
+    metrics.set_status(200)
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no')],
+    })
+    try:
+        await send({'type': 'http.response.body', 'body': sse_event({'text': first}).encode('utf-8'), 'more_body': True})
+        async for text in chunks:
+            await send({'type': 'http.response.body', 'body': sse_event({'text': text}).encode('utf-8'), 'more_body': True})
+        event = sse_event({}, 'done')
+    except Exception as e:
+        logger.error(f"Server error while streaming response: {e}")
+        event = sse_event({'error': 'Internal server error'}, 'error')
+    await send({'type': 'http.response.body', 'body': event.encode('utf-8')})
@@ -0,0 +1,155 @@
+"""Append-only JSONL audit log of API calls, written off the request path.
+
+A request hands its record to AuditLog.record, which only puts it on a
+bounded queue; when the queue is full the record is dropped and counted, so
+logging never makes a request wait. A writer thread takes records off the
+queue and appends them in batches of up to batch_size, at least every
+flush_interval seconds. Each process writes its own file,
+audit.<pid>.jsonl, which is renamed to audit.<pid>.<timestamp>.jsonl once it
+passes max_bytes or is older than max_age seconds; only the newest keep
+rotated files in the directory are kept.
+
+Each line is one JSON object:
+
+    {"ts": 1760700000.123, "route": "/chat", "status": 200, "language": "hi-IN",
+     "latency_ms": 812.4, "input_tokens": 95, "output_tokens": 310,
+     "cache": {"response": "miss", "faq": "miss"}, "headers": {},
+     "input": {"message": "...", "language": "hi-IN", "session_id": "..."}}
+
+ts is when the request started. input is the JSON body with whitespace in
+its strings collapsed and long strings cut; uploads are recorded by size.
+benchmarks/replay.py sends a captured log back through the app.
+"""
+import glob
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+_SPACES = re.compile(r'[ \t\r\f\v]+')
+
+
+def normalize_input(value, max_chars=2000):
+    """value with runs of spaces in its strings collapsed and each string cut to max_chars."""
+    if isinstance(value, str):
+        return '\n'.join(_SPACES.sub(' ', line).strip() for line in value.strip().split('\n'))[:max_chars]
+    if isinstance(value, dict):
+        return {str(key): normalize_input(item, max_chars) for key, item in value.items()}
+    if isinstance(value, list):
+        return [normalize_input(item, max_chars) for item in value]
+    return value
+
+
+def read_log(paths):
+    """Records from audit files (or directories of them), oldest first."""
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, 'audit.*.jsonl'))) if os.path.isdir(path) else [path])
+    records = []
+    for path in files:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # The last line of a file being written may be partial
+                        logger.warning(f"Skipping unreadable audit record in {path}")
+    records.sort(key=lambda record: record['ts'])
+    return records
+
+
+class AuditLog:
+    def __init__(self, directory='logs', queue_size=10000, batch_size=256, flush_interval=1.0,
+                 max_bytes=64 * 1024 * 1024, max_age=3600, keep=48):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.keep = keep
+        self.path = os.path.join(directory, f"audit.{os.getpid()}.jsonl")
+        self._queue = queue.Queue(queue_size)
+        self._file = None
+        self._opened = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+
+    def record(self, entry):
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            metrics.AUDIT_RECORDS.inc(result='dropped')
+
+    def close(self, timeout=5):
+        """Writes what is queued and stops the writer."""
+        if self._thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            self._thread.join(timeout)
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            try:
+                entry = self._queue.get(timeout=max(deadline - time.monotonic(), 0) if batch else None)
+            except queue.Empty:
+                entry = None
+            if entry is _STOP:
+                self._write(batch)
+                if self._file is not None:
+                    self._file.close()
+                return
+            if entry is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(entry)
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            lines = ''.join(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n' for entry in batch)
+            self._rotate_if_due()
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+                self._opened = time.time()
+            self._file.write(lines)
+            self._file.flush()
+            metrics.AUDIT_RECORDS.inc(len(batch), result='written')
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"Could not write {len(batch)} audit record(s): {e}")
+            metrics.AUDIT_RECORDS.inc(len(batch), result='failed')
+
+    def _rotate_if_due(self):
+        if self._file is None:
+            return
+        if self._file.tell() < self.max_bytes and time.time() - self._opened < self.max_age:
+            return
+        self._file.close()
+        self._file = None
+        now = time.time()
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}"
+        os.replace(self.path, os.path.join(self.directory, f"audit.{os.getpid()}.{stamp}.jsonl"))
+        rotated = sorted(glob.glob(os.path.join(self.directory, 'audit.*.*.jsonl')), key=os.path.getmtime)
+        for path in rotated[:max(len(rotated) - self.keep, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
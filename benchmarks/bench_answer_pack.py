@@ -0,0 +1,63 @@
+"""Benchmark: answer pack size, load time and lookup latency.
+
+    python benchmarks/bench_answer_pack.py [--questions 2000] [--answer-chars 1500] [--lookups 20000]
+
+Writes a pack with --questions questions for each guide feature in each of
+the five locales, with answers of --answer-chars characters, then reports
+the file size, how long opening (memory-mapping) it takes, and the time per
+lookup for questions in the pack, asked with different case and
+punctuation, and for questions that are not in it.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answers import AnswerPack, pack_key, write_pack  # noqa: E402
+
+FEATURES = ('savings', 'fixed_deposit', 'current_account', 'atm', 'insurance')
+LANGUAGES = ('en-US', 'hi-IN', 'kn-IN', 'ta-IN', 'te-IN')
+WORDS = ('how', 'do', 'i', 'open', 'check', 'my', 'savings', 'account', 'deposit', 'interest', 'loan', 'card', 'pin',
+         'balance', 'nominee', 'passbook', 'cheque', 'insurance', 'crop', 'claim', 'premium', 'branch')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=2000)
+    parser.add_argument('--answer-chars', type=int, default=1500)
+    parser.add_argument('--lookups', type=int, default=20000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    questions = [f"{' '.join(rng.choices(WORDS, k=8))} {i}" for i in range(args.questions)]
+    answers = {pack_key(feature, language, question): 'x' * args.answer_chars
+               for feature in FEATURES for language in LANGUAGES for question in questions}
+    path = os.path.join(tempfile.mkdtemp(), 'answers.pack')
+    started = time.perf_counter()
+    write_pack(path, answers, {'prompts': {}})
+    print(f"{len(answers)} answers written in {time.perf_counter() - started:.1f} s: "
+          f"{os.path.getsize(path) / 1e6:.1f} MB")
+
+    started = time.perf_counter()
+    pack = AnswerPack(path)
+    print(f"open (mmap): {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    asked = [(rng.choice(FEATURES), rng.choice(LANGUAGES), rng.choice(questions)) for _ in range(args.lookups)]
+    started = time.perf_counter()
+    for feature, language, question in asked:
+        assert pack.get(pack_key(feature, language, question.upper() + '?')) is not None
+    print(f"hit: {(time.perf_counter() - started) / len(asked) * 1e6:.1f} us per lookup")
+    started = time.perf_counter()
+    for feature, language, question in asked:
+        pack.get(pack_key(feature, language, question + ' please'))
+    print(f"miss: {(time.perf_counter() - started) / len(asked) * 1e6:.1f} us per lookup")
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+
+if __name__ == '__main__':
+    main()
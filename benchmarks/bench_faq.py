@@ -0,0 +1,80 @@
+"""Benchmark: FaqIndex lookup latency and hit rate.
+
+    python benchmarks/bench_faq.py [--entries 100000] [--lookups 2000] [--threshold 0.85]
+
+Fills one (feature, language) shard with --entries synthetic paraphrases of
+a few dozen banking questions, each with a filler phrase and a number so
+that no two are identical, then times lookups of fresh paraphrases. Hit rate
+is the share of fresh paraphrases whose match clears --threshold, and
+accuracy the share of those hits that matched the same topic.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from faq import FaqIndex
+
+TOPICS = [
+    'check my account balance', 'open a savings account', 'close my savings account', 'get a debit card',
+    'block my lost atm card', 'change my atm pin', 'withdraw money from the atm', 'deposit cash at the branch',
+    'update my passbook', 'link aadhaar to my account', 'apply for a crop loan', 'repay my gold loan',
+    'know the interest on a fixed deposit', 'break my fixed deposit early', 'open a recurring deposit',
+    'send money with upi', 'stop a cheque payment', 'get a new cheque book', 'add a nominee to my account',
+    'apply for a kisan credit card', 'report a fraud call', 'get a mini statement', 'change my mobile number',
+    'open a zero balance account', 'get a home loan', 'transfer my account to another branch',
+    'know my ifsc code', 'activate net banking', 'get an education loan', 'check my loan emi',
+]
+OPENERS = ['how do i', 'how can i', 'what is the way to', 'please tell me how to', 'i want to', 'steps to',
+           'help me', 'can you explain how to', 'where do i go to', 'what should i do to']
+FILLERS = ['', 'please', 'today', 'in my village', 'sir', 'quickly', 'at sbi', 'for my father', 'without going']
+
+
+def paraphrase(rng, topic):
+    words = f"{rng.choice(OPENERS)} {topic} {rng.choice(FILLERS)}".split()
+    if rng.random() < 0.3:
+        # A typo in one word
+        i = rng.randrange(len(words))
+        word = words[i]
+        if len(word) > 3:
+            j = rng.randrange(len(word) - 1)
+            words[i] = word[:j] + word[j + 1] + word[j] + word[j + 2:]
+    return ' '.join(words) + f" {rng.randint(1, 99)}" * (rng.random() < 0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--threshold', type=float, default=0.85)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    index = FaqIndex(threshold=args.threshold, max_entries=args.entries)
+    started = time.perf_counter()
+    for _ in range(args.entries):
+        topic = rng.randrange(len(TOPICS))
+        index.add('chat', 'en-US', paraphrase(rng, TOPICS[topic]), str(topic))
+    elapsed = time.perf_counter() - started
+    print(f"inserted {args.entries} entries in {elapsed:.1f} s ({elapsed / args.entries * 1e6:.0f} us each)")
+
+    timings, hits, correct = [], 0, 0
+    for _ in range(args.lookups):
+        topic = rng.randrange(len(TOPICS))
+        question = paraphrase(rng, TOPICS[topic])
+        started = time.perf_counter()
+        answer = index.lookup('chat', 'en-US', question)
+        timings.append(time.perf_counter() - started)
+        if answer is not None:
+            hits += 1
+            correct += answer == str(topic)
+    timings.sort()
+    print(f"lookup p50 {timings[len(timings) // 2] * 1000:.3f} ms, p99 {timings[int(len(timings) * 0.99)] * 1000:.3f} ms")
+    print(f"hit rate {hits / args.lookups:.1%}, accuracy of hits {correct / max(hits, 1):.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Benchmark: knowledge base build, pack load, fuzzy village lookup and branch lookup.
+
+    python benchmarks/bench_knowledge.py [--villages 600000] [--branches 160000] [--lookups 2000]
+                                         [--pack /tmp/knowledge.npz]
+
+The bundled data/villages.csv and data/branches.csv are headers only, so
+this generates a synthetic dataset of national size instead. --villages
+village names are built from Indian place-name syllables and suffixes and
+spread over every state and about 20 districts each, so names repeat across
+districts as real ones do. --branches bank branches (about as many as India
+has) go to randomly chosen villages; a quarter of them have no lockers and a
+quarter do not say.
+
+Times building the index, writing and loading the pack, then lookups of
+names as written and with one typo (a dropped, doubled, swapped or replaced
+letter). Accuracy is the share of lookups whose best match is the village
+asked about or one with the same name. Last, it times the locker lookup that
+/get_locker_facilities makes: the village match, then the branches with
+lockers in that village or its district.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge import STATES, Branch, KnowledgeBase, read_schemes  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYLLABLES = ['ra', 'ma', 'pur', 'ka', 'la', 'na', 'si', 'ta', 'ga', 'ha', 'ban', 'dev', 'sha', 'kot', 'chan', 'dra',
+             'bha', 'go', 'vi', 'ja', 'ya', 'ro', 'an', 'ku', 'mi', 'sa', 'ri', 'pa', 'lo', 'tha', 'nag', 'sul']
+SUFFIXES = ['pur', 'pura', 'gaon', 'halli', 'palli', 'nagar', 'wadi', 'garh', 'kheda', 'patti', 'ur', 'abad', 'ganj',
+            'kalan', 'khurd', '']
+# Bank names with their IFSC prefixes
+BANKS = (('State Bank of India', 'SBIN'), ('Bank of Baroda', 'BARB'), ('Punjab National Bank', 'PUNB'),
+         ('Canara Bank', 'CNRB'), ('Union Bank of India', 'UBIN'), ('Bank of India', 'BKID'), ('Indian Bank', 'IDIB'),
+         ('Central Bank of India', 'CBIN'), ('UCO Bank', 'UCBA'), ('Bank of Maharashtra', 'MAHB'))
+
+
+def village_name(rng):
+    name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3))) + rng.choice(SUFFIXES)
+    if rng.random() < 0.1:
+        name += ' ' + rng.choice(['Kalan', 'Khurd', 'Buzurg', 'Uttar', 'Dakshin'])
+    return name.capitalize()
+
+
+def typo(rng, name):
+    i = rng.randrange(1, len(name))
+    kind = rng.randrange(4)
+    if kind == 0:
+        return name[:i] + name[i + 1:]
+    if kind == 1:
+        return name[:i] + name[i] + name[i:]
+    if kind == 2 and i < len(name) - 1:
+        return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+    return name[:i] + rng.choice('aeioukrstn') + name[i + 1:]
+
+
+def branch(rng, village, i):
+    bank, prefix = rng.choice(BANKS)
+    return Branch(bank, village, f"{prefix}0{i:06d}", f"Main Road, {village}",
+                  f"0{rng.randrange(100, 1000)} {rng.randrange(200000, 300000)}", rng.choice(('yes', 'yes', 'no', '')))
+
+
+def measure(kb, queries):
+    timings, correct = [], 0
+    for state, district, village, asked in queries:
+        started = time.perf_counter()
+        matches = kb.find_villages(state, asked)
+        timings.append(time.perf_counter() - started)
+        correct += bool(matches) and matches[0].village.casefold() == village.casefold()
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.99)], correct / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--villages', type=int, default=600000)
+    parser.add_argument('--branches', type=int, default=160000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--pack', default=os.path.join('/tmp', 'knowledge.npz'))
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    rows = [(rng.choice(STATES), f"District {rng.randrange(20)}", village_name(rng)) for _ in range(args.villages)]
+    branches = [(state, district, village, branch(rng, village, i))
+                for i, (state, district, village) in enumerate(rng.choices(rows, k=args.branches))]
+    started = time.perf_counter()
+    kb = KnowledgeBase.build(rows, read_schemes(os.path.join(ROOT, 'data', 'schemes.json')), branches)
+    print(f"built index of {len(kb)} villages and {kb.branch_count} branches in {time.perf_counter() - started:.1f} s")
+
+    started = time.perf_counter()
+    kb.save_pack(args.pack)
+    print(f"wrote pack in {time.perf_counter() - started:.2f} s ({os.path.getsize(args.pack) / 1e6:.1f} MB)")
+    started = time.perf_counter()
+    kb = KnowledgeBase.load_pack(args.pack)
+    print(f"loaded pack in {time.perf_counter() - started:.2f} s")
+
+    sample = rng.sample(rows, args.lookups)
+    for label, queries in (('exact', [(s, d, v, v) for s, d, v in sample]),
+                           ('one typo', [(s, d, v, typo(rng, v)) for s, d, v in sample])):
+        p50, p99, accuracy = measure(kb, queries)
+        print(f"{label:<9} lookup p50 {p50 * 1000:.3f} ms, p99 {p99 * 1000:.3f} ms, accuracy {accuracy:.1%}")
+
+    timings, scopes = [], {'village': 0, 'district': 0, 'none': 0}
+    for state, district, village, _ in rng.sample(branches, args.lookups):
+        started = time.perf_counter()
+        matches = kb.find_villages(state, village, district)
+        found, scope = kb.branches_near(matches[0], lockers=True) if matches else ([], 'none')
+        timings.append(time.perf_counter() - started)
+        scopes[scope if found else 'none'] += 1
+    timings.sort()
+    print(f"locker lookup p50 {timings[len(timings) // 2] * 1000:.3f} ms, p99 {timings[int(len(timings) * 0.99)] * 1000:.3f} ms; "
+          f"answered from the village {scopes['village'] / len(timings):.1%}, "
+          f"the district {scopes['district'] / len(timings):.1%}, not at all {scopes['none'] / len(timings):.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark: local microloan scoring vs one model call per applicant.
+
+    python benchmarks/bench_microloan.py [--rows 100000] [--llm-seconds 2.5] [--llm-concurrency 8]
+
+Times microloan.assess() for a single applicant and read_batch() +
+score_batch() over a synthetic JSONL batch, then compares the batch with
+one model call per applicant (the previous /estimate_microloan_eligibility
+path), --llm-concurrency at a time and --llm-seconds each.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import microloan
+
+
+def synthetic_rows(count, seed=0):
+    rng = random.Random(seed)
+    yes_no = ('yes', 'no')
+    for index in range(count):
+        yield {
+            'id': index,
+            'owns_asset': rng.choice(yes_no),
+            'steady_income': rng.choice(yes_no),
+            'existing_loans': rng.choice(yes_no),
+            'dependents': rng.randint(0, 10),
+            'bank_account': rng.choice(yes_no),
+            'monthly_earnings': rng.randint(1000, 20000),
+            'job': rng.choice(('farmer', 'shopkeeper', 'weaver', 'labourer')),
+            'purpose': rng.choice(('', 'buy seeds', 'buy a cow', 'open a shop')),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--llm-seconds', type=float, default=2.5, help='typical latency of one model call')
+    parser.add_argument('--llm-concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    answers = microloan.parse_answers(next(synthetic_rows(1)))
+    microloan.assess(answers)
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        microloan.assess(answers)
+    single = (time.perf_counter() - started) / args.repeat
+    print(f"single assess: {single * 1e6:.1f} us")
+
+    body = '\n'.join(json.dumps(row) for row in synthetic_rows(args.rows)).encode()
+    started = time.perf_counter()
+    rows = list(microloan.read_batch(body, 'application/x-ndjson'))
+    parsed = time.perf_counter()
+    results = list(microloan.score_batch(rows))
+    scored = time.perf_counter()
+    assert len(results) == args.rows
+
+    total = scored - started
+    llm_total = args.rows * args.llm_seconds / args.llm_concurrency
+    print(f"batch of {args.rows}: parse {(parsed - started) * 1000:.0f} ms, score {(scored - parsed) * 1000:.0f} ms, "
+          f"{args.rows / total:,.0f} rows/s")
+    print(f"one model call per applicant: ~{llm_total / 60:,.0f} min at {args.llm_seconds:g}s x{args.llm_concurrency} "
+          f"({llm_total / total:,.0f}x slower)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Micro-benchmark: per-request model setup cost, before and after the registry.
+
+    python benchmarks/bench_model_registry.py [--iterations 2000]
+
+No API key or network is needed; only handle construction is timed.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import google.generativeai as genai
+
+from llm import ModelRegistry
+
+INSTRUCTIONS = {
+    'en-US': 'You are a friendly financial advisor for Indian villagers. ' * 8,
+    'hi-IN': 'आप भारतीय ग्रामीणों के लिए एक मित्रवत वित्तीय सलाहकार हैं। ' * 8,
+}
+
+
+def build_per_request():
+    return genai.GenerativeModel(
+        'gemini-2.0-flash',
+        generation_config=genai.types.GenerationConfig(
+            temperature=0.5,
+            max_output_tokens=1000
+        ),
+        system_instruction=INSTRUCTIONS['hi-IN']
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    registry.register('chat', INSTRUCTIONS)
+    registry.warm()
+
+    def from_registry():
+        return registry.get('chat', 'hi-IN')
+
+    for name, fn in (('per-request GenerativeModel', build_per_request),
+                     ('ModelRegistry.get', from_registry)):
+        best = min(timeit.repeat(fn, number=args.iterations, repeat=5))
+        print(f"{name:<30} {best / args.iterations * 1e6:10.2f} us/request")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Benchmark: OCR of phone photos of forms, per stage and through the process pool.
+
+    python benchmarks/bench_ocr.py [--images 24] [--workers 1,2,4] [--size 4032x3024] [--max-side 2000]
+
+Renders --images synthetic form photos at phone camera size: printed form
+lines on unevenly lit paper, skewed by up to 6 degrees, with sensor noise,
+saved as JPEG. Times the preprocessing stages on one process (decode at
+reduced size, grayscale and contrast, skew estimate, rotation) and reports
+how closely the estimated skew matches the true one. Then sends all images
+at once through ImageOcr with each --workers pool size and reports images
+per second, which is what OCR_WORKERS should be sized from. Without the
+tesseract binary, the pool runs the preprocessing alone.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageDraw, ImageFont  # noqa: E402
+
+from extraction import ImageOcr, deskew, load_image, prepare_image, skew_angle  # noqa: E402
+
+LINES = ['ACCOUNT OPENING FORM', 'Name of applicant: ____________________', 'Father / Husband name: ______________',
+         'Date of birth: __ / __ / ____', 'Address: ______________________________', 'Village: ____________  District: ________',
+         'Mobile number: __________', 'Aadhaar number: ____ ____ ____', 'Nominee name: __________________',
+         'Type of account: Savings / Current', 'Signature of applicant: ____________']
+
+
+def form_photo(rng, width, height):
+    """A JPEG photo of a form and the skew, in degrees, that levels it."""
+    page = Image.new('L', (width, height), 235)
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=height // 45)
+    y = height // 10
+    for line in LINES * 2:
+        draw.text((width // 10, y), line, fill=25, font=font)
+        y += height // 26
+    skew = rng.uniform(-6, 6)
+    page = page.rotate(-skew, resample=Image.BICUBIC, fillcolor=200)
+    # Light falling off across the page, plus sensor noise
+    pixels = np.asarray(page, dtype=np.float32) * np.linspace(1.0, 0.7, width, dtype=np.float32)
+    pixels += np.random.default_rng(rng.randrange(1 << 30)).normal(0, 6, pixels.shape).astype(np.float32)
+    photo = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert('RGB')
+    out = io.BytesIO()
+    photo.save(out, 'JPEG', quality=90)
+    return out.getvalue(), skew
+
+
+def stages(data, max_side):
+    timings = {}
+    started = time.perf_counter()
+    image = load_image(data, max_side)
+    timings['decode + downscale'] = time.perf_counter() - started
+    started = time.perf_counter()
+    angle = skew_angle(image)
+    timings['skew estimate'] = time.perf_counter() - started
+    started = time.perf_counter()
+    deskew(image)
+    timings['deskew (estimate + rotate)'] = time.perf_counter() - started
+    return timings, angle
+
+
+def full_decode(data):
+    started = time.perf_counter()
+    Image.open(io.BytesIO(data)).convert('L')
+    return time.perf_counter() - started
+
+
+def prepare_only(data, max_side):
+    # Pool task when tesseract is not installed
+    return prepare_image(data, max_side).size
+
+
+def throughput(images, workers, max_side, ocr):
+    if ocr:
+        reader = ImageOcr(workers, image_timeout=120, max_side=max_side)
+        run = reader.extract
+    else:
+        pool = ProcessPoolExecutor(workers)
+        run = lambda data: pool.submit(prepare_only, data, max_side).result()  # noqa: E731
+    run(images[0])  # start the workers
+    started = time.perf_counter()
+    with ThreadPoolExecutor(len(images)) as clients:
+        list(clients.map(run, images))
+    elapsed = time.perf_counter() - started
+    reader.shutdown() if ocr else pool.shutdown()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=24)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--size', default='4032x3024')
+    parser.add_argument('--max-side', type=int, default=2000)
+    args = parser.parse_args()
+    width, height = map(int, args.size.split('x'))
+    rng = random.Random(0)
+
+    photos = [form_photo(rng, width, height) for _ in range(args.images)]
+    images = [data for data, _ in photos]
+    print(f"{len(images)} photos of {width}x{height}, {sum(map(len, images)) / len(images) / 1e6:.1f} MB each on average")
+
+    totals, errors = {}, []
+    for data, skew in photos:
+        timings, angle = stages(data, args.max_side)
+        errors.append(abs(angle - skew))
+        for name, seconds in timings.items():
+            totals[name] = totals.get(name, 0) + seconds
+    print(f"full-size decode (for comparison): {sum(map(full_decode, images)) / len(images) * 1000:.0f} ms")
+    for name, seconds in totals.items():
+        print(f"{name}: {seconds / len(images) * 1000:.0f} ms")
+    print(f"skew error: mean {np.mean(errors):.2f} deg, max {max(errors):.2f} deg")
+
+    ocr = ImageOcr().available
+    if not ocr:
+        print("tesseract is not installed; timing the pool on preprocessing alone")
+    for workers in map(int, args.workers.split(',')):
+        elapsed = throughput(images, workers, args.max_side, ocr)
+        print(f"{workers} worker(s): {len(images) / elapsed:.1f} images/s ({elapsed / len(images) * 1000:.0f} ms per image)")
+
+
+if __name__ == '__main__':
+    main()
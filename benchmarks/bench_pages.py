@@ -0,0 +1,55 @@
+"""Benchmark: GET pages rendered per request vs prerendered and precompressed.
+
+    python benchmarks/bench_pages.py [--requests 2000]
+
+For each page, times the work a request does to produce its body, rendering
+the template against looking up the stored encoding, and compares the bytes
+a browser downloads: the HTML with its CSS and JS inline (as every page used
+to carry them) against the compressed page once the shared bundles are
+cached.
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('LLM_BACKEND', 'stub')
+os.environ.setdefault('RATE_LIMIT_PER_MIN', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template  # noqa: E402
+
+from app import PAGE_TEMPLATES, STATIC_BUNDLES, create_app, static_pages  # noqa: E402
+
+
+def per_call(fn, arg, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+    app = create_app()
+
+    pages = {path: template for path, template in PAGE_TEMPLATES.items() if template in static_pages}
+    if not pages:
+        sys.exit("No page could be prerendered; check that the templates are in place")
+
+    print(f"{'page':<24} {'render':>9} {'prerendered':>12} {'inline bytes':>13} {'wire bytes':>11}")
+    for path, template in pages.items():
+        with app.test_request_context(path, headers={'Accept-Encoding': 'gzip, br'}):
+            slow = per_call(render_template, template, args.requests)
+            fast = per_call(static_pages.response, template, args.requests)
+            wire = len(static_pages.response(template).get_data())
+            html = render_template(template)
+        inline = len(html.encode('utf-8')) + sum(static_pages.size(f"asset:{name}") for name in STATIC_BUNDLES
+                                                 if f"/assets/{name}" in html)
+        print(f"{path:<24} {slow * 1e6:>6.0f} us {fast * 1e6:>9.0f} us {inline:>13} {wire:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark: form text extraction, old serial path vs PdfExtractor.
+
+    python benchmarks/bench_pdf_extract.py [--copies 1,4,10] [--workers 4]
+
+Multi-page documents are built by concatenating new_account_opening_form.pdf
+(9 pages) --copies times. The old path saves the upload to disk, reopens it
+and concatenates page text with +=; the new path extracts from the in-memory
+bytes, in parallel on a process pool above a few pages.
+"""
+import argparse
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PyPDF2
+
+from extraction import PdfExtractor
+
+SAMPLE_FORM = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'new_account_opening_form.pdf')
+
+
+def build_pdf(copies):
+    writer = PyPDF2.PdfWriter()
+    for _ in range(copies):
+        writer.append(SAMPLE_FORM)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def serial_from_disk(data):
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+        f.write(data)
+        path = f.name
+    try:
+        with open(path, 'rb') as f:
+            reader = PyPDF2.PdfReader(f)
+            text = ''
+            for page in reader.pages:
+                text += page.extract_text() or ''
+            return text
+    finally:
+        os.remove(path)
+
+
+def best_of(fn, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(data)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', default='1,4,10')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    logging.getLogger('PyPDF2').setLevel(logging.ERROR)
+
+    extractor = PdfExtractor(workers=args.workers, max_pages=10000, max_chars=10 ** 9)
+    # Start the pool outside the timings, as it is in a running server
+    extractor.extract(build_pdf(2))
+
+    print(f"{'pages':>6} {'serial (disk)':>14} {'PdfExtractor':>14} {'speedup':>8}")
+    try:
+        for copies in (int(c) for c in args.copies.split(',')):
+            data = build_pdf(copies)
+            old = best_of(serial_from_disk, data, args.repeat)
+            new = best_of(extractor.extract, data, args.repeat)
+            pages = len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+            print(f"{pages:>6} {old * 1000:>11.0f} ms {new * 1000:>11.0f} ms {old / new:>7.1f}x")
+    finally:
+        extractor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark: model routing overhead, latency mix, and fallback when the light tier fails.
+
+    python benchmarks/bench_router.py [--calls 600] [--lite-ms 30] [--standard-ms 80] [--config model_routing.json]
+
+Runs a mix of short and long questions against the stub backend, whose
+latency per model is set by --lite-ms and --standard-ms (and tokens stream
+at --tokens-per-second), first with every call on the feature's registered
+profile, then routed by the config. Reports how long routing decisions take,
+the latency and output tokens per profile, and, in a third run where the
+light model fails half its calls, how much traffic the router moves off it.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.api_core.exceptions import ServiceUnavailable  # noqa: E402
+
+from llm import ModelRegistry, StubBackend  # noqa: E402
+from router import ModelRouter  # noqa: E402
+
+SHORT = ['how do i check my balance', 'what is an fd', 'how to get a debit card', 'what is upi', 'is my pin safe',
+         'can i open an account without aadhaar', 'what is a passbook', 'how much interest on savings']
+LONG = ("I am a farmer with two acres of paddy and my son works in the city sending money every month. We have a "
+        "savings account in the cooperative bank and a crop loan from the gramin bank. Should we open a fixed "
+        "deposit for the money he sends, or keep it in savings, and how do we make sure we can still repay the loan "
+        "on time if the monsoon fails this year? ")
+
+
+class FlakyStub(StubBackend):
+    def __init__(self, registry, failing_model, **options):
+        super().__init__(registry, **options)
+        self.failing_model = failing_model
+        self._flaky = random.Random(1)
+
+    def generate(self, feature, language, prompt, profile=None):
+        if profile is not None and profile.model_name == self.failing_model and self._flaky.random() < 0.5:
+            raise ServiceUnavailable("Stub backend: light model failing")
+        return super().generate(feature, language, prompt, profile)
+
+
+def run(backend, router, questions, concurrency, routed):
+    results = {}
+
+    def call(question):
+        choice = router.choose('chat', '/chat', question) if routed else router.choose('chat', '/chat', LONG)
+        started = time.perf_counter()
+        try:
+            with router.timed(choice):
+                completion = backend.generate('chat', 'en-US', question, choice.profile)
+        except ServiceUnavailable:
+            return choice.name, None, 0
+        return choice.name, time.perf_counter() - started, completion.output_tokens
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        for name, seconds, tokens in pool.map(call, questions):
+            stats = results.setdefault(name, {'calls': 0, 'failed': 0, 'latencies': [], 'tokens': 0})
+            stats['calls'] += 1
+            if seconds is None:
+                stats['failed'] += 1
+            else:
+                stats['latencies'].append(seconds)
+                stats['tokens'] += tokens
+    return results
+
+
+def report(label, results):
+    latencies = sorted(seconds for stats in results.values() for seconds in stats['latencies'])
+    print(f"{label}: mean {sum(latencies) / len(latencies) * 1000:.0f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.0f} ms, "
+          f"{sum(stats['tokens'] for stats in results.values())} output tokens")
+    for name, stats in sorted(results.items()):
+        ordered = sorted(stats['latencies']) or [0]
+        print(f"  {name:<9} {stats['calls']:>5} calls ({stats['failed']} failed), "
+              f"p50 {ordered[len(ordered) // 2] * 1000:.0f} ms, {stats['tokens']} output tokens")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=600)
+    parser.add_argument('--short-share', type=float, default=0.7)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--lite-ms', type=float, default=30)
+    parser.add_argument('--standard-ms', type=float, default=80)
+    parser.add_argument('--tokens-per-second', type=float, default=5000)
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                         'model_routing.json'))
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    registry = ModelRegistry()
+    registry.register('chat')
+    questions = [f"{rng.choice(SHORT)} {i}" if rng.random() < args.short_share else f"{LONG}{i}" for i in range(args.calls)]
+    options = {'latency': args.standard_ms / 1000, 'tokens_per_second': args.tokens_per_second,
+               'model_latency': {'gemini-2.0-flash-lite': args.lite_ms / 1000, 'gemini-2.0-flash': args.standard_ms / 1000}}
+
+    router = ModelRouter.from_file(registry, args.config)
+    started = time.perf_counter()
+    for question in questions:
+        router.choose('chat', '/chat', question)
+    print(f"routing decision: {(time.perf_counter() - started) / len(questions) * 1e6:.1f} us per call")
+
+    backend = StubBackend(registry, **options)
+    report('registered profile', run(backend, ModelRouter.from_file(registry, args.config), questions, args.concurrency, False))
+    report('routed', run(backend, ModelRouter.from_file(registry, args.config), questions, args.concurrency, True))
+    flaky = FlakyStub(registry, 'gemini-2.0-flash-lite', **options)
+    report('routed, light model failing half its calls',
+           run(flaky, ModelRouter.from_file(registry, args.config), questions, args.concurrency, True))
+
+
+if __name__ == '__main__':
+    main()
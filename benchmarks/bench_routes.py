@@ -0,0 +1,147 @@
+"""Offline benchmark of every POST route against the stub LLM backend.
+
+    python benchmarks/bench_routes.py [--requests 200] [--concurrency 16]
+                                      [--latency-ms 50] [--tokens-per-sec 0]
+                                      [--error-rate 0] [--routes /chat,...]
+                                      [--json results.json] [--fail-p99-ms 500]
+
+Requests are sent through Flask's test client from a thread pool, so no
+server, API key or network is needed. Each request carries a distinct prompt
+(pass --cacheable to repeat identical payloads and exercise the response
+cache). Per route it reports throughput, p50/p90/p99 latency and errors; with
+--fail-p99-ms it exits non-zero when any route's p99 is above the budget, so
+it can gate CI.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_FORM = os.path.join(ROOT, 'new_account_opening_form.pdf')
+LANGUAGES = ('en-US', 'hi-IN', 'kn-IN', 'ta-IN', 'te-IN')
+
+
+def json_payload(field, text):
+    def build(i):
+        return {'json': {field: f"{text} #{i}", 'language': LANGUAGES[i % len(LANGUAGES)]}}
+    return build
+
+
+def place_payload(i):
+    return {'json': {'state': 'Karnataka', 'village': f"Village {i}", 'language': LANGUAGES[i % len(LANGUAGES)]}}
+
+
+def form_payload(i):
+    with open(SAMPLE_FORM, 'rb') as f:
+        data = f.read()
+    return {'data': {'file': (io.BytesIO(data), 'new_account_opening_form.pdf'),
+                     'language': LANGUAGES[i % len(LANGUAGES)]},
+            'content_type': 'multipart/form-data'}
+
+
+ROUTES = {
+    '/chat': json_payload('message', 'What is a savings account?'),
+    '/get_schemes': place_payload,
+    '/upload_form': form_payload,
+    '/process_atm_voice': json_payload('transcript', 'I see Withdraw, Balance, Mini Statement'),
+    '/process_savings_query': json_payload('query', 'How do I open a savings account?'),
+    '/process_fixed_deposit_query': json_payload('query', 'How much interest will my fixed deposit earn?'),
+    '/process_current_account_query': json_payload('query', 'Do I need a current account for my shop?'),
+    '/estimate_microloan_eligibility': json_payload('query', 'Own land: yes. Steady income: yes. Earnings: 8000 rupees.'),
+    '/get_locker_facilities': place_payload,
+    '/insurance_chat': json_payload('message', 'What is crop insurance?'),
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def bench_route(app, path, build, args):
+    local = threading.local()
+
+    def send(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        payload = build(0 if args.cacheable else i)
+        started = time.perf_counter()
+        response = client.post(path, **payload)
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(send, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in results]
+    return {
+        'route': path,
+        'requests': args.requests,
+        'rps': args.requests / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p90_ms': percentile(latencies, 0.90) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'errors': sum(1 for _, status in results if status != 200),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency-ms', type=int, default=50)
+    parser.add_argument('--tokens-per-sec', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--routes', help='comma-separated subset of routes to drive')
+    parser.add_argument('--cacheable', action='store_true', help='repeat identical payloads')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--fail-p99-ms', type=float, help='exit 1 if any route p99 exceeds this')
+    args = parser.parse_args()
+
+    # The stub backend is selected before the app is imported. Every request
+    # comes from one address, so per-client rate limiting is off.
+    os.environ.update({
+        'LLM_BACKEND': 'stub',
+        'RATE_LIMIT_PER_MIN': '0',
+        'STUB_LATENCY_MS': str(args.latency_ms),
+        'STUB_TOKENS_PER_SEC': str(args.tokens_per_sec),
+        'STUB_ERROR_RATE': str(args.error_rate),
+    })
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    app = create_app()
+    app.logger.disabled = True
+    logging.getLogger('PyPDF2').setLevel(logging.ERROR)
+
+    routes = args.routes.split(',') if args.routes else list(ROUTES)
+    print(f"{args.requests} requests/route, concurrency {args.concurrency}, stub latency {args.latency_ms} ms, "
+          f"{args.tokens_per_sec or 'unlimited'} tokens/s, error rate {args.error_rate}")
+    print(f"{'route':<34} {'req/s':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    results = []
+    for path in routes:
+        result = bench_route(app, path, ROUTES[path], args)
+        results.append(result)
+        print(f"{path:<34} {result['rps']:8.1f} {result['p50_ms']:9.1f} {result['p90_ms']:9.1f} "
+              f"{result['p99_ms']:9.1f} {result['errors']:7d}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.fail_p99_ms is not None:
+        slow = [r['route'] for r in results if r['p99_ms'] > args.fail_p99_ms]
+        if slow:
+            print(f"p99 above {args.fail_p99_ms} ms: {', '.join(slow)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark: worker cold start, from a fresh interpreter to its first answered requests.
+
+    python benchmarks/bench_startup.py [--runs 5] [--eager]
+
+Starts --runs fresh Python processes, as gunicorn does when it adds a worker.
+Each one imports app, calls create_app() and answers its first page and its
+first API request through Flask's test client, against the stub backend (no
+API key or network needed). Reports the median time from launch to each step,
+and which heavy libraries had been imported by the first answer; it fails if
+importing app loads gRPC. --eager
+also imports google.generativeai, PyPDF2 and Pillow before the app, as
+app.py used to at import, for comparison. Last, it times what the first
+Gemini call (or the background preload) pays on top: importing the client
+and building the model handles, without calling the API.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('google.generativeai', 'grpc', 'PyPDF2', 'PIL.Image', 'pytesseract')
+STEPS = ('interpreter', 'import app', 'create_app()', 'first page', 'first API request', 'Gemini client + models')
+
+
+def child(launched, eager):
+    # Runs in the fresh process; times are seconds since the parent launched it
+    times = [time.time() - launched]
+    if eager:
+        import google.generativeai  # noqa: F401
+        import PyPDF2  # noqa: F401
+        from PIL import Image  # noqa: F401
+    sys.path.insert(0, ROOT)
+    import app
+    times.append(time.time() - launched)
+    if not eager:
+        # gRPC comes with google.api_core, which must wait for the first Gemini call or upstream error
+        assert 'grpc' not in sys.modules, "import app loaded grpc"
+    client = app.create_app().test_client()
+    times.append(time.time() - launched)
+    client.get('/').get_data()
+    times.append(time.time() - launched)
+    client.post('/process_savings_query', json={'query': 'How do I open a savings account?'}).get_data()
+    times.append(time.time() - launched)
+    loaded = [name for name in HEAVY if name in sys.modules]
+    started = time.perf_counter()
+    app.models.warm()
+    times.append(times[-1] + time.perf_counter() - started)
+    print(json.dumps({'times': times, 'loaded': loaded}))
+
+
+def run(eager):
+    env = dict(os.environ, LLM_BACKEND='stub', STUB_LATENCY_MS='0', RATE_LIMIT_PER_MIN='0', AUDIT_LOG='0')
+    command = [sys.executable, os.path.abspath(__file__), '--child', str(time.time())]
+    if eager:
+        command.append('--eager')
+    out = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def report(label, results):
+    print(label)
+    previous = 0.0
+    for i, step in enumerate(STEPS):
+        at = statistics.median(result['times'][i] for result in results)
+        print(f"  {step:<24} {at * 1000:7.0f} ms  (+{(at - previous) * 1000:.0f})")
+        previous = at
+    print(f"  imported before the first answer: {', '.join(results[0]['loaded']) or 'none of ' + ', '.join(HEAVY)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--eager', action='store_true', help='also time with the heavy libraries imported up front')
+    parser.add_argument('--child', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child is not None:
+        child(args.child, args.eager)
+        return
+
+    report(f"lazy imports ({args.runs} runs, median)", [run(False) for _ in range(args.runs)])
+    if args.eager:
+        report(f"eager imports ({args.runs} runs, median)", [run(True) for _ in range(args.runs)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Load test: sync WSGI workers vs the async ASGI path, against the stub model.
+
+    python benchmarks/loadtest_async.py [--requests 400] [--concurrency 200]
+                                        [--latency-ms 1000] [--sync-workers 4]
+
+Both servers run with LLM_BACKEND=stub, so no API key or network is needed.
+The sync server is gunicorn with sync workers (app:create_app()); the async server is
+uvicorn with a single worker (asgi:application). Every request asks a
+distinct /chat question so the response cache never answers.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(command, latency_ms):
+    env = dict(os.environ, LLM_BACKEND='stub', STUB_LATENCY_MS=str(latency_ms), RATE_LIMIT_PER_MIN='0')
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_until_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url):
+                    return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def drive(base_url, total, concurrency):
+    latencies = []
+    errors = 0
+    pending = iter(range(total))
+    timeout = aiohttp.ClientTimeout(total=600)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        async def worker():
+            nonlocal errors
+            for i in pending:
+                started = time.perf_counter()
+                try:
+                    async with session.post(f"{base_url}/chat", json={'message': f"What is a savings account? #{i}",
+                                                                      'language': 'en-US'}) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                except aiohttp.ClientError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        'rps': total / elapsed,
+        'p50': percentile(latencies, 0.50),
+        'p99': percentile(latencies, 0.99),
+        'errors': errors,
+    }
+
+
+def run(name, command, port, args):
+    server = start_server(command, args.latency_ms)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(wait_until_ready(base_url))
+        result = asyncio.run(drive(base_url, args.requests, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+    print(f"{name:<34} {result['rps']:8.1f} req/s   p50 {result['p50'] * 1000:8.0f} ms   "
+          f"p99 {result['p99'] * 1000:8.0f} ms   errors {result['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency-ms', type=int, default=1000)
+    parser.add_argument('--sync-workers', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, stub latency {args.latency_ms} ms")
+    port = free_port()
+    run(f"sync (gunicorn, {args.sync_workers} workers)",
+        [sys.executable, '-m', 'gunicorn', '-w', str(args.sync_workers), '-b', f"127.0.0.1:{port}",
+         '--timeout', '600', 'app:create_app()'], port, args)
+    port = free_port()
+    run("async (uvicorn, 1 worker)",
+        [sys.executable, '-m', 'uvicorn', 'asgi:application', '--port', str(port), '--log-level', 'warning'],
+        port, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""Replay a captured audit log through the app, against the stub or the real model.
+
+    python benchmarks/replay.py logs/ [--speed 1] [--backend stub] [--latency-ms 1000]
+                                      [--url http://localhost:5000] [--routes /chat,...]
+                                      [--upload-file form.pdf] [--concurrency 256] [--json results.json]
+
+Records from the given audit files (or directories of them) are sent in the
+order they were captured. At --speed 1 they keep their original spacing,
+--speed 10 replays ten times faster, and --speed 0 sends them as fast as
+--concurrency allows. By default the app runs in this process behind Flask's
+test client with LLM_BACKEND=stub (and the stub's latency set by
+--latency-ms); --backend gemini calls the real model, which needs
+GOOGLE_API_KEY. --url sends the requests to a running server instead.
+Uploads are replayed with --upload-file standing in for the original file,
+and skipped without it. Per route it reports requests sent, errors and
+status changes, and replayed p50/p99 latency next to the captured one. It
+also reports how far sends fell behind schedule, which shows when the client
+itself could not keep up.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from audit import read_log  # noqa: E402
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+def in_process_sender(backend, latency_ms):
+    # The backend is chosen before the app is imported. Replayed traffic comes
+    # from one address, so rate limiting is off, and it is not audited again.
+    os.environ.update({'LLM_BACKEND': backend, 'STUB_LATENCY_MS': str(latency_ms), 'RATE_LIMIT_PER_MIN': '0',
+                       'AUDIT_LOG': '0'})
+    os.chdir(ROOT)
+    from app import create_app
+    app = create_app()
+    app.logger.disabled = True
+    logging.getLogger('PyPDF2').setLevel(logging.ERROR)
+    local = threading.local()
+
+    def send(route, headers, json_body=None, form=None, upload=None):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        if upload is None:
+            response = client.post(route, json=json_body, headers=headers)
+        else:
+            filename, data = upload
+            response = client.post(route, data=dict(form, file=(io.BytesIO(data), filename)), headers=headers,
+                                   content_type='multipart/form-data')
+        response.get_data()
+        return response.status_code
+
+    return send
+
+
+def http_sender(url):
+    import requests
+    local = threading.local()
+
+    def send(route, headers, json_body=None, form=None, upload=None):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        if upload is None:
+            response = session.post(url + route, json=json_body, headers=headers, timeout=600)
+        else:
+            response = session.post(url + route, data=form, files={'file': upload}, headers=headers, timeout=600)
+        response.content
+        return response.status_code
+
+    return send
+
+
+def request_args(record, upload_name, upload_data):
+    """Keyword arguments for send, or None when the record cannot be replayed."""
+    if 'input' in record:
+        return {'json_body': record['input']}
+    upload = record.get('upload')
+    if upload and upload.get('filename') and upload_data is not None:
+        # Keep the original extension so the route takes the same path
+        name = os.path.splitext(upload_name)[0] + os.path.splitext(upload['filename'])[1]
+        return {'form': upload.get('form', {}), 'upload': (name, upload_data)}
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='audit files or directories')
+    parser.add_argument('--speed', type=float, default=1.0, help='1 = as captured, 0 = as fast as possible')
+    parser.add_argument('--backend', choices=('stub', 'gemini'), default='stub')
+    parser.add_argument('--latency-ms', type=int, default=1000, help='stub latency per call')
+    parser.add_argument('--url', help='send to a running server instead of an in-process app')
+    parser.add_argument('--routes', help='comma-separated subset of routes to replay')
+    parser.add_argument('--upload-file', help='file sent in place of each recorded upload')
+    parser.add_argument('--concurrency', type=int, default=256)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    records = read_log(args.paths)
+    if args.routes:
+        routes = set(args.routes.split(','))
+        records = [record for record in records if record['route'] in routes]
+    upload_data = None
+    if args.upload_file:
+        with open(args.upload_file, 'rb') as f:
+            upload_data = f.read()
+    upload_name = os.path.basename(args.upload_file or '')
+    planned = [(record, request_args(record, upload_name, upload_data)) for record in records]
+    skipped = sum(1 for _, kwargs in planned if kwargs is None)
+    planned = [(record, kwargs) for record, kwargs in planned if kwargs is not None]
+    if not planned:
+        print(f"nothing to replay ({skipped} record(s) skipped)")
+        return
+    send = http_sender(args.url.rstrip('/')) if args.url else in_process_sender(args.backend, args.latency_ms)
+    span = planned[-1][0]['ts'] - planned[0][0]['ts']
+    print(f"replaying {len(planned)} requests captured over {span:.1f} s at "
+          f"{'full' if not args.speed else f'{args.speed:g}x'} speed against {args.url or args.backend} "
+          f"({skipped} skipped)")
+
+    def replay(item):
+        record, kwargs, due = item
+        started = time.perf_counter()
+        try:
+            status = send(record['route'], record.get('headers', {}), **kwargs)
+        except Exception as e:
+            logging.warning(f"Replay of {record['route']} failed: {e}")
+            status = None
+        return record, status, time.perf_counter() - started, started - due
+
+    first_ts = planned[0][0]['ts']
+    started = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        for record, kwargs in planned:
+            due = started + ((record['ts'] - first_ts) / args.speed if args.speed else 0)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(replay, (record, kwargs, due)))
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    by_route = {}
+    for record, status, seconds, _ in results:
+        stats = by_route.setdefault(record['route'], {'sent': 0, 'errors': 0, 'changed': 0, 'latencies': [],
+                                                      'captured': []})
+        stats['sent'] += 1
+        stats['errors'] += status is None or status >= 400
+        stats['changed'] += status != record['status']
+        stats['latencies'].append(seconds * 1000)
+        stats['captured'].append(record['latency_ms'])
+
+    print(f"{'route':<34} {'sent':>6} {'errors':>7} {'changed':>8} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'was p50':>9} {'was p99':>9}")
+    summary = []
+    for route, stats in sorted(by_route.items()):
+        row = {'route': route, 'sent': stats['sent'], 'errors': stats['errors'], 'status_changed': stats['changed'],
+               'p50_ms': percentile(stats['latencies'], 0.5), 'p99_ms': percentile(stats['latencies'], 0.99),
+               'captured_p50_ms': percentile(stats['captured'], 0.5),
+               'captured_p99_ms': percentile(stats['captured'], 0.99)}
+        summary.append(row)
+        print(f"{route:<34} {row['sent']:6d} {row['errors']:7d} {row['status_changed']:8d} {row['p50_ms']:9.1f} "
+              f"{row['p99_ms']:9.1f} {row['captured_p50_ms']:9.1f} {row['captured_p99_ms']:9.1f}")
+    lags = [lag * 1000 for _, _, _, lag in results]
+    print(f"{len(results) / elapsed:.1f} req/s over {elapsed:.1f} s; sends behind schedule p50 "
+          f"{percentile(lags, 0.5):.1f} ms, p99 {percentile(lags, 0.99):.1f} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'elapsed_s': elapsed, 'skipped': skipped, 'routes': summary}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
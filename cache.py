@@ -0,0 +1,250 @@
+"""Response cache for LLM answers.
+
+Answers are keyed on a normalized (route, language, system instruction,
+prompt) tuple. Entries expire after a per-feature TTL and the least recently
+used entries are evicted once the cache is full. Expired entries are kept
+until evicted so they can still be served, marked stale, when the upstream
+is failing. Two backends are provided:
+an in-memory one and an SQLite one whose entries survive restarts.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds an answer stays fresh, per feature. 0 disables caching.
+DEFAULT_TTLS = {
+    'chat': 6 * 3600,
+    'schemes': 24 * 3600,
+    'locker': 24 * 3600,
+    'atm': 6 * 3600,
+    'savings': 6 * 3600,
+    'fixed_deposit': 6 * 3600,
+    'current_account': 6 * 3600,
+    'microloan': 3600,
+    'insurance': 6 * 3600,
+    'form': 0,
+    'form_fields': 24 * 3600,
+}
+
+_whitespace = re.compile(r'\s+')
+
+
+def normalize(text):
+    return _whitespace.sub(' ', text or '').strip().casefold()
+
+
+def make_key(route, language, system_instruction, prompt):
+    parts = [route, language or '', system_instruction or '', normalize(prompt)]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, stale=False):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time() and not stale:
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    def __init__(self, path, max_entries=20000):
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS response_cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'expires_at REAL NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS response_cache_lru ON response_cache (last_used)')
+        self._db.commit()
+
+    def get(self, key, stale=False):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                'SELECT value, expires_at FROM response_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (row[1] <= now and not stale):
+                return None
+            self._db.execute('UPDATE response_cache SET last_used = ? WHERE key = ?', (now, key))
+            self._db.commit()
+            return row[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO response_cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)',
+                (key, value, now + ttl, now)
+            )
+            (count,) = self._db.execute('SELECT COUNT(*) FROM response_cache').fetchone()
+            if count > self.max_entries:
+                self._db.execute('DELETE FROM response_cache WHERE expires_at <= ?', (now,))
+                self._db.execute(
+                    'DELETE FROM response_cache WHERE key IN '
+                    '(SELECT key FROM response_cache ORDER BY last_used LIMIT ?)',
+                    (max(count - self.max_entries, 0),)
+                )
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM response_cache')
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0]
+
+
+class ResponseCache:
+    def __init__(self, backend, ttls=None):
+        self.backend = backend
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.hits = 0
+        self.misses = 0
+
+    def enabled(self, route):
+        return self.ttls.get(route, 0) > 0
+
+    def get(self, route, language, system_instruction, prompt):
+        if not self.enabled(route):
+            return None
+        value = self.backend.get(make_key(route, language, system_instruction, prompt))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def get_stale(self, route, language, system_instruction, prompt):
+        """The last answer stored for this prompt, even if it has expired."""
+        if not self.enabled(route):
+            return None
+        return self.backend.get(make_key(route, language, system_instruction, prompt), stale=True)
+
+    def set(self, route, language, system_instruction, prompt, value):
+        if self.enabled(route) and value:
+            self.backend.set(make_key(route, language, system_instruction, prompt), value, self.ttls[route])
+
+
+def create_cache(backend='memory', path=None, max_entries=2048, ttls=None):
+    if backend == 'sqlite':
+        return ResponseCache(SQLiteBackend(path or os.path.join('cache', 'responses.sqlite3'), max_entries), ttls)
+    if backend == 'memory':
+        return ResponseCache(MemoryBackend(max_entries), ttls)
+    raise ValueError(f"Unknown response cache backend: {backend}")
+
+
+class FormCache:
+    """On-disk cache for uploaded form analysis, keyed by content hash.
+
+    Extracted text is stored per document (SHA-256 of the uploaded bytes) and
+    guidance per (document, language, system instruction). Reads refresh a
+    file's mtime; once the directory grows past max_bytes the least recently
+    used files are deleted.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    @staticmethod
+    def digest(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def get_text(self, digest):
+        return self._read(f"{digest}.text")
+
+    def set_text(self, digest, text):
+        self._write(f"{digest}.text", text)
+
+    def get_guidance(self, digest, language, system_instruction):
+        return self._read(self._guidance_name(digest, language, system_instruction))
+
+    def set_guidance(self, digest, language, system_instruction, guidance):
+        self._write(self._guidance_name(digest, language, system_instruction), guidance)
+
+    def _guidance_name(self, digest, language, system_instruction):
+        variant = hashlib.sha256(f"{language}|{system_instruction or ''}".encode('utf-8')).hexdigest()[:16]
+        return f"{digest}.{variant}.guidance"
+
+    def _read(self, name):
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, encoding='utf-8') as f:
+                value = f.read()
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+
+    def _write(self, name, value):
+        path = os.path.join(self.directory, name)
+        data = value.encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            try:
+                previous = os.path.getsize(path)
+            except FileNotFoundError:
+                previous = 0
+            os.replace(tmp, path)
+            self._size += len(data) - previous
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.endswith('.tmp')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,358 @@
+"""Text extraction for uploaded forms.
+
+PDFs are read straight from the uploaded bytes (nothing is written to disk).
+A small one-page PDF is read in the request thread, since handing it to a
+worker costs more than reading it. Anything else goes to a process pool, so a
+hostile document cannot hold a request thread: the first few pages are read
+together with the page count, and the rest are split into contiguous page
+ranges, at least first_pages long, that are extracted in parallel. Each range
+has a deadline of page_timeout seconds per page. Pages past max_pages are
+ignored and the joined text is cut at max_chars.
+
+Photos of forms are read by Tesseract OCR (through pytesseract and Pillow,
+both optional) on a process pool of their own. Camera images are decoded at
+reduced size, converted to grayscale, contrast-stretched and deskewed before
+recognition, and each image has a deadline of image_timeout seconds. Tesseract
+is given a little less, so it is killed before the deadline.
+
+A task still running at its deadline is abandoned with WorkerPool.abandon,
+which ends only the worker stuck on it: the pool is retired, later tasks go
+to a fresh one, and the old one is terminated once the other tasks running on
+it have finished.
+
+PyPDF2, Pillow and pytesseract are imported on first use rather than when
+the app starts, which keeps worker startup fast.
+"""
+import importlib.util
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _page_text(page):
+    try:
+        return page.extract_text() or ''
+    except Exception as e:
+        logger.warning(f"Skipping unreadable PDF page: {e}")
+        return ''
+
+
+def _extract_range(data, start, stop):
+    # Runs in a pool worker, which parses its own copy of the document;
+    # returns the page count too, for the first range
+    import PyPDF2
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    page_count = len(reader.pages)
+    return page_count, [_page_text(reader.pages[i]) for i in range(start, min(stop, page_count))]
+
+
+def terminate_pool(pool):
+    """Shuts a process pool down without waiting, ending any task still running in it."""
+    # shutdown() cancels queued tasks but leaves running ones to finish
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+class WorkerPool:
+    """A spawn-based process pool whose stuck tasks can be abandoned without failing the others."""
+
+    def __init__(self, workers, initializer=None):
+        self.workers = workers
+        self.initializer = initializer
+        self._pool = None
+        # Unfinished tasks of every live pool, and those given up on
+        self._tasks = {}
+        self._abandoned = {}
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            broken = None
+            try:
+                future = self._submit(fn, args)
+            except BrokenProcessPool:
+                # A worker died while the pool was idle
+                broken = self._pool
+                self._retire(broken)
+                future = self._submit(fn, args)
+        if broken is not None:
+            self._reap(broken)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _submit(self, fn, args):
+        if self._pool is None:
+            # spawn rather than fork: the server process runs gRPC threads
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=self.initializer)
+            self._tasks[self._pool] = set()
+        pool = self._pool
+        future = pool.submit(fn, *args)
+        self._tasks[pool].add(future)
+        self._owners[future] = pool
+        return future
+
+    def abandon(self, future):
+        """Gives up on a task past its deadline; a running one has its worker ended."""
+        if future.cancel():
+            return
+        with self._lock:
+            pool = self._owners.get(future)
+            if pool is None:
+                return
+            self._abandoned.setdefault(pool, set()).add(future)
+            self._retire(pool)
+        self._reap(pool)
+
+    def shutdown(self):
+        with self._lock:
+            current, self._pool = self._pool, None
+            retired = [pool for pool in self._tasks if pool is not current]
+            self._tasks.clear()
+            self._abandoned.clear()
+            self._owners.clear()
+        for pool in retired:
+            terminate_pool(pool)
+        if current is not None:
+            current.shutdown(cancel_futures=True)
+
+    def _retire(self, pool):
+        if self._pool is pool:
+            self._pool = None
+
+    def _finished(self, future):
+        with self._lock:
+            pool = self._owners.pop(future, None)
+            if pool not in self._tasks:
+                # Its pool has already been ended
+                return
+            self._tasks[pool].discard(future)
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                # A worker died (e.g. out of memory); the pool takes no more tasks
+                self._retire(pool)
+        self._reap(pool)
+
+    def _reap(self, pool):
+        # Ends a retired pool once nothing but abandoned tasks runs on it
+        with self._lock:
+            if pool is self._pool or pool not in self._tasks:
+                return
+            if self._tasks[pool] - self._abandoned.get(pool, set()):
+                return
+            del self._tasks[pool]
+            self._abandoned.pop(pool, None)
+        terminate_pool(pool)
+
+
+def join_pages(pages, max_chars):
+    parts = []
+    size = 0
+    for text in pages:
+        if not text:
+            continue
+        if size + len(text) >= max_chars:
+            parts.append(text[:max_chars - size])
+            break
+        parts.append(text)
+        size += len(text) + 1
+    return '\n'.join(parts)
+
+
+class PdfExtractor:
+    def __init__(self, workers=None, page_timeout=5.0, max_pages=50, max_chars=50000, first_pages=4,
+                 inline_bytes=256 * 1024):
+        self.workers = workers or os.cpu_count() or 1
+        self.page_timeout = page_timeout
+        self.max_pages = max_pages
+        self.max_chars = max_chars
+        self.first_pages = first_pages
+        self.inline_bytes = inline_bytes
+        self._pool = WorkerPool(self.workers)
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+    def extract(self, data):
+        """Text of the PDF in data; raises TimeoutError if its first pages cannot be read in time."""
+        if len(data) <= self.inline_bytes:
+            import PyPDF2
+            reader = PyPDF2.PdfReader(io.BytesIO(data))
+            if len(reader.pages) == 1:
+                return join_pages([_page_text(reader.pages[0])], self.max_chars)
+        head = min(self.first_pages, self.max_pages)
+        [result] = self._extract_ranges(data, [(0, head)])
+        if result is None:
+            raise TimeoutError("Timed out reading the PDF")
+        page_count, pages = result
+        if page_count > self.max_pages:
+            logger.warning(f"PDF has {page_count} pages; extracting the first {self.max_pages}")
+            page_count = self.max_pages
+        if page_count > head:
+            # Every range parses the whole document again, so none is shorter than the first
+            size = max(-(-(page_count - head) // self.workers), self.first_pages)
+            ranges = [(start, min(start + size, page_count)) for start in range(head, page_count, size)]
+            for (start, stop), result in zip(ranges, self._extract_ranges(data, ranges)):
+                pages.extend(result[1] if result is not None else [''] * (stop - start))
+        return join_pages(pages, self.max_chars)
+
+    def _extract_ranges(self, data, ranges):
+        # (page count, page texts) for each range, or None for one that timed out
+        started = time.monotonic()
+        futures = [self._pool.submit(_extract_range, data, start, stop) for start, stop in ranges]
+        results = []
+        for future, (start, stop) in zip(futures, ranges):
+            remaining = started + self.page_timeout * (stop - start) - time.monotonic()
+            try:
+                results.append(future.result(timeout=max(remaining, 0)))
+            except TimeoutError:
+                logger.warning(f"Timed out extracting PDF pages {start + 1}-{stop}")
+                self._pool.abandon(future)
+                results.append(None)
+        return results
+
+
+# Tesseract language packs for each app language; English is always added
+# because forms mix it with the local script
+OCR_LANGUAGES = {'en-US': 'eng', 'hi-IN': 'hin', 'kn-IN': 'kan', 'ta-IN': 'tam', 'te-IN': 'tel'}
+
+# Skew angles tried when deskewing, in degrees: a coarse sweep, then a finer
+# one around the best coarse angle
+MAX_SKEW = 10
+COARSE_STEP = 1.0
+FINE_STEP = 0.2
+# How much darker than the local background a pixel must be to count as ink
+INK_CONTRAST = 24
+# Share of an image's deadline kept back from Tesseract's own timeout
+TESSERACT_MARGIN = 0.1
+
+_installed_languages = None
+
+
+def ocr_languages(language):
+    """The Tesseract language string for an app language, e.g. 'hin+eng'."""
+    code = OCR_LANGUAGES.get(language, 'eng')
+    return code if code == 'eng' else f"{code}+eng"
+
+
+def _projection_score(ink, angle):
+    # Text lines aligned with the rows give row sums with sharp edges
+    from PIL import Image
+    rows = np.asarray(ink.rotate(angle, resample=Image.NEAREST, fillcolor=0), dtype=np.float64).sum(axis=1)
+    return float(np.sum(np.diff(rows) ** 2))
+
+
+def skew_angle(image, max_skew=MAX_SKEW, sample_side=800):
+    """Angle in degrees that rotates the text in a grayscale image level."""
+    from PIL import Image, ImageFilter
+    sample = image.copy()
+    sample.thumbnail((sample_side, sample_side))
+    # Ink is what is darker than its surroundings, so uneven light across a
+    # photo does not count as ink
+    background = np.asarray(sample.filter(ImageFilter.BoxBlur(sample_side // 80)), dtype=np.int16)
+    ink = Image.fromarray(((np.asarray(sample, dtype=np.int16) < background - INK_CONTRAST) * 255).astype(np.uint8))
+    coarse = max(np.arange(-max_skew, max_skew + COARSE_STEP, COARSE_STEP),
+                 key=lambda angle: _projection_score(ink, angle))
+    fine = np.arange(coarse - COARSE_STEP + FINE_STEP, coarse + COARSE_STEP, FINE_STEP)
+    return float(max(fine, key=lambda angle: _projection_score(ink, angle)))
+
+
+def load_image(data, max_side=2000):
+    """Decodes a photo into a grayscale, contrast-stretched image at most max_side pixels across."""
+    from PIL import Image, ImageOps
+    image = Image.open(io.BytesIO(data))
+    # JPEGs decode straight to a reduced size, much faster than a full-size decode
+    scale = max_side / max(image.size)
+    if scale < 1:
+        image.draft('L', (int(image.width * scale), int(image.height * scale)))
+    image = ImageOps.exif_transpose(image).convert('L')
+    image.thumbnail((max_side, max_side), Image.BILINEAR)
+    return ImageOps.autocontrast(image, cutoff=1)
+
+
+def deskew(image):
+    from PIL import Image
+    angle = skew_angle(image)
+    if abs(angle) < FINE_STEP:
+        return image
+    return image.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+
+
+def prepare_image(data, max_side=2000):
+    """A photo of a form, ready for OCR: downscaled, grayscale and level."""
+    return deskew(load_image(data, max_side))
+
+
+def _init_ocr_worker():
+    # One process per image already; Tesseract's own threads would only compete
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+
+def _recognize(data, languages, max_side, deadline):
+    # Runs in a pool worker. deadline is a time.time() by which Tesseract
+    # must be done, ahead of the caller's own, so it is killed in time
+    global _installed_languages
+    import pytesseract
+    if _installed_languages is None:
+        _installed_languages = set(pytesseract.get_languages(config=''))
+    available = '+'.join(code for code in languages.split('+') if code in _installed_languages) or 'eng'
+    if available != languages:
+        logger.warning(f"Tesseract language data missing for {languages}; using {available}")
+    image = prepare_image(data, max_side)
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise TimeoutError("No time left to run Tesseract")
+    try:
+        return pytesseract.image_to_string(image, lang=available, timeout=remaining)
+    except RuntimeError as e:
+        if str(e) == 'Tesseract process timeout':
+            raise TimeoutError(str(e)) from None
+        raise
+
+
+class ImageOcr:
+    def __init__(self, workers=None, image_timeout=20.0, max_side=2000, max_chars=50000):
+        self.workers = workers or os.cpu_count() or 1
+        self.image_timeout = image_timeout
+        self.max_side = max_side
+        self.max_chars = max_chars
+        self._pool = WorkerPool(self.workers, initializer=_init_ocr_worker)
+
+    @property
+    def available(self):
+        return (importlib.util.find_spec('pytesseract') is not None and importlib.util.find_spec('PIL') is not None
+                and shutil.which('tesseract') is not None)
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+    def extract(self, data, languages='eng'):
+        """Text read from a photo or scan of a form; raises TimeoutError past image_timeout."""
+        started = time.monotonic()
+        # The deadline covers the wait for a free worker and the
+        # preprocessing. Tesseract must finish a little earlier, so it is
+        # killed by its own timeout and the worker is free again
+        deadline = time.time() + self.image_timeout - max(TESSERACT_MARGIN * self.image_timeout, 0.5)
+        future = self._pool.submit(_recognize, data, languages, self.max_side, deadline)
+        try:
+            text = future.result(timeout=self.image_timeout)
+        except TimeoutError:
+            # Tesseract's own timeout leaves the worker free; otherwise the
+            # task is dropped, and its worker ended if it had started
+            if not future.done():
+                self._pool.abandon(future)
+            logger.warning(f"Timed out reading image after {time.monotonic() - started:.1f}s")
+            raise
+        return join_pages(text.splitlines(), self.max_chars)
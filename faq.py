@@ -0,0 +1,311 @@
+"""Near-duplicate question index for answering paraphrased FAQs locally.
+
+Most questions to the chat and guide routes are rewordings of a few dozen
+common ones ("how do I check my balance", "balance check kaise kare"). The
+exact-match response cache misses these; FaqIndex finds the most similar
+question answered before, per feature and language, and returns its answer
+when the cosine similarity reaches the threshold and both questions contain
+the same numbers.
+
+Questions are vectors of character trigram TF-IDF weights. Each shard keeps
+an inverted index (trigram -> entry ids and log term frequencies) in growable
+numpy arrays, so a lookup only touches entries sharing a trigram with the
+question. IDF is applied at lookup time; entry norms, which depend on it,
+are recomputed as a shard grows. Trigrams found in more than max_df of a large
+shard's entries carry almost no weight and are skipped entirely, which keeps
+lookups well under a millisecond at 100k entries.
+
+Entries can be persisted to SQLite and are reloaded at startup. Old entries
+are evicted first in, first out, and after max_age seconds.
+"""
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+NGRAM = 3
+# Below this many entries every trigram is scored, however common, and entry
+# norms are recomputed on every insert
+MIN_STOP_DF = 1000
+# Past that, norms are recomputed once a shard has grown by this factor
+REWEIGHT_GROWTH = 1.25
+
+_whitespace = re.compile(r'\s+')
+_ascii_separators = re.compile(r'[^a-z0-9]+')
+_number = re.compile(r'\d+(?:[.,]\d+)*')
+
+
+def normalize(text):
+    text = text.casefold()
+    if text.isascii():
+        return _ascii_separators.sub(' ', text).strip()
+    # Punctuation and symbols become spaces; letters, digits and the vowel
+    # signs of Indic scripts are kept
+    text = ''.join(' ' if unicodedata.category(c)[0] in 'PSZC' else c for c in text)
+    return _whitespace.sub(' ', text).strip()
+
+
+def numbers(text):
+    """The numbers in text, sorted, in ASCII digits and without digit grouping ("3,00,000" is "300000")."""
+    found = []
+    for number in _number.findall(text):
+        digits = ''.join(str(unicodedata.digit(c)) if c.isdigit() else c for c in number.replace(',', ''))
+        found.append(digits.lstrip('0') or '0')
+    return sorted(found)
+
+
+def ngrams(text):
+    padded = f" {normalize(text)} "
+    return Counter(padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1))
+
+
+class _Postings:
+    __slots__ = ('ids', 'tf', 'size')
+
+    def __init__(self):
+        self.ids = np.empty(4, dtype=np.int32)
+        self.tf = np.empty(4, dtype=np.float32)
+        self.size = 0
+
+    def append(self, entry, tf):
+        if self.size == len(self.ids):
+            self.ids = np.resize(self.ids, self.size * 2)
+            self.tf = np.resize(self.tf, self.size * 2)
+        self.ids[self.size] = entry
+        self.tf[self.size] = tf
+        self.size += 1
+
+
+class _Shard:
+    """Index for one generation of a (feature, language)."""
+
+    def __init__(self, max_df, key=None, started=0.0):
+        self.max_df = max_df
+        self.key = key
+        self.started = started
+        # rowid of the newest entry persisted to SQLite
+        self.last_row = None
+        self.questions = []
+        self.answers = []
+        self._vocab = {}
+        self._df = []
+        self._postings = []
+        self._entry_terms = []
+        self._norms = np.empty(64, dtype=np.float32)
+        self._weighted_at = 0
+
+    def __len__(self):
+        return len(self.answers)
+
+    def _idf(self, df, n):
+        return math.log((1 + n) / (1 + df)) + 1
+
+    def _stop_df(self, n):
+        return max(self.max_df * n, MIN_STOP_DF)
+
+    def add(self, question, answer):
+        counts = ngrams(question)
+        if not counts:
+            return
+        entry = len(self.answers)
+        self.questions.append(question)
+        self.answers.append(answer)
+        terms = []
+        for gram, count in counts.items():
+            term = self._vocab.get(gram)
+            if term is None:
+                term = self._vocab[gram] = len(self._df)
+                self._df.append(0)
+                self._postings.append(_Postings())
+            self._df[term] += 1
+            tf = 1 + math.log(count)
+            self._postings[term].append(entry, tf)
+            terms.append((term, tf))
+        self._entry_terms.append((np.array([term for term, _ in terms], dtype=np.int32),
+                                  np.array([tf for _, tf in terms], dtype=np.float32)))
+
+        if entry == len(self._norms):
+            self._norms = np.resize(self._norms, entry * 2)
+        n = entry + 1
+        if n < MIN_STOP_DF or n >= self._weighted_at * REWEIGHT_GROWTH:
+            self._reweight()
+        else:
+            stop = self._stop_df(n)
+            self._norms[entry] = math.sqrt(sum((tf * self._idf(self._df[term], n)) ** 2
+                                               for term, tf in terms if self._df[term] <= stop)) or 1.0
+
+    def _reweight(self):
+        # IDF drifts as entries are added; renormalize every entry with the
+        # current document frequencies
+        n = len(self.answers)
+        df = np.asarray(self._df, dtype=np.float64)
+        idf = np.log((1 + n) / (1 + df)) + 1
+        idf[df > self._stop_df(n)] = 0
+        terms = np.concatenate([terms for terms, _ in self._entry_terms])
+        weights = np.concatenate([tf for _, tf in self._entry_terms]) * idf[terms]
+        entries = np.repeat(np.arange(n), [len(terms) for terms, _ in self._entry_terms])
+        norms = np.sqrt(np.bincount(entries, weights * weights, minlength=n))
+        norms[norms == 0] = 1.0
+        self._norms[:n] = norms
+        self._weighted_at = n
+
+    def search(self, question):
+        """(similarity, entry) of the closest stored question, or (0.0, None)."""
+        n = len(self.answers)
+        counts = ngrams(question)
+        if not n or not counts:
+            return 0.0, None
+        stop = self._stop_df(n)
+        ids, contributions = [], []
+        query_norm = 0.0
+        for gram, count in counts.items():
+            term = self._vocab.get(gram)
+            df = 0 if term is None else self._df[term]
+            if df > stop:
+                continue
+            weight = (1 + math.log(count)) * self._idf(df, n)
+            query_norm += weight * weight
+            if term is not None:
+                postings = self._postings[term]
+                ids.append(postings.ids[:postings.size])
+                contributions.append(postings.tf[:postings.size] * (weight * self._idf(df, n)))
+        if not ids:
+            return 0.0, None
+        ids = np.concatenate(ids)
+        scores = np.bincount(ids, np.concatenate(contributions))
+        scores /= self._norms[:len(scores)]
+        best = int(scores.argmax())
+        # Norms lag the current IDF slightly, so clamp to a proper cosine
+        return min(float(scores[best]) / math.sqrt(query_norm), 1.0), best
+
+
+class FaqIndex:
+    """Earlier questions and their answers, per feature and language.
+
+    Each feature and language keeps two generations of entries. New entries
+    go into the current one. Once it holds max_entries / 2 entries, or is
+    max_age / 2 seconds old, the previous generation is dropped and the
+    current one takes its place. Entries are evicted first in, first out,
+    and none is served more than max_age seconds after it was stored.
+    """
+
+    def __init__(self, threshold=0.85, max_entries=100000, max_df=0.05, path=None, max_age=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_df = max_df
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        # (feature, language) -> [current, previous] generations, either may be None
+        self._shards = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS faq_entries ('
+                'feature TEXT NOT NULL, language TEXT NOT NULL, question TEXT NOT NULL, answer TEXT NOT NULL, '
+                'created REAL NOT NULL DEFAULT 0)'
+            )
+            if 'created' not in {row[1] for row in self._db.execute('PRAGMA table_info(faq_entries)')}:
+                self._db.execute('ALTER TABLE faq_entries ADD COLUMN created REAL NOT NULL DEFAULT 0')
+            rows = self._db.execute(
+                'SELECT rowid, feature, language, question, answer, created FROM faq_entries ORDER BY rowid').fetchall()
+            for row, feature, language, question, answer, created in rows:
+                self._store((feature, language), question, answer, created, row)
+            now = time.time()
+            for generations in self._shards.values():
+                self._expire(generations, now)
+            self._db.commit()
+
+    def _forget(self, shard):
+        if self._db is not None and shard.last_row is not None:
+            self._db.execute('DELETE FROM faq_entries WHERE feature = ? AND language = ? AND rowid <= ?',
+                             (*shard.key, shard.last_row))
+
+    def _retire(self, generations):
+        current, previous = generations
+        if previous is not None:
+            self._forget(previous)
+        generations[:] = [None, current]
+
+    def _expire(self, generations, now):
+        # With the lock held; True if entries were dropped
+        if not self.max_age:
+            return False
+        current, previous = generations
+        dropped = False
+        if current is not None and now - current.started >= self.max_age / 2:
+            dropped = previous is not None
+            self._retire(generations)
+        previous = generations[1]
+        if previous is not None and now - previous.started >= self.max_age:
+            self._forget(previous)
+            generations[1] = None
+            dropped = True
+        return dropped
+
+    def _store(self, key, question, answer, now, row=None):
+        generations = self._shards.setdefault(key, [None, None])
+        self._expire(generations, now)
+        if generations[0] is not None and len(generations[0]) >= max(self.max_entries // 2, 1):
+            self._retire(generations)
+        if generations[0] is None:
+            generations[0] = _Shard(self.max_df, key, now)
+        generations[0].add(question, answer)
+        generations[0].last_row = row
+
+    def search(self, feature, language, question):
+        """(similarity, stored question, answer) of the closest match, or None."""
+        with self._lock:
+            generations = self._shards.get((feature, language))
+            if generations is None:
+                return None
+            if self._expire(generations, time.time()) and self._db is not None:
+                self._db.commit()
+            best = None
+            for shard in filter(None, generations):
+                similarity, entry = shard.search(question)
+                if entry is not None and (best is None or similarity > best[0]):
+                    best = similarity, shard.questions[entry], shard.answers[entry]
+            return best
+
+    def lookup(self, feature, language, question):
+        """The stored answer to a near-duplicate of question, or None."""
+        match = self.search(feature, language, question)
+        # Questions that differ only in an amount ("I earn 3000 a month" and
+        # "I earn 30000 a month") look alike as trigrams but need other answers
+        found = match is not None and match[0] >= self.threshold and numbers(match[1]) == numbers(question)
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return match[2] if found else None
+
+    def add(self, feature, language, question, answer):
+        if not question or not answer:
+            return
+        now = time.time()
+        with self._lock:
+            row = None
+            if self._db is not None:
+                row = self._db.execute(
+                    'INSERT INTO faq_entries (feature, language, question, answer, created) VALUES (?, ?, ?, ?, ?)',
+                    (feature, language, question, answer, now)).lastrowid
+            self._store((feature, language), question, answer, now, row)
+            if self._db is not None:
+                self._db.commit()
+
+    def __len__(self):
+        return sum(len(shard) for generations in self._shards.values() for shard in filter(None, generations))
@@ -0,0 +1,311 @@
+"""Background jobs for work too slow to hold an HTTP request open.
+
+A job is submitted with its parameters and, optionally, an uploaded file,
+which is spooled to disk; the request returns at once with the job's id and
+a pool of worker threads runs it. Clients poll the job's status or stream it.
+
+Jobs that fail are retried with exponential backoff up to max_attempts, then
+marked failed. A worker claims a job for a lease; if its process dies, the
+job is claimed again once the lease runs out. Jobs only expire once they
+have finished, however long they queue or run; they are then kept for ttl
+seconds and deleted. A job's spooled file is removed as soon as the job
+succeeds or finally fails, and any spooled file left without a job (after a
+crash, say) is removed by the periodic sweep.
+
+Two stores are provided: an in-memory one, and an SQLite one whose queue
+survives restarts and can be shared by several server processes. The SQLite
+store claims jobs with UPDATE ... RETURNING, which needs SQLite 3.35 or newer.
+"""
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+FINISHED = (DONE, FAILED)
+SPOOL_PREFIX = 'job-'
+
+
+class MemoryJobStore:
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        with self._lock:
+            self._jobs[job['id']] = dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else dict(job)
+
+    def claim(self, now, lease):
+        with self._lock:
+            ready = [job for job in self._jobs.values()
+                     if job['status'] in (QUEUED, RUNNING) and job['run_after'] <= now]
+            if not ready:
+                return None
+            job = min(ready, key=lambda job: job['created'])
+            job.update(status=RUNNING, attempts=job['attempts'] + 1, updated=now, run_after=now + lease)
+            return dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def purge(self, now):
+        """Delete finished jobs past their expiry; returns their spooled files."""
+        with self._lock:
+            expired = [job for job in self._jobs.values() if job['status'] in FINISHED and job['expires'] <= now]
+            for job in expired:
+                del self._jobs[job['id']]
+        return [job['path'] for job in expired if job['path']]
+
+    def __len__(self):
+        return len(self._jobs)
+
+
+class SQLiteJobStore:
+    _COLUMNS = ('id', 'kind', 'status', 'attempts', 'params', 'path', 'result', 'error',
+                'created', 'updated', 'run_after', 'expires')
+
+    def __init__(self, path):
+        if sqlite3.sqlite_version_info < (3, 35):
+            raise RuntimeError(f"The SQLite job store needs SQLite 3.35 or newer (for UPDATE ... RETURNING), "
+                               f"not {sqlite3.sqlite_version}")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL, '
+            'params TEXT NOT NULL, path TEXT, result TEXT, error TEXT, '
+            'created REAL NOT NULL, updated REAL NOT NULL, run_after REAL NOT NULL, expires REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after)')
+        self._db.commit()
+
+    def _row(self, row):
+        if row is None:
+            return None
+        job = dict(zip(self._COLUMNS, row))
+        job['params'] = json.loads(job['params'])
+        job['result'] = None if job['result'] is None else json.loads(job['result'])
+        return job
+
+    def add(self, job):
+        row = dict(job, params=json.dumps(job['params']),
+                   result=None if job['result'] is None else json.dumps(job['result']))
+        with self._lock:
+            self._db.execute(f"INSERT INTO jobs ({', '.join(self._COLUMNS)}) VALUES ({', '.join('?' * len(self._COLUMNS))})",
+                             [row[column] for column in self._COLUMNS])
+            self._db.commit()
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row)
+
+    def claim(self, now, lease):
+        # One statement, so two processes sharing the file never claim the same job
+        with self._lock:
+            row = self._db.execute(
+                f"UPDATE jobs SET status = ?, attempts = attempts + 1, updated = ?, run_after = ? "
+                f"WHERE id = (SELECT id FROM jobs WHERE status IN (?, ?) AND run_after <= ? ORDER BY created LIMIT 1) "
+                f"RETURNING {', '.join(self._COLUMNS)}",
+                (RUNNING, now, now + lease, QUEUED, RUNNING, now)
+            ).fetchone()
+            self._db.commit()
+        return self._row(row)
+
+    def update(self, job_id, **fields):
+        if 'result' in fields and fields['result'] is not None:
+            fields['result'] = json.dumps(fields['result'])
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+                             [*fields.values(), job_id])
+            self._db.commit()
+
+    def purge(self, now):
+        finished = 'status IN (?, ?) AND expires <= ?'
+        with self._lock:
+            paths = [path for (path,) in self._db.execute(f'SELECT path FROM jobs WHERE {finished}', (*FINISHED, now))
+                     if path]
+            self._db.execute(f'DELETE FROM jobs WHERE {finished}', (*FINISHED, now))
+            self._db.commit()
+        return paths
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+
+def create_job_store(backend='memory', path=None):
+    if backend == 'sqlite':
+        return SQLiteJobStore(path or os.path.join('cache', 'jobs.sqlite3'))
+    if backend == 'memory':
+        return MemoryJobStore()
+    raise ValueError(f"Unknown job store backend: {backend}")
+
+
+class JobQueue:
+    """Runs submitted jobs on worker threads.
+
+    handlers maps a job kind to handler(params, data), where data is the
+    spooled file's bytes (or None); its return value, which must be JSON
+    serializable, is the job's result. Exceptions matching retry_on (a tuple
+    of exception types, or a function of the exception) are retried; any
+    other fails the job at once.
+    """
+
+    def __init__(self, store, handlers, spool_dir, workers=2, max_attempts=3, retry_backoff=2.0, ttl=3600,
+                 lease=300, retry_on=(Exception,), poll_interval=0.5, sweep_interval=60):
+        self.store = store
+        self.handlers = handlers
+        self.spool_dir = spool_dir
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.ttl = ttl
+        self.lease = lease
+        self.retry_on = retry_on
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self._wake = threading.Condition()
+        self._stopping = False
+        self._swept_at = 0.0
+        self._sweep_lock = threading.Lock()
+        os.makedirs(spool_dir, exist_ok=True)
+        self._threads = [threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True) for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, kind, params, data=None, suffix=''):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        path = None
+        if data is not None:
+            path = os.path.join(self.spool_dir, f"{SPOOL_PREFIX}{job_id}{suffix}")
+            with open(path, 'wb') as f:
+                f.write(data)
+        now = time.time()
+        self.store.add({'id': job_id, 'kind': kind, 'status': QUEUED, 'attempts': 0, 'params': params, 'path': path,
+                        'result': None, 'error': None, 'created': now, 'updated': now, 'run_after': now,
+                        # Set when the job finishes
+                        'expires': math.inf})
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def status(self, job_id):
+        """The client's view of a job, or None if there is no such job (or it expired)."""
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        status = {'job_id': job['id'], 'status': job['status'], 'attempts': job['attempts']}
+        if job['status'] == DONE:
+            status['result'] = job['result']
+        elif job['error']:
+            status['error'] = job['error']
+        return status
+
+    def stop(self, timeout=None):
+        self._stopping = True
+        with self._wake:
+            self._wake.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self):
+        while not self._stopping:
+            try:
+                self._maybe_sweep()
+                job = self.store.claim(time.time(), self.lease)
+                if job is not None:
+                    self._run(job)
+                    continue
+            except Exception:
+                # A locked database or a failed update must not end the
+                # worker; a job it held is claimed again after its lease
+                logger.exception("Job worker error")
+            with self._wake:
+                self._wake.wait(self.poll_interval)
+
+    def _fail(self, job, error):
+        logger.error(f"Job {job['id']} failed after {job['attempts']} attempt(s): {error}")
+        now = time.time()
+        self.store.update(job['id'], status=FAILED, error=error, updated=now, expires=now + self.ttl)
+        self._remove(job['path'])
+
+    def _run(self, job):
+        # Claims past max_attempts come from workers that died mid-job
+        if job['attempts'] > self.max_attempts:
+            self._fail(job, job['error'] or 'Worker stopped while running the job')
+            return
+        data = None
+        if job['path']:
+            try:
+                with open(job['path'], 'rb') as f:
+                    data = f.read()
+            except OSError as e:
+                self._fail(job, f"Uploaded file is no longer available: {e}")
+                return
+        try:
+            result = self.handlers[job['kind']](job['params'], data)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            retry = isinstance(e, self.retry_on) if isinstance(self.retry_on, tuple) else self.retry_on(e)
+            if not retry or job['attempts'] >= self.max_attempts:
+                self._fail(job, error)
+                return
+            delay = self.retry_backoff * 2 ** (job['attempts'] - 1)
+            logger.warning(f"Job {job['id']} failed (attempt {job['attempts']}), retrying in {delay:g}s: {error}")
+            now = time.time()
+            self.store.update(job['id'], status=QUEUED, error=error, updated=now, run_after=now + delay)
+            return
+        now = time.time()
+        self.store.update(job['id'], status=DONE, result=result, error=None, updated=now, expires=now + self.ttl)
+        self._remove(job['path'])
+
+    def _remove(self, path):
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove spooled file {path}: {e}")
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if now - self._swept_at < self.sweep_interval or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._swept_at = now
+            for path in self.store.purge(now):
+                self._remove(path)
+            # Files a crashed process left behind; fresh ones may belong to a
+            # job that is still being added
+            for name in os.listdir(self.spool_dir):
+                path = os.path.join(self.spool_dir, name)
+                job_id = name[len(SPOOL_PREFIX):].split('.')[0]
+                try:
+                    stale = name.startswith(SPOOL_PREFIX) and os.path.getmtime(path) < now - self.sweep_interval
+                except FileNotFoundError:
+                    # Removed by its job's worker since the listing
+                    continue
+                if stale and self.store.get(job_id) is None:
+                    self._remove(path)
+        finally:
+            self._sweep_lock.release()
@@ -0,0 +1,446 @@
+"""Local knowledge base of government schemes and bank branches.
+
+Schemes are national (apply everywhere) or tied to a state or district;
+branches are tied to a village or town. Both are looked up by the user's
+state and village, and village names arrive misspelled, transliterated or
+with words like "village" or "taluk" around them, so villages are matched
+in two steps: the state's villages sharing the most character trigrams with
+the query (by Dice coefficient) are the candidates, and the one closest by
+edit similarity wins if it is close enough.
+
+A national village directory runs to about 600k names, so villages live in
+flat numpy arrays sorted by state (names as one UTF-8 blob with offsets)
+and the trigram index is a CSR layout: sorted (trigram, state) keys, each
+with a slice of village ids. Finding the candidates is one binary search
+per query trigram and a bincount over the state's slice.
+
+Sources are CSV (villages, branches) and JSON (schemes) files with flexible
+column names, so the LGD village directory and the RBI IFSC list can be
+used as exported. Building the index from the CSV takes seconds; the build
+command writes it to a pack file that loads in a fraction of that:
+
+    python knowledge.py build --villages villages.csv --branches branches.csv --out cache/knowledge.npz
+    python knowledge.py lookup "Uttar Pradesh" "Rampur Kalan" [--district Sitapur]
+"""
+import argparse
+import csv
+import difflib
+import json
+import os
+import sys
+import time
+from array import array
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+from faq import NGRAM, normalize
+
+PACK_VERSION = 2
+# Villages sharing enough trigrams with the query to be compared with it,
+# at most CANDIDATES of them
+CANDIDATE_DICE = 0.3
+CANDIDATES = 20
+# Edit similarity a candidate must reach to count as the village asked about
+MATCH_THRESHOLD = 0.75
+
+STATES = (
+    'Andaman and Nicobar Islands', 'Andhra Pradesh', 'Arunachal Pradesh', 'Assam', 'Bihar', 'Chandigarh',
+    'Chhattisgarh', 'Dadra and Nagar Haveli and Daman and Diu', 'Delhi', 'Goa', 'Gujarat', 'Haryana',
+    'Himachal Pradesh', 'Jammu and Kashmir', 'Jharkhand', 'Karnataka', 'Kerala', 'Ladakh', 'Lakshadweep',
+    'Madhya Pradesh', 'Maharashtra', 'Manipur', 'Meghalaya', 'Mizoram', 'Nagaland', 'Odisha', 'Puducherry',
+    'Punjab', 'Rajasthan', 'Sikkim', 'Tamil Nadu', 'Telangana', 'Tripura', 'Uttar Pradesh', 'Uttarakhand',
+    'West Bengal',
+)
+# Index keys are trigram * KEY_STATES + state
+KEY_STATES = 64
+
+_STATE_ALIASES = {
+    'andaman and nicobar': 'Andaman and Nicobar Islands', 'andaman': 'Andaman and Nicobar Islands',
+    'ap': 'Andhra Pradesh', 'chattisgarh': 'Chhattisgarh', 'cg': 'Chhattisgarh',
+    'dadra and nagar haveli': 'Dadra and Nagar Haveli and Daman and Diu',
+    'daman and diu': 'Dadra and Nagar Haveli and Daman and Diu', 'nct of delhi': 'Delhi', 'new delhi': 'Delhi',
+    'hp': 'Himachal Pradesh', 'j&k': 'Jammu and Kashmir', 'jammu & kashmir': 'Jammu and Kashmir',
+    'jk': 'Jammu and Kashmir', 'mp': 'Madhya Pradesh', 'orissa': 'Odisha', 'pondicherry': 'Puducherry',
+    'tn': 'Tamil Nadu', 'up': 'Uttar Pradesh', 'uttaranchal': 'Uttarakhand', 'uk': 'Uttarakhand',
+    'wb': 'West Bengal', 'ts': 'Telangana',
+}
+
+# Words around a place name that say what kind of place it is
+_PLACE_WORDS = frozenset({
+    'village', 'vill', 'vil', 'town', 'city', 'gram', 'grama', 'po', 'post', 'dist', 'district', 'taluk', 'taluka',
+    'tehsil', 'tahsil', 'mandal', 'block', 'ward', 'rural', 'urban',
+})
+
+# Column names accepted for each field, after normalize() (so 'State_Name' is 'state name')
+_COLUMNS = {
+    'state': ('state', 'state name', 'state name in english', 'statename'),
+    'district': ('district', 'district name', 'district name in english', 'districtname', 'city2'),
+    'village': ('village', 'village name', 'village name in english', 'villagename', 'town',
+                'centre', 'center', 'city1', 'city', 'name'),
+    'bank': ('bank', 'bank name', 'bankname'),
+    'branch': ('branch', 'branch name', 'branchname'),
+    'ifsc': ('ifsc', 'ifsc code', 'ifsccode'),
+    'address': ('address', 'branch address'),
+    'phone': ('phone', 'contact', 'phone number', 'std code phone'),
+    'locker': ('locker', 'lockers', 'locker facility', 'safe deposit'),
+}
+
+Scheme = namedtuple('Scheme', ['name', 'category', 'description', 'state', 'district'])
+Branch = namedtuple('Branch', ['bank', 'branch', 'ifsc', 'address', 'phone', 'locker'])
+VillageMatch = namedtuple('VillageMatch', ['village', 'district', 'state', 'score'])
+
+
+def place_key(name):
+    """name normalized for matching, without words like "village" or "taluk"."""
+    words = normalize(name or '').split()
+    return ' '.join(word for word in words if word not in _PLACE_WORDS) or ' '.join(words)
+
+
+_STATE_KEYS = {place_key(state): state for state in STATES}
+_STATE_KEYS.update((place_key(alias), state) for alias, state in _STATE_ALIASES.items())
+
+
+def resolve_state(name):
+    """The canonical name of a state or union territory, or None."""
+    key = place_key(name)
+    if key in _STATE_KEYS:
+        return _STATE_KEYS[key]
+    close = difflib.get_close_matches(key, [known for known in _STATE_KEYS if len(known) > 3], n=1, cutoff=0.8)
+    return _STATE_KEYS[close[0]] if close else None
+
+
+def _gram_set(name):
+    padded = f" {place_key(name)} "
+    return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+
+def _pick(row, field):
+    for column in _COLUMNS[field]:
+        value = row.get(column)
+        if value:
+            return value.strip()
+    return ''
+
+
+def _read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            yield {normalize(key or ''): value for key, value in row.items() if isinstance(value, str)}
+
+
+def read_villages(path):
+    """(state, district, village) rows from a village directory CSV."""
+    for row in _read_csv(path):
+        yield _pick(row, 'state'), _pick(row, 'district'), _pick(row, 'village')
+
+
+def read_branches(path):
+    """(state, district, village, Branch) rows from a branch list CSV."""
+    for row in _read_csv(path):
+        locker = normalize(_pick(row, 'locker'))
+        locker = 'yes' if locker in ('yes', 'y', '1', 'true', 'available') else 'no' if locker in ('no', 'n', '0', 'false') else ''
+        branch = Branch(_pick(row, 'bank'), _pick(row, 'branch'), _pick(row, 'ifsc').upper(), _pick(row, 'address'),
+                        _pick(row, 'phone'), locker)
+        yield _pick(row, 'state'), _pick(row, 'district'), _pick(row, 'village'), branch
+
+
+def read_schemes(path):
+    with open(path, encoding='utf-8') as f:
+        for item in json.load(f):
+            yield Scheme(item['name'], item.get('category', ''), item['description'],
+                         item.get('state'), item.get('district'))
+
+
+class KnowledgeBase:
+    def __init__(self, villages, index, schemes, branches, branch_keys=None):
+        # villages: state-sorted arrays; index: CSR trigram postings;
+        # branch_keys: place_key() of each branch's village, if already known
+        self._names, self._name_offsets, self._village_state, self._village_district, self._district_names = villages
+        self._vocab, self._keys, self._key_offsets, self._postings, self._gram_counts = index
+        self._state_bounds = np.searchsorted(self._village_state, np.arange(len(STATES) + 1))
+        self._districts = {(int(state), place_key(name)): i
+                           for i, (state, name) in enumerate(zip(self._district_state(), self._district_names))}
+        self.schemes = schemes
+        self._scheme_places = [(resolve_state(scheme.state) if scheme.state else None,
+                                place_key(scheme.district) if scheme.district else None) for scheme in schemes]
+        self._branch_rows = branches
+        self._branches_by_village = defaultdict(list)
+        self._branches_by_district = defaultdict(list)
+        self._branch_keys = branch_keys or [place_key(village) for _, _, village, _ in branches]
+        district_keys = {}
+        for (state, district, _, branch), village_key in zip(branches, self._branch_keys):
+            if district not in district_keys:
+                district_keys[district] = place_key(district)
+            self._branches_by_village[(state, district_keys[district], village_key)].append(branch)
+            self._branches_by_district[(state, district_keys[district])].append(branch)
+
+    def _district_state(self):
+        states = np.zeros(len(self._district_names), dtype=np.int64)
+        states[self._village_district] = self._village_state
+        return states
+
+    @classmethod
+    def build(cls, villages=(), schemes=(), branches=()):
+        """Index (state, district, village) rows, Schemes and (state, district, village, Branch) rows."""
+        state_ids = {}
+
+        def state_id(state):
+            if state not in state_ids:
+                resolved = resolve_state(state)
+                state_ids[state] = None if resolved is None else STATES.index(resolved)
+            return state_ids[state]
+
+        branch_rows = [(state_id(state), district, village, branch) for state, district, village, branch in branches
+                       if state_id(state) is not None]
+        # One row per village, however the sources spell or case its name
+        # (the directory's spelling wins); towns with a branch can be found
+        # even if the village list lacks them
+        rows = {}
+        for state, district, village in villages:
+            if state_id(state) is not None and village:
+                rows.setdefault((state_id(state), place_key(district), place_key(village)),
+                                (state_id(state), district, village))
+        for state, district, village, _ in branch_rows:
+            if village:
+                rows.setdefault((state, place_key(district), place_key(village)), (state, district, village))
+        rows = [rows[key] for key in sorted(rows)]
+
+        district_ids = {}
+        district_names = []
+        vocab = {}
+        names = bytearray()
+        name_offsets = array('q', [0])
+        village_state = array('b')
+        village_district = array('i')
+        keys = array('q')
+        ids = array('i')
+        gram_counts = array('h')
+        for village_id, (state, district, village) in enumerate(rows):
+            names += village.encode('utf-8')
+            name_offsets.append(len(names))
+            village_state.append(state)
+            district_id = district_ids.setdefault((state, place_key(district)), len(district_ids))
+            if district_id == len(district_names):
+                district_names.append(district)
+            village_district.append(district_id)
+            grams = _gram_set(village)
+            gram_counts.append(len(grams))
+            for gram in grams:
+                keys.append(vocab.setdefault(gram, len(vocab)) * KEY_STATES + state)
+                ids.append(village_id)
+
+        keys = np.frombuffer(keys, dtype=np.int64) if keys else np.empty(0, dtype=np.int64)
+        ids = np.frombuffer(ids, dtype=np.int32) if ids else np.empty(0, dtype=np.int32)
+        order = np.argsort(keys, kind='stable')
+        keys, ids = keys[order], ids[order]
+        unique, starts = np.unique(keys, return_index=True)
+        villages = (bytes(names), np.frombuffer(name_offsets, dtype=np.int64),
+                    np.frombuffer(village_state, dtype=np.int8) if village_state else np.empty(0, dtype=np.int8),
+                    np.frombuffer(village_district, dtype=np.int32) if village_district else np.empty(0, dtype=np.int32),
+                    district_names)
+        index = (vocab, unique, np.append(starts, len(keys)), ids,
+                 np.frombuffer(gram_counts, dtype=np.int16) if gram_counts else np.empty(0, dtype=np.int16))
+        return cls(villages, index, list(schemes), branch_rows)
+
+    @classmethod
+    def from_files(cls, villages=None, schemes=None, branches=None):
+        return cls.build(read_villages(villages) if villages else (), read_schemes(schemes) if schemes else (),
+                         read_branches(branches) if branches else ())
+
+    @classmethod
+    def load(cls, directory, pack=None):
+        """The pack file if there is one, else the index built from directory's sources."""
+        if pack and os.path.exists(pack):
+            return cls.load_pack(pack)
+
+        def source(name):
+            path = os.path.join(directory, name)
+            return path if os.path.exists(path) else None
+
+        return cls.from_files(source('villages.csv'), source('schemes.json'), source('branches.csv'))
+
+    def save_pack(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        meta = {
+            'version': PACK_VERSION,
+            'districts': self._district_names,
+            'grams': list(self._vocab),
+            'schemes': [list(scheme) for scheme in self.schemes],
+            'branches': [[state, district, village, list(branch)] for state, district, village, branch in self._branch_rows],
+            'branch_keys': self._branch_keys,
+        }
+        with open(path, 'wb') as f:
+            np.savez(f, meta=np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8),
+                     names=np.frombuffer(self._names, dtype=np.uint8), name_offsets=self._name_offsets,
+                     village_state=self._village_state, village_district=self._village_district,
+                     keys=self._keys, key_offsets=self._key_offsets, postings=self._postings,
+                     gram_counts=self._gram_counts)
+
+    @classmethod
+    def load_pack(cls, path):
+        with np.load(path, allow_pickle=False) as pack:
+            meta = json.loads(pack['meta'].tobytes().decode('utf-8'))
+            if meta.get('version') != PACK_VERSION:
+                raise ValueError(f"{path} is a version {meta.get('version')} pack; rebuild it with knowledge.py build")
+            villages = (pack['names'].tobytes(), pack['name_offsets'], pack['village_state'], pack['village_district'],
+                        meta['districts'])
+            index = ({gram: i for i, gram in enumerate(meta['grams'])}, pack['keys'], pack['key_offsets'],
+                     pack['postings'], pack['gram_counts'])
+        return cls(villages, index, [Scheme(*scheme) for scheme in meta['schemes']],
+                   [(state, district, village, Branch(*branch)) for state, district, village, branch in meta['branches']],
+                   meta['branch_keys'])
+
+    def __len__(self):
+        return len(self._village_state)
+
+    @property
+    def branch_count(self):
+        return len(self._branch_rows)
+
+    def _village_name(self, village_id):
+        return self._names[self._name_offsets[village_id]:self._name_offsets[village_id + 1]].decode('utf-8')
+
+    def find_villages(self, state, village, district=None, limit=5, threshold=MATCH_THRESHOLD):
+        """VillageMatches for a village name in state, best first.
+
+        A district that is recognized narrows the search to it, unless
+        nothing there matches.
+        """
+        state = resolve_state(state)
+        grams = _gram_set(village)
+        if state is None or not grams:
+            return []
+        state_id = STATES.index(state)
+        start, stop = int(self._state_bounds[state_id]), int(self._state_bounds[state_id + 1])
+        postings = []
+        for gram in grams:
+            term = self._vocab.get(gram)
+            if term is None:
+                continue
+            key = term * KEY_STATES + state_id
+            i = int(np.searchsorted(self._keys, key))
+            if i < len(self._keys) and self._keys[i] == key:
+                postings.append(self._postings[self._key_offsets[i]:self._key_offsets[i + 1]])
+        if not postings:
+            return []
+
+        shared = np.bincount(np.concatenate(postings) - start, minlength=stop - start)
+        dice = 2 * shared / (len(grams) + self._gram_counts[start:stop])
+        district_id = self._districts.get((state_id, place_key(district))) if district else None
+        if district_id is not None:
+            in_district = self._village_district[start:stop] == district_id
+            if (dice[in_district] >= CANDIDATE_DICE).any():
+                dice = np.where(in_district, dice, 0)
+        count = min(CANDIDATES, len(dice))
+        candidates = np.argpartition(-dice, count - 1)[:count]
+
+        # Trigrams find the candidates; edit similarity ranks them, which
+        # copes better with a typo in a short name
+        key = place_key(village)
+        ranked = []
+        for i in candidates:
+            if dice[i] < CANDIDATE_DICE:
+                continue
+            name = self._village_name(start + i)
+            similarity = difflib.SequenceMatcher(None, key, place_key(name)).ratio()
+            if similarity >= threshold:
+                ranked.append((similarity, float(dice[i]), int(i), name))
+        ranked.sort(key=lambda match: (-match[0], -match[1], match[2]))
+        return [VillageMatch(name, self._district_names[self._village_district[start + i]], state, round(similarity, 3))
+                for similarity, _, i, name in ranked[:limit]]
+
+    def schemes_for(self, state, district=None):
+        """National schemes, then those of state and of its district."""
+        state = resolve_state(state)
+        district = place_key(district) if district else None
+        return [scheme for scheme, (scheme_state, scheme_district) in zip(self.schemes, self._scheme_places)
+                if scheme_state is None or (scheme_state == state and scheme_district in (None, district))]
+
+    def branches_near(self, match, lockers=False):
+        """(branches, 'village' or 'district') for a VillageMatch; the district's if the village has none.
+
+        With lockers, branches known to have no lockers are left out.
+        """
+        state_id = STATES.index(match.state)
+        district = place_key(match.district)
+        for scope, branches in (('village', self._branches_by_village.get((state_id, district, place_key(match.village)), [])),
+                                ('district', self._branches_by_district.get((state_id, district), []))):
+            branches = [branch for branch in branches if not lockers or branch.locker != 'no']
+            if branches:
+                return branches, scope
+        return [], 'district'
+
+
+def describe_schemes(schemes, state, match=None):
+    """Plain-text list of schemes, one '- Name: description' item each."""
+    place = f"{match.village}, {match.district} district, {state}" if match else state
+    lines = [f"Government schemes for {place}:", '']
+    for scheme in schemes:
+        lines += [f"- {scheme.name}: {scheme.description}", '']
+    return '\n'.join(lines).strip()
+
+
+def describe_branches(branches, match, scope):
+    if scope == 'village':
+        lines = [f"Bank branches in {match.village} ({match.district} district, {match.state}):", '']
+    else:
+        lines = [f"No bank branch is listed in {match.village} itself. "
+                 f"These branches are elsewhere in {match.district} district, {match.state}:", '']
+    for branch in branches:
+        details = [branch.address, f"Phone {branch.phone}" if branch.phone else '',
+                   f"IFSC {branch.ifsc}" if branch.ifsc else '',
+                   'Lockers available' if branch.locker == 'yes' else 'Ask the branch about lockers']
+        lines.append(f"- {branch.bank}, {branch.branch} branch: {'. '.join(detail for detail in details if detail)}.")
+    lines += ['', "Locker rent depends on the locker size and the branch; ask the branch for its current charges "
+                  "and waiting list, and carry your ID and address proof."]
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='index source files into a pack')
+    build.add_argument('--villages', default=os.path.join('data', 'villages.csv'))
+    build.add_argument('--branches', default=os.path.join('data', 'branches.csv'))
+    build.add_argument('--schemes', default=os.path.join('data', 'schemes.json'))
+    build.add_argument('--out', default=os.path.join('cache', 'knowledge.npz'))
+    lookup = commands.add_parser('lookup', help='match a village and list what the routes would answer')
+    lookup.add_argument('state')
+    lookup.add_argument('village')
+    lookup.add_argument('--district')
+    lookup.add_argument('--pack', default=os.path.join('cache', 'knowledge.npz'))
+    lookup.add_argument('--data', default='data')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        kb = KnowledgeBase.from_files(*(path if os.path.exists(path) else None
+                                        for path in (args.villages, args.schemes, args.branches)))
+        built = time.perf_counter() - started
+        kb.save_pack(args.out)
+        print(f"{len(kb)} villages, {kb.branch_count} branches, {len(kb.schemes)} schemes indexed in {built:.1f} s; "
+              f"wrote {args.out} ({os.path.getsize(args.out) / 1e6:.1f} MB)")
+        return
+
+    kb = KnowledgeBase.load(args.data, args.pack)
+    state = resolve_state(args.state)
+    if state is None:
+        sys.exit(f"Unknown state: {args.state}")
+    matches = kb.find_villages(state, args.village, args.district)
+    for match in matches:
+        print(f"{match.score:.3f}  {match.village}, {match.district}, {match.state}")
+    match = matches[0] if matches else None
+    print()
+    print(describe_schemes(kb.schemes_for(state, match and match.district), state, match))
+    if match:
+        branches, scope = kb.branches_near(match)
+        if branches:
+            print()
+            print(describe_branches(branches, match, scope))
+
+
+if __name__ == '__main__':
+    main()
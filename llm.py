@@ -0,0 +1,266 @@
+"""LLM access for the app: the model registry and the backends routes call.
+
+ModelRegistry
+    Process-wide registry of prebuilt Gemini model handles. Building a
+    genai.GenerativeModel (and its GenerationConfig) is pure setup work that
+    used to happen on every request. Handles are now built once per
+    (feature, language, generation profile) and shared by every request.
+
+LLMBackend
+    The interface every route goes through to get an answer. GeminiBackend
+    calls the real API through the registry; StubBackend answers locally and
+    deterministically for offline benchmarks and CI.
+
+google.generativeai (with gRPC and protobuf) takes about a second to import,
+so it is imported when the first Gemini model is built rather than when the
+app starts; the API's errors are named through the upstream module, which
+loads them on first use.
+"""
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from collections import namedtuple
+
+import metrics
+import upstream
+
+DEFAULT_LANGUAGE = 'en-US'
+
+GenerationProfile = namedtuple('GenerationProfile', ['model_name', 'temperature', 'max_output_tokens'])
+
+DEFAULT_PROFILE = GenerationProfile('gemini-2.0-flash', 0.5, 1000)
+LONG_PROFILE = DEFAULT_PROFILE._replace(max_output_tokens=2000)
+
+# A finished answer and its token usage
+Completion = namedtuple('Completion', ['text', 'input_tokens', 'output_tokens'])
+
+
+def load_genai():
+    import google.generativeai as genai
+    return genai
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._features = {}
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def register(self, feature, instructions=None, profile=DEFAULT_PROFILE):
+        # instructions maps locale -> system instruction, or is None for
+        # features that carry their instructions inside the prompt.
+        self._features[feature] = (instructions, profile)
+
+    def features(self):
+        return list(self._features)
+
+    def profile(self, feature):
+        return self._features[feature][1]
+
+    def resolve_language(self, feature, language):
+        instructions, _ = self._features[feature]
+        if instructions is None:
+            return None
+        return language if language in instructions else DEFAULT_LANGUAGE
+
+    def instruction(self, feature, language=DEFAULT_LANGUAGE):
+        instructions, _ = self._features[feature]
+        language = self.resolve_language(feature, language)
+        return None if language is None else instructions[language]
+
+    def get(self, feature, language=DEFAULT_LANGUAGE, profile=None):
+        if feature not in self._features:
+            raise KeyError(f"Unknown model feature: {feature}")
+        instructions, default_profile = self._features[feature]
+        profile = profile or default_profile
+        # Unsupported locales share the English handle, so the key space stays
+        # bounded no matter what clients send.
+        key = (feature, self.resolve_language(feature, language), profile)
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = self._build(instructions, key[1], profile)
+                    self._models[key] = model
+        return model
+
+    def warm(self):
+        for feature, (instructions, _) in self._features.items():
+            for language in instructions or [DEFAULT_LANGUAGE]:
+                self.get(feature, language)
+        return len(self._models)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def _build(self, instructions, language, profile):
+        genai = load_genai()
+        kwargs = {}
+        if instructions is not None:
+            kwargs['system_instruction'] = instructions[language]
+        return genai.GenerativeModel(
+            profile.model_name,
+            generation_config=genai.types.GenerationConfig(
+                temperature=profile.temperature,
+                max_output_tokens=profile.max_output_tokens
+            ),
+            **kwargs
+        )
+
+
+class LLMBackend:
+    """Answers prompts for the features registered in a ModelRegistry.
+
+    generate() returns a Completion and stream() yields text chunks. Both
+    have async twins for the ASGI entry point. profile overrides the
+    feature's registered GenerationProfile for one call.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def warm(self):
+        pass
+
+    def generate(self, feature, language, prompt, profile=None):
+        raise NotImplementedError
+
+    def stream(self, feature, language, prompt, profile=None):
+        raise NotImplementedError
+
+    async def generate_async(self, feature, language, prompt, profile=None):
+        raise NotImplementedError
+
+    def stream_async(self, feature, language, prompt, profile=None):
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    def __init__(self, registry, api_key=None):
+        super().__init__(registry)
+        self.api_key = api_key
+        self._configured = False
+        self._lock = threading.Lock()
+
+    def _configure(self):
+        if self._configured:
+            return
+        with self._lock:
+            if not self._configured:
+                if not self.api_key:
+                    raise upstream.Unauthenticated("GOOGLE_API_KEY is not set")
+                load_genai().configure(api_key=self.api_key)
+                self._configured = True
+
+    def warm(self):
+        self._configure()
+        self.registry.warm()
+
+    def _model(self, feature, language, profile):
+        with metrics.phase('model'):
+            self._configure()
+            return self.registry.get(feature, language, profile)
+
+    def generate(self, feature, language, prompt, profile=None):
+        response = self._model(feature, language, profile).generate_content(prompt)
+        return _completion(response)
+
+    def stream(self, feature, language, prompt, profile=None):
+        for chunk in self._model(feature, language, profile).generate_content(prompt, stream=True):
+            yield chunk.text
+
+    async def generate_async(self, feature, language, prompt, profile=None):
+        response = await self._model(feature, language, profile).generate_content_async(prompt)
+        return _completion(response)
+
+    async def stream_async(self, feature, language, prompt, profile=None):
+        response = await self._model(feature, language, profile).generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            yield chunk.text
+
+
+def _completion(response):
+    usage = getattr(response, 'usage_metadata', None)
+    return Completion(
+        response.text,
+        getattr(usage, 'prompt_token_count', 0) or 0,
+        getattr(usage, 'candidates_token_count', 0) or 0
+    )
+
+
+_STUB_WORDS = ('savings', 'account', 'bank', 'loan', 'interest', 'deposit', 'form', 'branch', 'scheme',
+               'village', 'money', 'rupees', 'step', 'visit', 'ask', 'officer', 'passbook', 'card')
+
+
+class StubBackend(LLMBackend):
+    """Deterministic local stand-in for Gemini.
+
+    The answer depends only on (feature, language, prompt), cut to the
+    profile's output budget. Each call waits `latency` seconds (or
+    model_latency[model name] for models listed there), then one token per
+    1/tokens_per_second (0 means no per-token delay). An error_rate fraction
+    of calls, drawn from a seeded generator so runs are repeatable, fail
+    with ServiceUnavailable.
+    """
+
+    def __init__(self, registry, latency=1.0, tokens_per_second=0, error_rate=0.0, seed=0, model_latency=None):
+        super().__init__(registry)
+        self.latency = latency
+        self.model_latency = model_latency or {}
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _answer(self, feature, language, prompt, profile):
+        if self.error_rate:
+            with self._lock:
+                failed = self._random.random() < self.error_rate
+            if failed:
+                raise upstream.ServiceUnavailable("Stub backend: injected error")
+        digest = hashlib.sha256(f"{feature}|{language}|{prompt}".encode('utf-8')).digest()
+        count = min(20 + digest[0], (profile or self.registry.profile(feature)).max_output_tokens)
+        words = random.Random(digest).choices(_STUB_WORDS, k=count)
+        return words, len(prompt) // 4 + 1
+
+    def _token_delay(self):
+        return 1 / self.tokens_per_second if self.tokens_per_second else 0
+
+    def _latency(self, feature, profile):
+        return self.model_latency.get((profile or self.registry.profile(feature)).model_name, self.latency)
+
+    def generate(self, feature, language, prompt, profile=None):
+        words, input_tokens = self._answer(feature, language, prompt, profile)
+        time.sleep(self._latency(feature, profile) + len(words) * self._token_delay())
+        return Completion(' '.join(words), input_tokens, len(words))
+
+    def stream(self, feature, language, prompt, profile=None):
+        words, _ = self._answer(feature, language, prompt, profile)
+        time.sleep(self._latency(feature, profile))
+        for word in words:
+            time.sleep(self._token_delay())
+            yield word + ' '
+
+    async def generate_async(self, feature, language, prompt, profile=None):
+        words, input_tokens = self._answer(feature, language, prompt, profile)
+        await asyncio.sleep(self._latency(feature, profile) + len(words) * self._token_delay())
+        return Completion(' '.join(words), input_tokens, len(words))
+
+    async def stream_async(self, feature, language, prompt, profile=None):
+        words, _ = self._answer(feature, language, prompt, profile)
+        await asyncio.sleep(self._latency(feature, profile))
+        for word in words:
+            await asyncio.sleep(self._token_delay())
+            yield word + ' '
+
+
+def create_backend(name, registry, api_key=None, **stub_options):
+    if name == 'gemini':
+        return GeminiBackend(registry, api_key)
+    if name == 'stub':
+        return StubBackend(registry, **stub_options)
+    raise ValueError(f"Unknown LLM backend: {name}")
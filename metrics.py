@@ -0,0 +1,258 @@
+"""In-process metrics, exposed in the Prometheus text format on /metrics.
+
+Timings are attributed to the request being served through a context
+variable, so code deep in the stack (the LLM backends, PDF extraction) can
+record a phase without knowing which route or language it is serving:
+
+    token = start_request('/chat')
+    with phase('llm'):
+        ...
+    finish_request(token, status=200)
+
+Phases are buffered per request and flushed when it finishes, so they carry
+the request's final language label. The request's token counts and cache
+results are kept on it too, and finish_request returns it for the audit
+log. Metrics are per process; under several gunicorn workers each one
+reports its own.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Label values are restricted so client input can't explode the series count
+LANGUAGES = ('en-US', 'hi-IN', 'kn-IN', 'ta-IN', 'te-IN')
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', bound)])} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+REGISTRY = []
+
+REQUEST_SECONDS = Histogram('aartha_request_duration_seconds', 'Time to serve a request.',
+                            ['route', 'language', 'status'])
+PHASE_SECONDS = Histogram('aartha_phase_duration_seconds',
+                          'Time spent per request phase (parse, extract, model, llm, serialize, ...).',
+                          ['route', 'language', 'phase'])
+LLM_TOKENS = Counter('aartha_llm_tokens_total', 'LLM tokens used.', ['route', 'language', 'direction'])
+CACHE_LOOKUPS = Counter('aartha_cache_lookups_total', 'Cache lookups by cache and result.',
+                        ['route', 'language', 'cache', 'result'])
+COALESCED = Counter('aartha_llm_coalesced_total', 'Requests that shared an identical in-flight LLM call.',
+                    ['route', 'language'])
+ADMISSION_REJECTED = Counter('aartha_admission_rejected_total',
+                             'Requests shed by admission control (rate_limited, queue_full, queue_timeout).',
+                             ['route', 'language', 'reason'])
+RESILIENCE_EVENTS = Counter('aartha_llm_resilience_events_total',
+                            'LLM call retries, hedges, deadlines, open-circuit and saturated refusals, and stale answers served.',
+                            ['route', 'language', 'event'])
+LLM_ROUTED = Counter('aartha_llm_routed_total',
+                     'LLM calls by generation profile and why it was chosen (default, short_input, light_unhealthy, probe).',
+                     ['route', 'language', 'profile', 'reason'])
+LLM_PROFILE_SECONDS = Histogram('aartha_llm_profile_duration_seconds', 'Time to a successful LLM answer, by generation profile.',
+                                ['route', 'language', 'profile'])
+LLM_PROFILE_TOKENS = Counter('aartha_llm_profile_tokens_total', 'LLM tokens used, by generation profile.',
+                             ['route', 'language', 'profile', 'direction'])
+AUDIT_RECORDS = Counter('aartha_audit_records_total', 'Audit log records by result (written, dropped, failed).',
+                        ['result'])
+ANSWER_PACK_LOADS = Counter('aartha_answer_pack_loads_total', 'Answer packs loaded or rejected, by result (loaded, failed).',
+                            ['result'])
+CHAT_COMPACTIONS = Counter('aartha_chat_compactions_total',
+                           'Chat session histories compacted, by result (summarized, truncated).', ['result'])
+ERRORS = Counter('aartha_errors_total', 'Failed requests by error type.', ['route', 'language', 'type'])
+
+
+class _Request:
+    def __init__(self, route):
+        self.route = route
+        self.language = 'none'
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.error = None
+        self.status = None
+        self.seconds = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def add_phase(self, name, seconds):
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+_current = contextvars.ContextVar('aartha_metrics_request', default=None)
+
+
+def start_request(route):
+    return _current.set(_Request(route))
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def resumed(request):
+    """Attributes what runs inside to request, e.g. while a streamed body is generated outside the request's context."""
+    token = _current.set(request)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def set_language(language):
+    request = _current.get()
+    if request is not None:
+        request.language = language if language in LANGUAGES else 'other'
+
+
+def labels():
+    request = _current.get()
+    if request is None:
+        return {'route': 'none', 'language': 'none'}
+    return {'route': request.route, 'language': request.language}
+
+
+def record_error(error_type):
+    # The first error recorded for a request is the one that counts
+    request = _current.get()
+    if request is not None and request.error is None:
+        request.error = error_type
+
+
+def set_status(status):
+    request = _current.get()
+    if request is not None:
+        request.status = status
+
+
+def record_tokens(input_tokens, output_tokens):
+    labels_ = labels()
+    LLM_TOKENS.inc(input_tokens, direction='input', **labels_)
+    LLM_TOKENS.inc(output_tokens, direction='output', **labels_)
+    request = _current.get()
+    if request is not None:
+        with request.lock:
+            request.input_tokens += input_tokens
+            request.output_tokens += output_tokens
+
+
+def record_cache(cache, hit):
+    CACHE_LOOKUPS.inc(cache=cache, result='hit' if hit else 'miss', **labels())
+    note_cache(cache, 'hit' if hit else 'miss')
+
+
+def note_cache(cache, result):
+    """Records how a cache (or shared source, like an in-flight call) served this request, for the audit log only."""
+    request = _current.get()
+    if request is not None:
+        request.cache[cache] = result
+
+
+@contextmanager
+def phase(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        request = _current.get()
+        if request is not None:
+            request.add_phase(name, time.perf_counter() - started)
+
+
+def finish_request(token, status=None, deferred=False):
+    """Ends the request's context and records it, unless deferred (for a
+    streamed body, which is recorded with record_request once it is sent)."""
+    request = _current.get()
+    _current.reset(token)
+    if request is None or deferred:
+        return request
+    return record_request(request, status)
+
+
+def record_request(request, status=None):
+    status = request.status = status or request.status or 200
+    request.seconds = time.perf_counter() - request.started
+    request_labels = {'route': request.route, 'language': request.language}
+    REQUEST_SECONDS.observe(request.seconds, status=str(status), **request_labels)
+    for name, seconds in request.phases.items():
+        PHASE_SECONDS.observe(seconds, phase=name, **request_labels)
+    if status >= 400:
+        error = request.error or ('other' if status >= 500 else 'client')
+        ERRORS.inc(type=error, **request_labels)
+    return request
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
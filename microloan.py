@@ -0,0 +1,205 @@
+"""Local microloan pre-scoring.
+
+The eligibility questionnaire has eight fixed answers, and the thresholds
+the model was asked to apply are simple ones (monthly earnings under 5000
+rupees, more than 6 dependents together with existing loans, ...), so the
+verdict and its reasons are computed here. The model is only needed, if at
+all, to phrase the explanation in the applicant's language.
+
+Rules are written once, over numpy columns, so a single applicant and a
+batch of thousands from a field officer go through the same code; a batch
+is scored in one vectorized pass.
+"""
+import csv
+import io
+import json
+import re
+from collections import namedtuple
+
+import numpy as np
+
+LOW_EARNINGS = 5000  # rupees per month
+LARGE_FAMILY = 6  # dependents
+
+VERDICTS = ('Eligible', 'Possibly Eligible', 'Not Eligible')
+ELIGIBLE, POSSIBLY_ELIGIBLE, NOT_ELIGIBLE = range(3)
+
+# Reason codes, in the order they are reported, with their English wording
+REASONS = (
+    ('low_earnings', f"Monthly earnings are below {LOW_EARNINGS} rupees, so repaying a loan may be hard."),
+    ('large_family_with_loans', f"A family of more than {LARGE_FAMILY} people with existing loans leaves little money for repayments."),
+    ('existing_loans', "You already have a loan; lenders will check that it is being repaid on time."),
+    ('no_steady_income', "Without a steady income, lenders may worry about regular repayments."),
+    ('no_purpose', "A clear reason for the loan (for example, buying seeds or a cow) helps your application."),
+    ('no_bank_account', "Open a bank account first; most microloans are paid into one."),
+    ('steady_income', "A steady income from crops or trade shows you can repay."),
+    ('owns_asset', "Owning land or a small business makes lenders more confident."),
+    ('clear_purpose', "You have a clear reason for the loan."),
+)
+REASON_CODES = tuple(code for code, _ in REASONS)
+REASON_TEXT = dict(REASONS)
+
+# Questionnaire fields, with the q1..q8 names the web form uses
+FIELDS = ('owns_asset', 'steady_income', 'existing_loans', 'dependents', 'bank_account',
+          'monthly_earnings', 'job', 'purpose')
+FORM_FIELDS = dict(zip(('q1', 'q2', 'q3', 'q4', 'q5', 'q6', 'q7', 'q8'), FIELDS))
+_YES_NO_FIELDS = ('owns_asset', 'steady_income', 'existing_loans', 'bank_account')
+
+# Labels used in the questionnaire text the web form sends as its query
+_QUERY_LABELS = {
+    'owns land or business': 'owns_asset',
+    'steady income': 'steady_income',
+    'existing loans': 'existing_loans',
+    'dependents': 'dependents',
+    'has bank account': 'bank_account',
+    'monthly earnings': 'monthly_earnings',
+    'job': 'job',
+    'loan purpose': 'purpose',
+}
+_QUERY_LINE = re.compile(r'^\s*-\s*([A-Za-z ]+?)\s*:\s*(.*?)\s*$', re.MULTILINE)
+
+_YES = {'yes', 'y', 'true', '1', 'haan', 'ha'}
+_NO = {'no', 'n', 'false', '0', 'nahi', 'illa'}
+
+Assessment = namedtuple('Assessment', ['verdict', 'reasons'])
+
+
+class InvalidAnswers(ValueError):
+    pass
+
+
+def _yes_no(field, value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _YES:
+        return True
+    if text in _NO:
+        return False
+    raise InvalidAnswers(f"{field} must be yes or no")
+
+
+def _number(field, value):
+    try:
+        number = float(str(value).replace(',', '').replace('rupees', '').strip())
+    except ValueError:
+        raise InvalidAnswers(f"{field} must be a number")
+    if number < 0 or number != number:
+        raise InvalidAnswers(f"{field} must be a non-negative number")
+    return number
+
+
+def parse_answers(data):
+    """Validated answers from a dict keyed by field name or by q1..q8."""
+    answers = {}
+    for key, value in data.items():
+        field = FORM_FIELDS.get(key, key)
+        if field in FIELDS and value is not None and value != '':
+            answers[field] = value
+    missing = [field for field in FIELDS[:6] if field not in answers]
+    if missing:
+        raise InvalidAnswers(f"Missing answers: {', '.join(missing)}")
+    for field in _YES_NO_FIELDS:
+        answers[field] = _yes_no(field, answers[field])
+    answers['dependents'] = _number('dependents', answers['dependents'])
+    answers['monthly_earnings'] = _number('monthly_earnings', answers['monthly_earnings'])
+    answers['job'] = str(answers.get('job', '')).strip()
+    answers['purpose'] = str(answers.get('purpose', '')).strip()
+    return answers
+
+
+def parse_query(text):
+    """Answers from the questionnaire text the web form sends, or None if it isn't one."""
+    found = {}
+    for label, value in _QUERY_LINE.findall(text or ''):
+        field = _QUERY_LABELS.get(label.strip().lower())
+        if field is not None:
+            found[field] = value
+    try:
+        return parse_answers(found)
+    except InvalidAnswers:
+        return None
+
+
+def score(columns):
+    """Verdict index and reason bitmask arrays for columns of answers (a dict of arrays)."""
+    owns = np.asarray(columns['owns_asset'], dtype=bool)
+    steady = np.asarray(columns['steady_income'], dtype=bool)
+    loans = np.asarray(columns['existing_loans'], dtype=bool)
+    bank = np.asarray(columns['bank_account'], dtype=bool)
+    dependents = np.asarray(columns['dependents'], dtype=float)
+    earnings = np.asarray(columns['monthly_earnings'], dtype=float)
+    has_purpose = np.asarray(columns['has_purpose'], dtype=bool)
+
+    low = earnings < LOW_EARNINGS
+    large_with_loans = (dependents > LARGE_FAMILY) & loans
+    risk = low | large_with_loans
+    support = steady & has_purpose
+    positives = owns.astype(int) + steady + bank
+
+    verdicts = np.where(risk & ~support, NOT_ELIGIBLE,
+                        np.where(risk | (positives < 2), POSSIBLY_ELIGIBLE, ELIGIBLE))
+    flags = (low, large_with_loans, loans & ~large_with_loans, ~steady, ~has_purpose, ~bank,
+             steady, owns, has_purpose)
+    reasons = np.zeros(len(earnings), dtype=np.int32)
+    for bit, flag in enumerate(flags):
+        reasons |= flag.astype(np.int32) << bit
+    return verdicts, reasons
+
+
+def reason_codes(mask):
+    return [code for bit, code in enumerate(REASON_CODES) if mask >> bit & 1]
+
+
+def _columns(rows):
+    columns = {field: [row[field] for row in rows] for field in FIELDS[:6]}
+    columns['has_purpose'] = [bool(row['purpose']) for row in rows]
+    return columns
+
+
+def assess(answers):
+    verdicts, reasons = score(_columns([answers]))
+    return Assessment(VERDICTS[verdicts[0]], reason_codes(int(reasons[0])))
+
+
+def explain(assessment):
+    """Plain-text English explanation of an assessment, in the app's '-' bullet style."""
+    lines = [f"Estimate: {assessment.verdict}"]
+    lines.extend(f"- {REASON_TEXT[code]}" for code in assessment.reasons)
+    return '\n'.join(lines)
+
+
+def read_batch(body, content_type=''):
+    """Rows of answers from a JSONL or CSV batch, as (row_id, answers or InvalidAnswers)."""
+    text = body.decode('utf-8-sig') if isinstance(body, bytes) else body
+    if 'csv' not in content_type and ('json' in content_type or text.lstrip().startswith('{')):
+        records = (_json_line(line) for line in text.splitlines() if line.strip())
+    else:
+        records = csv.DictReader(io.StringIO(text))
+    for index, record in enumerate(records):
+        row_id = record.get('id', index) if isinstance(record, dict) else index
+        try:
+            if not isinstance(record, dict):
+                raise InvalidAnswers("Each line must be a JSON object")
+            yield row_id, parse_answers(record)
+        except InvalidAnswers as e:
+            yield row_id, e
+
+
+def _json_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def score_batch(rows):
+    """Yield one result dict per (row_id, answers) row, scoring all valid rows in one pass."""
+    verdicts, reasons = score(_columns([answers for _, answers in rows if not isinstance(answers, InvalidAnswers)]))
+    scored = zip(verdicts.tolist(), reasons.tolist())
+    for row_id, answers in rows:
+        if isinstance(answers, InvalidAnswers):
+            yield {'id': row_id, 'error': str(answers)}
+        else:
+            verdict, mask = next(scored)
+            yield {'id': row_id, 'verdict': VERDICTS[verdict], 'reasons': reason_codes(mask)}
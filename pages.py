@@ -0,0 +1,78 @@
+"""Prerendered, precompressed responses for pages and static bundles.
+
+The GET pages render to the same HTML on every request, so they are rendered
+once at startup and kept in memory along with gzip (and, if the brotli
+package is installed, brotli) encodings of each body. Every encoding has its
+own strong ETag; a request whose If-None-Match matches gets an empty 304.
+"""
+import gzip
+import hashlib
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 512
+
+
+class _Entry:
+    def __init__(self, body, mimetype, cache_control):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.bodies = {'identity': body}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            compressed = {'gzip': gzip.compress(body, 9, mtime=0)}
+            if brotli is not None:
+                compressed['br'] = brotli.compress(body, quality=11)
+            for encoding, data in compressed.items():
+                if len(data) < len(body):
+                    self.bodies[encoding] = data
+        # Server preference when the client accepts several equally
+        self.encodings = [encoding for encoding in ('br', 'gzip', 'identity') if encoding in self.bodies]
+
+    def etag(self, encoding):
+        return self.digest if encoding == 'identity' else f"{self.digest}-{encoding}"
+
+
+class PageStore:
+    def __init__(self):
+        self._entries = {}
+
+    def add(self, key, body, mimetype, cache_control):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self._entries[key] = _Entry(body, mimetype, cache_control)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def digest(self, key):
+        return self._entries[key].digest
+
+    def size(self, key, encoding='identity'):
+        return len(self._entries[key].bodies.get(encoding, b''))
+
+    def response(self, key):
+        """The stored response for key, negotiated for the current request, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        encoding = request.accept_encodings.best_match(entry.encodings, default='identity')
+        if encoding not in entry.bodies:
+            encoding = 'identity'
+        etag = entry.etag(encoding)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(entry.bodies[encoding], mimetype=entry.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = entry.cache_control
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
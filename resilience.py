@@ -0,0 +1,326 @@
+"""Deadlines, retries, hedging and a circuit breaker around an LLM backend.
+
+ResilientBackend wraps any LLMBackend and is what the routes call:
+
+- every call has a deadline (per feature), after which it fails with
+  DeadlineExceeded instead of holding the worker;
+- transient upstream errors are retried with jittered exponential backoff
+  while the deadline allows;
+- optionally, when an attempt is still running past the observed p95
+  latency of the feature with that generation profile, a second identical
+  request is sent and whichever answers first wins;
+- after enough consecutive failures the circuit breaker opens and calls fail
+  at once with CircuitOpen until a probe call succeeds.
+
+Sync attempts run on a pool of `workers` threads. An attempt abandoned at
+its deadline keeps its thread until the upstream call returns, so when every
+thread is taken a call fails at once with Saturated rather than queueing,
+and no retries or hedges are started.
+
+Streams get the same treatment up to their first chunk; once text has been
+sent to the client a failure can no longer be retried.
+"""
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+import upstream
+from llm import LLMBackend
+
+
+def __getattr__(name):
+    # The errors raised here are upstream ones, loaded on first use
+    if name in ('CircuitOpen', 'Saturated', 'DeadlineExceeded', 'TRANSIENT_ERRORS'):
+        return getattr(upstream, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            # Once reset_timeout has passed, let a single probe call through
+            if time.monotonic() - self.opened_at >= self.reset_timeout and not self._probing:
+                self._probing = True
+                return
+        raise upstream.CircuitOpen("LLM circuit breaker is open")
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """Ends a call that says nothing about the upstream, freeing the probe slot if it held it."""
+        with self._lock:
+            self._probing = False
+
+
+class LatencyTracker:
+    def __init__(self, window=200, min_samples=20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, feature, seconds):
+        with self._lock:
+            self._samples.setdefault(feature, deque(maxlen=self.window)).append(seconds)
+
+    def p95(self, feature):
+        with self._lock:
+            samples = sorted(self._samples.get(feature, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[int(len(samples) * 0.95)]
+
+
+class ResilientBackend(LLMBackend):
+    def __init__(self, backend, deadlines=None, retries=2, backoff=0.5, hedge=False,
+                 breaker=None, workers=64):
+        super().__init__(backend.registry)
+        self.backend = backend
+        self.deadlines = dict({'default': 20.0}, **(deadlines or {}))
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        # Sync attempts run here so the caller can stop waiting at the deadline;
+        # _busy counts the threads taken, abandoned attempts included
+        self.workers = workers
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='llm-call')
+
+    def warm(self):
+        self.backend.warm()
+
+    def deadline(self, feature):
+        return self.deadlines.get(feature, self.deadlines['default'])
+
+    def _record(self, event):
+        metrics.RESILIENCE_EVENTS.inc(event=event, **metrics.labels())
+
+    def _submit(self, fn, *args):
+        """Runs fn on a free pool thread; raises Saturated when there is none."""
+        with self._busy_lock:
+            if self._busy >= self.workers:
+                self._record('saturated')
+                raise upstream.Saturated("Every LLM call thread is busy")
+            self._busy += 1
+        try:
+            # Copy the caller's context so phase timings stay on its request
+            future = self._pool.submit(contextvars.copy_context().run, fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future=None):
+        with self._busy_lock:
+            self._busy -= 1
+
+    def _thread_free(self):
+        with self._busy_lock:
+            return self._busy < self.workers
+
+    def _retry_delay(self, attempt, expires):
+        """Seconds to wait before retrying, or None once out of retries or time."""
+        # Full jitter: anywhere up to the exponential backoff
+        delay = random.uniform(0, self.backoff * 2 ** attempt)
+        if attempt >= self.retries or time.monotonic() + delay >= expires:
+            return None
+        self._record('retry')
+        return delay
+
+    def _deadline_exceeded(self, feature):
+        self._record('deadline')
+        return upstream.DeadlineExceeded(f"{feature} answer took longer than {self.deadline(feature):g}s")
+
+    def _admit(self):
+        try:
+            self.breaker.before_call()
+        except upstream.CircuitOpen:
+            self._record('circuit_open')
+            raise
+
+    def _call(self, feature, attempt_fn):
+        # attempt_fn(remaining) makes one attempt within remaining seconds
+        expires = time.monotonic() + self.deadline(feature)
+        attempt = 0
+        while True:
+            self._admit()
+            try:
+                result = attempt_fn(expires - time.monotonic())
+            except upstream.Saturated:
+                # Not the upstream's failure, and retrying would only add load
+                self.breaker.release()
+                raise
+            except upstream.TRANSIENT_ERRORS:
+                self.breaker.failure()
+                delay = self._retry_delay(attempt, expires) if self._thread_free() else None
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except Exception:
+                # Upstream answered, just not with something usable
+                self.breaker.success()
+                raise
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.success()
+            return result
+
+    async def _call_async(self, feature, attempt_fn):
+        expires = time.monotonic() + self.deadline(feature)
+        attempt = 0
+        while True:
+            self._admit()
+            try:
+                result = await attempt_fn(expires - time.monotonic())
+            except upstream.TRANSIENT_ERRORS:
+                self.breaker.failure()
+                delay = self._retry_delay(attempt, expires)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except Exception:
+                self.breaker.success()
+                raise
+            except BaseException:
+                # Cancelled: no verdict on the upstream either way
+                self.breaker.release()
+                raise
+            self.breaker.success()
+            return result
+
+    def _attempt(self, feature, language, prompt, profile, remaining):
+        if remaining <= 0:
+            raise self._deadline_exceeded(feature)
+        started = time.monotonic()
+        futures = {self._submit(self.backend.generate, feature, language, prompt, profile)}
+        hedge_after = self.latency.p95((feature, profile)) if self.hedge else None
+        if hedge_after is not None and hedge_after < remaining:
+            done, _ = wait(futures, timeout=hedge_after)
+            if not done:
+                try:
+                    futures.add(self._submit(self.backend.generate, feature, language, prompt, profile))
+                    self._record('hedge')
+                except upstream.Saturated:
+                    pass
+        error = None
+        while futures:
+            done, futures = wait(futures, timeout=max(started + remaining - time.monotonic(), 0),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                raise self._deadline_exceeded(feature)
+            for future in done:
+                if future.exception() is None:
+                    self.latency.observe((feature, profile), time.monotonic() - started)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def generate(self, feature, language, prompt, profile=None):
+        return self._call(feature, lambda remaining: self._attempt(feature, language, prompt, profile, remaining))
+
+    def _first_chunk(self, feature, language, prompt, profile, remaining):
+        if remaining <= 0:
+            raise self._deadline_exceeded(feature)
+        chunks = self.backend.stream(feature, language, prompt, profile)
+        future = self._submit(next, chunks, None)
+        done, _ = wait([future], timeout=remaining)
+        if not done:
+            raise self._deadline_exceeded(feature)
+        return future.result(), chunks
+
+    def stream(self, feature, language, prompt, profile=None):
+        first, chunks = self._call(
+            feature, lambda remaining: self._first_chunk(feature, language, prompt, profile, remaining))
+        if first is not None:
+            yield first
+            yield from chunks
+
+    async def _attempt_async(self, feature, language, prompt, profile, remaining):
+        if remaining <= 0:
+            raise self._deadline_exceeded(feature)
+        started = time.monotonic()
+        tasks = {asyncio.ensure_future(self.backend.generate_async(feature, language, prompt, profile))}
+        try:
+            hedge_after = self.latency.p95((feature, profile)) if self.hedge else None
+            if hedge_after is not None and hedge_after < remaining:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done:
+                    self._record('hedge')
+                    tasks.add(asyncio.ensure_future(self.backend.generate_async(feature, language, prompt, profile)))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, timeout=max(started + remaining - time.monotonic(), 0),
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise self._deadline_exceeded(feature)
+                for task in done:
+                    if task.exception() is None:
+                        self.latency.observe((feature, profile), time.monotonic() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def generate_async(self, feature, language, prompt, profile=None):
+        return await self._call_async(
+            feature, lambda remaining: self._attempt_async(feature, language, prompt, profile, remaining))
+
+    async def _first_chunk_async(self, feature, language, prompt, profile, remaining):
+        if remaining <= 0:
+            raise self._deadline_exceeded(feature)
+        chunks = self.backend.stream_async(feature, language, prompt, profile)
+        try:
+            return await asyncio.wait_for(anext(chunks, None), remaining), chunks
+        except asyncio.TimeoutError:
+            raise self._deadline_exceeded(feature)
+
+    async def stream_async(self, feature, language, prompt, profile=None):
+        first, chunks = await self._call_async(
+            feature, lambda remaining: self._first_chunk_async(feature, language, prompt, profile, remaining))
+        if first is not None:
+            yield first
+            async for text in chunks:
+                yield text
@@ -0,0 +1,150 @@
+"""Picks the generation profile (model tier and output budget) for each LLM call.
+
+Every feature answers with the profile it was registered with, unless the
+routing config says otherwise. A feature can also name a light profile
+(a smaller, faster model with a tighter budget) for short inputs: calls whose
+text is within light_max_input_tokens go there instead.
+
+The light tier is only used while it earns its place. Recent latencies and
+errors are tracked per feature and profile, and short inputs go to the main
+profile while the light one fails more than max_error_rate of its calls or
+its p95 latency is no better than the main profile's. One in probe_every of
+those calls still goes to the light tier, so it can recover.
+
+The config is JSON:
+
+    {
+      "profiles": {"lite": {"model_name": "gemini-2.0-flash-lite", "temperature": 0.3, "max_output_tokens": 600}},
+      "features": {"default": {"light_profile": "lite", "light_max_input_tokens": 40},
+                   "form": {"profile": "long", "light_profile": null}},
+      "routes": {"/insurance_chat": {"light_profile": null}}
+    }
+
+"features.default" applies to every feature, a feature's own entry to that
+feature, and a route's entry to calls made while serving that route.
+"""
+import json
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+import metrics
+from llm import GenerationProfile
+from tokens import estimate_tokens
+
+# A routing decision: the feature, the profile's name ('default' for the one
+# the feature was registered with), the profile, and why it was chosen
+Choice = namedtuple('Choice', ['feature', 'name', 'profile', 'reason'])
+
+_SETTINGS = ('profile', 'light_profile', 'light_max_input_tokens')
+
+
+class ProfileStats:
+    def __init__(self, window=200):
+        self._latencies = deque(maxlen=window)
+        self._errors = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, ok):
+        with self._lock:
+            self._errors.append(not ok)
+            if ok:
+                self._latencies.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            errors = list(self._errors)
+        return {
+            'calls': len(errors),
+            'error_rate': sum(errors) / len(errors) if errors else 0.0,
+            'p95': latencies[int(len(latencies) * 0.95)] if latencies else None,
+            'samples': len(latencies),
+        }
+
+
+class ModelRouter:
+    def __init__(self, registry, config=None, max_error_rate=0.2, min_samples=20, probe_every=20):
+        config = config or {}
+        self.registry = registry
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.probe_every = probe_every
+        self.profiles = {name: GenerationProfile(**profile) for name, profile in config.get('profiles', {}).items()}
+        self._features = config.get('features', {})
+        self._routes = config.get('routes', {})
+        for scope in [self._features.get('default', {}), *self._features.values(), *self._routes.values()]:
+            for setting in ('profile', 'light_profile'):
+                name = scope.get(setting)
+                if name is not None and name not in self.profiles:
+                    raise ValueError(f"Unknown generation profile in routing config: {name}")
+        self._stats = {}
+        self._skipped = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, registry, path, **options):
+        with open(path, encoding='utf-8') as f:
+            return cls(registry, json.load(f), **options)
+
+    def settings(self, feature, route=None):
+        settings = {'profile': None, 'light_profile': None, 'light_max_input_tokens': 0}
+        for scope in (self._features.get('default', {}), self._features.get(feature, {}), self._routes.get(route, {})):
+            settings.update((key, scope[key]) for key in _SETTINGS if key in scope)
+        return settings
+
+    def stats(self, feature, name):
+        with self._lock:
+            stats = self._stats.get((feature, name))
+            if stats is None:
+                stats = self._stats[(feature, name)] = ProfileStats()
+        return stats
+
+    def _light_is_better(self, feature, light, main):
+        light, main = self.stats(feature, light).snapshot(), self.stats(feature, main).snapshot()
+        if light['calls'] >= self.min_samples and light['error_rate'] > self.max_error_rate:
+            return False
+        if light['samples'] >= self.min_samples and main['samples'] >= self.min_samples:
+            return light['p95'] < main['p95']
+        return True
+
+    def choose(self, feature, route=None, text=''):
+        """The Choice for a call to feature, made while serving route, on input text."""
+        settings = self.settings(feature, route)
+        main = settings['profile'] or 'default'
+        main_profile = self.profiles[main] if settings['profile'] else self.registry.profile(feature)
+        light = settings['light_profile']
+        if light is None or estimate_tokens(text) > settings['light_max_input_tokens']:
+            choice = Choice(feature, main, main_profile, 'default')
+        elif self._light_is_better(feature, light, main):
+            choice = Choice(feature, light, self.profiles[light], 'short_input')
+        else:
+            with self._lock:
+                self._skipped += 1
+                probe = self._skipped % self.probe_every == 0
+            choice = (Choice(feature, light, self.profiles[light], 'probe') if probe
+                      else Choice(feature, main, main_profile, 'light_unhealthy'))
+        metrics.LLM_ROUTED.inc(profile=choice.name, reason=choice.reason, **metrics.labels())
+        return choice
+
+    @contextmanager
+    def timed(self, choice):
+        """Records the latency, or the failure, of the call made inside."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.observe(choice, time.perf_counter() - started, ok=False)
+            raise
+        self.observe(choice, time.perf_counter() - started)
+
+    def observe(self, choice, seconds, ok=True):
+        self.stats(choice.feature, choice.name).observe(seconds, ok)
+        if ok:
+            metrics.LLM_PROFILE_SECONDS.observe(seconds, profile=choice.name, **metrics.labels())
+
+    def record_usage(self, choice, completion):
+        labels = metrics.labels()
+        metrics.LLM_PROFILE_TOKENS.inc(completion.input_tokens, profile=choice.name, direction='input', **labels)
+        metrics.LLM_PROFILE_TOKENS.inc(completion.output_tokens, profile=choice.name, direction='output', **labels)
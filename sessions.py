@@ -0,0 +1,197 @@
+"""Server-side chat sessions for multi-turn /chat conversations.
+
+A session is a summary of its older turns plus the most recent turns, kept
+under a token budget. When the turns outgrow the budget, the oldest ones
+are folded into the summary by a background call to the model, so a
+follow-up never waits on compaction. If summarizing fails, those turns are
+dropped instead, so a session's size stays bounded however long the
+conversation runs.
+
+Sessions expire after idle_timeout seconds without a message. Two stores are
+provided: an in-memory one and an SQLite one whose sessions survive
+restarts.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from tokens import estimate_tokens, truncate_tokens
+
+
+class MemoryStore:
+    def __init__(self, max_sessions=10000, idle_timeout=1800):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_idle(self, now):
+        while self._sessions:
+            session_id, (_, last_used) = next(iter(self._sessions.items()))
+            if last_used > now - self.idle_timeout:
+                break
+            del self._sessions[session_id]
+
+    def get(self, session_id):
+        with self._lock:
+            self._evict_idle(time.time())
+            entry = self._sessions.get(session_id)
+            return None if entry is None else entry[0]
+
+    def put(self, session_id, state):
+        now = time.time()
+        with self._lock:
+            self._sessions[session_id] = (state, now)
+            self._sessions.move_to_end(session_id)
+            self._evict_idle(now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteStore:
+    def __init__(self, path, max_sessions=100000, idle_timeout=1800):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS chat_sessions ('
+            'id TEXT PRIMARY KEY, state TEXT NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS chat_sessions_last_used ON chat_sessions (last_used)')
+        self._db.commit()
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT state FROM chat_sessions WHERE id = ? AND last_used > ?',
+                (session_id, time.time() - self.idle_timeout)
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, session_id, state):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO chat_sessions (id, state, last_used) VALUES (?, ?, ?)',
+                (session_id, json.dumps(state, ensure_ascii=False), now)
+            )
+            self._db.execute('DELETE FROM chat_sessions WHERE last_used <= ?', (now - self.idle_timeout,))
+            (count,) = self._db.execute('SELECT COUNT(*) FROM chat_sessions').fetchone()
+            if count > self.max_sessions:
+                self._db.execute(
+                    'DELETE FROM chat_sessions WHERE id IN '
+                    '(SELECT id FROM chat_sessions ORDER BY last_used LIMIT ?)',
+                    (count - self.max_sessions,)
+                )
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM chat_sessions').fetchone()[0]
+
+
+def create_session_store(backend='memory', path=None, max_sessions=10000, idle_timeout=1800):
+    if backend == 'sqlite':
+        return SQLiteStore(path or os.path.join('cache', 'sessions.sqlite3'), max_sessions, idle_timeout)
+    if backend == 'memory':
+        return MemoryStore(max_sessions, idle_timeout)
+    raise ValueError(f"Unknown chat session backend: {backend}")
+
+
+def format_turns(turns):
+    return '\n'.join(f"{'User' if role == 'user' else 'Assistant'}: {text}" for role, text in turns)
+
+
+class ChatSessions:
+    """Rolling history per session id.
+
+    summarize(summary, turns) returns a new summary covering both; it runs on
+    executor, or inline when there is none.
+    """
+
+    def __init__(self, store, token_budget=1500, summary_tokens=300, summarize=None, executor=None):
+        self.store = store
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.summarize = summarize
+        self.executor = executor
+        self._compacting = set()
+        self._lock = threading.Lock()
+
+    def context(self, session_id):
+        """(summary, turns) to answer the session's next message with."""
+        state = self.store.get(session_id)
+        if state is None:
+            return '', []
+        # A compaction may still be running; never send more than the budget
+        turns = list(state['turns'])
+        while len(turns) > 2 and sum(estimate_tokens(text) for _, text in turns) > self.token_budget:
+            turns.pop(0)
+        return state['summary'], turns
+
+    def record(self, session_id, message, answer):
+        turn_tokens = self.token_budget // 2
+        with self._lock:
+            state = self.store.get(session_id) or {'summary': '', 'turns': []}
+            turns = state['turns'] + [['user', truncate_tokens(message, turn_tokens)],
+                                      ['assistant', truncate_tokens(answer, turn_tokens)]]
+            self.store.put(session_id, {'summary': state['summary'], 'turns': turns})
+            if sum(estimate_tokens(text) for _, text in turns) <= self.token_budget or session_id in self._compacting:
+                return
+            self._compacting.add(session_id)
+        if self.executor is None:
+            self._compact(session_id)
+        else:
+            self.executor.submit(self._compact, session_id)
+
+    def _compact(self, session_id):
+        try:
+            with self._lock:
+                state = self.store.get(session_id)
+                if state is None:
+                    return
+                # Fold the oldest turns until the rest fit in half the budget,
+                # always keeping the latest exchange
+                turns = state['turns']
+                keep = len(turns)
+                kept_tokens = 0
+                while keep > 0:
+                    tokens = estimate_tokens(turns[keep - 1][1])
+                    if len(turns) - keep >= 2 and kept_tokens + tokens > self.token_budget // 2:
+                        break
+                    kept_tokens += tokens
+                    keep -= 1
+                old = turns[:keep]
+            if not old:
+                return
+
+            summary = state['summary']
+            result = 'truncated'
+            if self.summarize is not None:
+                try:
+                    summary = truncate_tokens(self.summarize(summary, old), self.summary_tokens)
+                    result = 'summarized'
+                except Exception:
+                    pass
+            metrics.CHAT_COMPACTIONS.inc(result=result)
+
+            with self._lock:
+                state = self.store.get(session_id)
+                # Apply only if no one else changed the turns being folded
+                if state is not None and state['turns'][:len(old)] == old:
+                    self.store.put(session_id, {'summary': summary, 'turns': state['turns'][len(old):]})
+        finally:
+            with self._lock:
+                self._compacting.discard(session_id)
@@ -0,0 +1,69 @@
+"""Coalescing of identical in-flight calls.
+
+When a burst of users asks the same question before the first answer is in
+the response cache, each request would otherwise make its own upstream call.
+SingleFlight lets the first caller for a key run the call while later callers
+with the same key wait for it and share its result (or its exception).
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, key, new_future):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = new_future()
+            self.leaders += 1
+            return future, True
+
+    def _release(self, key):
+        with self._lock:
+            del self._calls[key]
+
+    def do(self, key, fn):
+        """Return (result, shared): fn's result, or that of the identical call
+        already running, in which case shared is True."""
+        future, leader = self._join(key, Future)
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._release(key)
+
+    async def do_async(self, key, fn):
+        """As do(), for a coroutine function; callers share one event loop."""
+        loop = asyncio.get_running_loop()
+        future, leader = self._join((id(loop), key), loop.create_future)
+        if not leader:
+            # Shielded so one follower being cancelled doesn't cancel the rest
+            return await asyncio.shield(future), True
+        try:
+            result = await fn()
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved, in case nobody was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._release((id(loop), key))
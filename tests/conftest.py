@@ -0,0 +1,65 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Clock:
+    """Stands in for the time module in the module under test; only moves when told to."""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def __getattr__(self, name):
+        import time
+        return getattr(time, name)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def app_environment(tmp):
+    """Settings for an offline app whose files all go under tmp."""
+    return {
+        'LLM_BACKEND': 'stub',
+        'STUB_LATENCY_MS': '0',
+        'LLM_PRELOAD': '0',
+        'PRERENDER_PAGES': '0',
+        'AUDIT_LOG': '0',
+        'RATE_LIMIT_PER_MIN': '0',
+        'ANSWER_PACK': '',
+        'MODEL_ROUTING_PATH': os.path.join(ROOT, 'model_routing.json'),
+        'KNOWLEDGE_DIR': os.path.join(ROOT, 'data'),
+        'KNOWLEDGE_PACK': os.path.join(tmp, 'knowledge.npz'),
+        'FORM_CACHE_DIR': os.path.join(tmp, 'forms'),
+    }
+
+
+@pytest.fixture(scope='session')
+def flask_app(tmp_path_factory):
+    """The app started once for the session on the stub backend; create_app() only starts it once."""
+    tmp = str(tmp_path_factory.mktemp('app'))
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in app_environment(tmp).items():
+            patch.setenv(name, value)
+        import app
+        yield app.create_app()
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import AdmissionController, RateLimiter, Rejected, client_keys, forwarded_address, parse_limits
+
+
+@pytest.fixture
+def limiter(clock, monkeypatch):
+    monkeypatch.setattr(admission, 'time', clock)
+    return RateLimiter(per_minute=60, burst=2)
+
+
+def test_burst_then_refused_until_a_token_refills(limiter, clock):
+    limiter.check('a')
+    limiter.check('a')
+    with pytest.raises(Rejected) as rejected:
+        limiter.check('a')
+    assert rejected.value.status == 429
+    assert rejected.value.retry_after == 1
+    clock.advance(1)
+    limiter.check('a')
+    with pytest.raises(Rejected):
+        limiter.check('a')
+
+
+def test_bucket_refills_only_up_to_the_burst(limiter, clock):
+    limiter.check('a')
+    clock.advance(3600)
+    limiter.check('a')
+    limiter.check('a')
+    with pytest.raises(Rejected):
+        limiter.check('a')
+
+
+def test_clients_have_their_own_buckets(limiter):
+    limiter.check('a')
+    limiter.check('a')
+    limiter.check('b')
+    with pytest.raises(Rejected):
+        limiter.check('a')
+
+
+def test_refused_request_takes_no_token_from_its_other_buckets(limiter):
+    limiter.check('ip')
+    limiter.check('ip')
+    with pytest.raises(Rejected):
+        limiter.check('ip', 'session')
+    limiter.check('session')
+    limiter.check('session')
+
+
+def test_zero_rate_disables_limiting():
+    limiter = RateLimiter(per_minute=0, burst=1)
+    for _ in range(100):
+        limiter.check('a')
+
+
+def test_forwarded_address_trusts_only_the_configured_hops():
+    assert forwarded_address('10.0.0.1', '6.6.6.6, 1.2.3.4', 1) == '1.2.3.4'
+    assert forwarded_address('10.0.0.1', '6.6.6.6, 1.2.3.4', 2) == '6.6.6.6'
+    assert forwarded_address('10.0.0.1', '1.2.3.4', 2) == '10.0.0.1'
+    assert forwarded_address('10.0.0.1', '1.2.3.4', 0) == '10.0.0.1'
+    assert forwarded_address('10.0.0.1', None, 1) == '10.0.0.1'
+
+
+def test_client_keys_and_limits():
+    assert client_keys('1.2.3.4') == [('ip', '1.2.3.4')]
+    assert client_keys('1.2.3.4', 's' * 500)[1] == ('session', 's' * 128)
+    assert parse_limits('form=4, chat=16,') == {'form': 4, 'chat': 16}
+
+
+def test_full_queue_sheds_at_once():
+    controller = AdmissionController(1, queue_size=0)
+    controller.acquire('chat')
+    with pytest.raises(Rejected) as rejected:
+        controller.acquire('chat')
+    assert (rejected.value.status, rejected.value.reason) == (503, 'queue_full')
+
+
+def test_waiter_times_out_in_the_queue():
+    controller = AdmissionController(1, queue_size=1, queue_timeout=0.01)
+    controller.acquire('chat')
+    with pytest.raises(Rejected) as rejected:
+        controller.acquire('chat')
+    assert rejected.value.reason == 'queue_timeout'
+    assert controller.waiting == 0
+
+
+def test_released_slot_goes_to_a_waiter_its_feature_limit_allows():
+    controller = AdmissionController(2, {'form': 1}, queue_size=4, queue_timeout=5)
+    controller.acquire('form')
+    controller.acquire('chat')
+    admitted = []
+    threads = [threading.Thread(target=lambda feature=feature: (controller.acquire(feature), admitted.append(feature)))
+               for feature in ('form', 'chat')]
+    for thread in threads:
+        thread.start()
+        while controller.waiting < threads.index(thread) + 1:
+            time.sleep(0.001)
+    # The form slot is taken, so the chat slot freed here goes to the chat waiter
+    controller.release('chat')
+    threads[1].join(5)
+    assert admitted == ['chat']
+    controller.release('form')
+    threads[0].join(5)
+    assert admitted == ['chat', 'form']
+    assert controller.active == 2
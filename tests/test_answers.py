@@ -0,0 +1,90 @@
+import os
+import struct
+
+import pytest
+
+import answers
+from answers import AnswerPack, PackedAnswers, pack_key, prompt_digest, write_pack
+
+DIGESTS = {('savings', 'en-US'): prompt_digest('instruction', 'template'),
+           ('savings', 'hi-IN'): prompt_digest('instruction', 'template')}
+META = {'prompts': {f"{feature}|{language}": digest for (feature, language), digest in DIGESTS.items()}}
+
+
+@pytest.fixture
+def pack_path(tmp_path):
+    path = str(tmp_path / 'answers.pack')
+    write_pack(path, {
+        pack_key('savings', 'en-US', "How do I open a savings account?"): 'Visit the branch with your Aadhaar.',
+        pack_key('savings', 'hi-IN', "How do I open a savings account?"): 'आधार लेकर शाखा जाएं।',
+    }, META)
+    return path
+
+
+def test_lookup_ignores_case_and_punctuation(pack_path):
+    pack = AnswerPack(pack_path)
+    assert len(pack) == 2
+    assert pack.get(pack_key('savings', 'en-US', "how do i open a SAVINGS account")) == 'Visit the branch with your Aadhaar.'
+    assert pack.get(pack_key('savings', 'hi-IN', "How do I open a savings account?")) == 'आधार लेकर शाखा जाएं।'
+    assert pack.get(pack_key('savings', 'ta-IN', "How do I open a savings account?")) is None
+    assert pack.get(pack_key('savings', 'en-US', "How do I close a savings account?")) is None
+    assert pack.meta == META
+
+
+def test_empty_pack(tmp_path):
+    path = str(tmp_path / 'empty.pack')
+    write_pack(path, {}, {})
+    assert AnswerPack(path).get(pack_key('savings', 'en-US', 'q')) is None
+
+
+@pytest.mark.parametrize('corrupt, message', [
+    (lambda data: b'', 'empty'),
+    (lambda data: data[:3], 'not an answer pack'),
+    (lambda data: b'NOPE' + data[4:], 'not an answer pack'),
+    (lambda data: data[:4] + struct.pack('<I', 99) + data[8:], 'pack format 99'),
+    (lambda data: data[:-10], 'truncated'),
+])
+def test_corrupt_packs_are_rejected(pack_path, corrupt, message):
+    with open(pack_path, 'rb') as f:
+        data = f.read()
+    with open(pack_path, 'wb') as f:
+        f.write(corrupt(data))
+    with pytest.raises(ValueError, match=message):
+        AnswerPack(pack_path)
+
+
+def test_answers_from_changed_prompts_are_not_served(pack_path):
+    digests = dict(DIGESTS)
+    digests[('savings', 'hi-IN')] = prompt_digest('new instruction', 'template')
+    packed = PackedAnswers(pack_path, digests, check_interval=0)
+    assert packed.lookup('savings', 'en-US', "How do I open a savings account?") is not None
+    assert packed.lookup('savings', 'hi-IN', "How do I open a savings account?") is None
+
+
+def test_replaced_pack_is_picked_up_and_a_corrupt_one_ignored(pack_path, clock, monkeypatch):
+    monkeypatch.setattr(answers, 'time', clock)
+    packed = PackedAnswers(pack_path, DIGESTS, check_interval=5)
+    question = "How do I open a savings account?"
+    assert packed.lookup('savings', 'en-US', question) == 'Visit the branch with your Aadhaar.'
+
+    write_pack(pack_path, {pack_key('savings', 'en-US', question): 'Use the app.'}, META)
+    assert packed.lookup('savings', 'en-US', question) == 'Visit the branch with your Aadhaar.'
+    clock.advance(5)
+    assert packed.lookup('savings', 'en-US', question) == 'Use the app.'
+
+    # A broken replacement keeps the pack already loaded in service
+    with open(pack_path + '.tmp', 'wb') as f:
+        f.write(b'garbage')
+    os.replace(pack_path + '.tmp', pack_path)
+    clock.advance(5)
+    assert packed.lookup('savings', 'en-US', question) == 'Use the app.'
+
+    os.remove(pack_path)
+    clock.advance(5)
+    assert packed.lookup('savings', 'en-US', question) is None
+    assert len(packed) == 0
+
+
+def test_missing_pack_answers_nothing(tmp_path):
+    packed = PackedAnswers(str(tmp_path / 'none.pack'), DIGESTS)
+    assert packed.lookup('savings', 'en-US', 'q') is None
@@ -0,0 +1,124 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT, app_environment
+
+MICROLOAN_ANSWERS = {'owns_asset': 'yes', 'steady_income': 'yes', 'existing_loans': 'no', 'dependents': 2,
+                     'bank_account': 'yes', 'monthly_earnings': 15000}
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
+
+
+def run_python(code, tmp_path, **settings):
+    env = dict(os.environ, PYTHONPATH=ROOT, **app_environment(str(tmp_path)))
+    env.update(settings)
+    result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=env, capture_output=True, text=True,
+                            timeout=60)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_create_app_returns_the_started_app(flask_app):
+    import app
+    assert app.create_app() is flask_app
+    assert flask_app.config['LLM_BACKEND'] == 'stub'
+
+
+def test_chat_answers_from_the_stub_backend(client):
+    response = client.post('/chat', json={'message': 'How do I open a savings account?'})
+    assert response.status_code == 200
+    assert response.get_json()['response']
+
+
+def test_chat_repeats_its_answer_to_the_same_message(client):
+    first = client.post('/chat', json={'message': 'What is a fixed deposit?'}).get_json()
+    second = client.post('/chat', json={'message': 'What is a fixed deposit?'}).get_json()
+    assert first == second
+
+
+def test_chat_rejects_an_empty_message(client):
+    response = client.post('/chat', json={'message': '  '})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': '400 Bad Request: Invalid or empty message'}
+
+
+def test_json_routes_reject_other_bodies(client):
+    response = client.post('/process_savings_query', data='query=hello')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': '400 Bad Request: Request must be JSON'}
+
+
+def test_chat_session_keeps_the_conversation(client):
+    for message in ('I want to open an account.', 'Which documents do I need?'):
+        response = client.post('/chat', json={'message': message, 'session_id': 'app-test'})
+        assert response.status_code == 200
+    response = client.post('/chat', json={'message': 'Thanks', 'session_id': 'x' * 129})
+    assert response.status_code == 400
+
+
+def test_chat_streams_server_sent_events(client):
+    response = client.post('/chat', json={'message': 'Tell me about ATMs', 'stream': True})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert b'data: ' in response.data
+
+
+def test_microloan_answers_are_scored_by_the_rules(client):
+    response = client.post('/estimate_microloan_eligibility', json={'answers': MICROLOAN_ANSWERS, 'explain': False})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['verdict'] == 'Eligible'
+    assert 'owns_asset' in body['reasons']
+    assert body['eligibility']
+
+
+def test_microloan_rejects_incomplete_answers(client):
+    response = client.post('/estimate_microloan_eligibility', json={'answers': {'owns_asset': 'yes'}})
+    assert response.status_code == 400
+    assert 'Missing answers' in response.get_json()['error']
+
+
+def test_microloan_bulk_scores_each_line(client):
+    body = '\n'.join(json.dumps(MICROLOAN_ANSWERS) for _ in range(3))
+    response = client.post('/microloan_bulk', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert len(response.data.decode().splitlines()) == 3
+
+
+def test_unknown_job_is_not_found(client):
+    response = client.get('/jobs/missing')
+    assert response.status_code == 404
+
+
+def test_metrics_count_the_requests(client):
+    client.post('/chat', json={'message': 'Hello'})
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert b'/chat' in response.data
+
+
+def test_importing_the_app_does_not_load_grpc(tmp_path):
+    assert run_python("import sys, app; print('grpc' in sys.modules)", tmp_path).strip() == 'False'
+
+
+def test_first_request_sees_the_trusted_proxy(tmp_path):
+    # With one request a minute per client, only a repeat from the same
+    # forwarded address is refused, the first request's included
+    code = """
+import app
+client = app.app.test_client()
+for address in ('10.0.0.1', '10.0.0.1', '10.0.0.2'):
+    response = client.post('/chat', json={'message': 'Hi'}, headers={'X-Forwarded-For': address},
+                           environ_base={'REMOTE_ADDR': '192.168.0.1'})
+    print(response.status_code)
+"""
+    output = run_python(code, tmp_path, TRUSTED_PROXIES='1', RATE_LIMIT_PER_MIN='1', RATE_LIMIT_BURST='1')
+    assert output.split() == ['200', '429', '200']
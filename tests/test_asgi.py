@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+import pytest
+
+
+@pytest.fixture
+def asgi(flask_app, monkeypatch):
+    import asgi
+    monkeypatch.setitem(flask_app.config, 'MAX_CONTENT_LENGTH', 1024)
+    return asgi
+
+
+def post(asgi, path, chunks, headers=()):
+    """Sends a POST whose body arrives in chunks; returns (status, body, chunks read)."""
+    pending = list(chunks)
+    read = []
+    sent = []
+
+    async def receive():
+        chunk = pending.pop(0)
+        read.append(chunk)
+        return {'type': 'http.request', 'body': chunk, 'more_body': bool(pending)}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'client': ('127.0.0.1', 5000),
+             'headers': [(b'content-type', b'application/json'), *headers]}
+    asyncio.run(asgi.application(scope, receive, send))
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    return sent[0]['status'], body, len(read)
+
+
+def test_answers_a_json_route(asgi):
+    status, body, _ = post(asgi, '/chat', [json.dumps({'message': 'Hello'}).encode()])
+    assert status == 200
+    assert json.loads(body)['response']
+
+
+def test_body_in_several_chunks_is_joined(asgi):
+    payload = json.dumps({'message': 'How do I open an account?'}).encode()
+    status, _, read = post(asgi, '/chat', [payload[:10], payload[10:20], payload[20:]])
+    assert status == 200
+    assert read == 3
+
+
+def test_declared_length_over_the_limit_is_refused_unread(asgi):
+    status, body, read = post(asgi, '/chat', [b'{}'], [(b'content-length', b'4096')])
+    assert status == 413
+    assert 'error' in json.loads(body)
+    assert read == 0
+
+
+def test_body_growing_over_the_limit_is_refused(asgi):
+    status, _, read = post(asgi, '/chat', [b' ' * 600, b' ' * 600, b' ' * 600])
+    assert status == 413
+    assert read == 2
+
+
+def test_invalid_json_is_a_bad_request(asgi):
+    status, body, _ = post(asgi, '/chat', [b'{not json'])
+    assert status == 400
+    assert json.loads(body) == {'error': '400 Bad Request: Invalid JSON body'}
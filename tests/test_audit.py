@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+
+import metrics
+from audit import AuditLog, normalize_input, read_log
+
+
+def test_normalize_input():
+    assert normalize_input({'message': '  how   do\tI\n  save  ', 'n': 3, 'list': ['a  b']}) == \
+        {'message': 'how do I\nsave', 'n': 3, 'list': ['a b']}
+    assert normalize_input('x' * 50, max_chars=10) == 'x' * 10
+
+
+def test_records_are_written_on_close(tmp_path):
+    log = AuditLog(str(tmp_path), batch_size=2, flush_interval=60)
+    for i in range(5):
+        log.record({'ts': 5 - i, 'route': '/chat'})
+    log.close()
+    with open(log.path, encoding='utf-8') as f:
+        assert [json.loads(line)['ts'] for line in f] == [5, 4, 3, 2, 1]
+    assert [record['ts'] for record in read_log([str(tmp_path)])] == [1, 2, 3, 4, 5]
+
+
+def test_full_queue_drops_records(tmp_path, monkeypatch):
+    released = threading.Event()
+    writing = threading.Event()
+    original = AuditLog._write
+
+    def blocked(self, batch):
+        writing.set()
+        released.wait(5)
+        original(self, batch)
+    monkeypatch.setattr(AuditLog, '_write', blocked)
+
+    log = AuditLog(str(tmp_path), queue_size=2, batch_size=1)
+    log.record({'ts': 0})
+    assert writing.wait(5)
+    dropped = metrics.AUDIT_RECORDS.value(result='dropped')
+    for i in range(1, 5):
+        log.record({'ts': i})
+    released.set()
+    log.close()
+    # The writer held one record while the queue took two more; the rest were dropped
+    assert [record['ts'] for record in read_log([log.path])] == [0, 1, 2]
+    assert metrics.AUDIT_RECORDS.value(result='dropped') == dropped + 2
+
+
+def test_read_log_skips_a_partial_last_line(tmp_path):
+    path = tmp_path / 'audit.1.jsonl'
+    path.write_text('{"ts": 2}\n{"ts": 1}\n{"ts": 3, "rou', encoding='utf-8')
+    assert read_log([str(path)]) == [{'ts': 1}, {'ts': 2}]
+
+
+def test_rotates_past_max_bytes(tmp_path):
+    log = AuditLog(str(tmp_path), batch_size=1, max_bytes=1, keep=1)
+    log._write([{'ts': 1}])
+    log._write([{'ts': 2}])
+    log._write([{'ts': 3}])
+    log.close()
+    names = sorted(os.listdir(tmp_path))
+    assert len(names) == 2 and os.path.basename(log.path) in names
+    assert [record['ts'] for record in read_log([str(tmp_path)])] == [2, 3]
@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+import cache
+from cache import FormCache, MemoryBackend, ResponseCache, SQLiteBackend, make_key
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(cache, 'time', clock)
+    if request.param == 'memory':
+        return MemoryBackend(max_entries=2)
+    return SQLiteBackend(str(tmp_path / 'responses.sqlite3'), max_entries=2)
+
+
+def test_entries_expire_after_their_ttl(backend, clock):
+    backend.set('k', 'answer', 60)
+    clock.advance(59)
+    assert backend.get('k') == 'answer'
+    clock.advance(1)
+    assert backend.get('k') is None
+
+
+def test_expired_entries_are_still_served_as_stale(backend, clock):
+    backend.set('k', 'answer', 60)
+    clock.advance(3600)
+    assert backend.get('k') is None
+    assert backend.get('k', stale=True) == 'answer'
+
+
+def test_least_recently_used_entry_is_evicted(backend, clock):
+    backend.set('a', '1', 60)
+    clock.advance(1)
+    backend.set('b', '2', 60)
+    clock.advance(1)
+    assert backend.get('a') == '1'
+    clock.advance(1)
+    backend.set('c', '3', 60)
+    assert len(backend) == 2
+    assert backend.get('a') == '1'
+    assert backend.get('b', stale=True) is None
+    assert backend.get('c') == '3'
+
+
+def test_keys_ignore_case_and_spacing_of_the_prompt():
+    assert make_key('chat', 'en-US', 'sys', 'How do I  open\nan account?') == \
+        make_key('chat', 'en-US', 'sys', 'how do i open an account?')
+    assert make_key('chat', 'en-US', 'sys', 'q') != make_key('chat', 'hi-IN', 'sys', 'q')
+    assert make_key('chat', 'en-US', 'sys', 'q') != make_key('chat', 'en-US', 'other', 'q')
+
+
+def test_response_cache_uses_per_feature_ttls(clock, monkeypatch):
+    monkeypatch.setattr(cache, 'time', clock)
+    responses = ResponseCache(MemoryBackend(), ttls={'chat': 100, 'form': 0})
+    responses.set('chat', 'en-US', 'sys', 'q', 'answer')
+    responses.set('form', 'en-US', 'sys', 'q', 'answer')
+    assert responses.get('chat', 'en-US', 'sys', 'q') == 'answer'
+    assert responses.get('form', 'en-US', 'sys', 'q') is None
+    assert responses.get_stale('form', 'en-US', 'sys', 'q') is None
+
+    clock.advance(101)
+    assert responses.get('chat', 'en-US', 'sys', 'q') is None
+    assert responses.get_stale('chat', 'en-US', 'sys', 'q') == 'answer'
+    assert (responses.hits, responses.misses) == (1, 1)
+
+
+def test_empty_answers_are_not_cached():
+    responses = ResponseCache(MemoryBackend())
+    responses.set('chat', 'en-US', 'sys', 'q', '')
+    assert responses.get('chat', 'en-US', 'sys', 'q') is None
+
+
+def test_form_text_and_guidance_are_kept_by_content_hash(tmp_path):
+    forms = FormCache(str(tmp_path))
+    digest = FormCache.digest(b'%PDF-1.4 account opening form')
+    assert forms.get_text(digest) is None
+    forms.set_text(digest, 'Name: ____')
+    forms.set_guidance(digest, 'hi-IN', 'Explain in Hindi', 'Fill in your name.')
+    reopened = FormCache(str(tmp_path))
+    assert reopened.get_text(digest) == 'Name: ____'
+    assert reopened.get_guidance(digest, 'hi-IN', 'Explain in Hindi') == 'Fill in your name.'
+
+
+def test_form_guidance_is_kept_per_language_and_instruction(tmp_path):
+    forms = FormCache(str(tmp_path))
+    forms.set_guidance('d', 'en-US', 'Explain', 'English guidance')
+    assert forms.get_guidance('d', 'hi-IN', 'Explain') is None
+    assert forms.get_guidance('d', 'en-US', 'Explain briefly') is None
+
+
+def test_least_recently_used_forms_are_evicted(tmp_path):
+    forms = FormCache(str(tmp_path), max_bytes=250)
+    forms.set_text('a', 'x' * 100)
+    forms.set_text('b', 'x' * 100)
+    os.utime(tmp_path / 'a.text', (1, 1))
+    os.utime(tmp_path / 'b.text', (2, 2))
+    forms.get_text('a')
+    forms.set_text('c', 'x' * 100)
+    assert forms.get_text('b') is None
+    assert forms.get_text('a') is not None
+    assert forms.get_text('c') is not None
+
+
+def test_form_larger_than_the_cache_is_not_kept(tmp_path):
+    forms = FormCache(str(tmp_path), max_bytes=10)
+    forms.set_text('a', 'x' * 100)
+    assert forms.get_text('a') is None
@@ -0,0 +1,148 @@
+import io
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError
+
+import PyPDF2
+import pytest
+
+import extraction
+from extraction import ImageOcr, PdfExtractor, WorkerPool, join_pages
+
+SAMPLE_FORM = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'new_account_opening_form.pdf')
+
+
+def sleepy_range(data, start, stop):
+    # Stands in for extraction._extract_range in the pool's workers
+    time.sleep(float(data))
+    return 1, [data.decode()]
+
+
+def wait_dead(processes, timeout=10):
+    deadline = time.monotonic() + timeout
+    while any(process.is_alive() for process in processes) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not any(process.is_alive() for process in processes)
+
+
+def pdf_bytes(pages):
+    reader = PyPDF2.PdfReader(SAMPLE_FORM)
+    writer = PyPDF2.PdfWriter()
+    for i in range(pages):
+        writer.add_page(reader.pages[i])
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def test_join_pages_skips_empty_pages_and_cuts_at_max_chars():
+    assert join_pages(['ab', '', 'cd'], 100) == 'ab\ncd'
+    assert join_pages(['abc', 'def', 'ghi'], 5) == 'abc\nd'
+
+
+def test_one_page_pdf_is_read_without_the_pool():
+    extractor = PdfExtractor(workers=1)
+    text = extractor.extract(pdf_bytes(1))
+    assert text.strip()
+    assert extractor._pool._pool is None
+
+
+def test_pdf_pages_are_read_in_order_on_the_pool():
+    extractor = PdfExtractor(workers=2, first_pages=2, page_timeout=30)
+    try:
+        reader = PyPDF2.PdfReader(SAMPLE_FORM)
+        expected = join_pages((page.extract_text() for page in reader.pages), extractor.max_chars)
+        assert extractor.extract(pdf_bytes(len(reader.pages))) == expected
+    finally:
+        extractor.shutdown()
+
+
+def test_abandoned_task_ends_only_its_own_worker():
+    pool = WorkerPool(2)
+    try:
+        stuck = pool.submit(time.sleep, 60)
+        other = pool.submit(time.sleep, 1)
+        with pytest.raises(TimeoutError):
+            stuck.result(timeout=0.5)
+        processes = list(pool._pool._processes.values())
+        pool.abandon(stuck)
+        # Later tasks go to a fresh pool, the task already running finishes
+        assert pool.submit(abs, -3).result(timeout=30) == 3
+        assert other.result(timeout=10) is None
+        # and then the retired pool, stuck worker and all, is ended
+        assert wait_dead(processes)
+    finally:
+        pool.shutdown()
+
+
+def test_concurrent_extraction_survives_another_timing_out(monkeypatch):
+    monkeypatch.setattr(extraction, '_extract_range', sleepy_range)
+    extractor = PdfExtractor(workers=2, first_pages=8, page_timeout=0.25, inline_bytes=0)
+    try:
+        # Start both workers outside the timings
+        warm = [threading.Thread(target=extractor.extract, args=(b'0.2',)) for _ in range(2)]
+        for thread in warm:
+            thread.start()
+        for thread in warm:
+            thread.join()
+        processes = list(extractor._pool._pool._processes.values())
+
+        results = {}
+
+        def extract(name, data):
+            try:
+                results[name] = extractor.extract(data)
+            except Exception as e:
+                results[name] = e
+        slow = threading.Thread(target=extract, args=('slow', b'60'))
+        slow.start()
+        time.sleep(1)
+        # Still running when the slow one is abandoned, at 2 seconds
+        fast = threading.Thread(target=extract, args=('fast', b'1.5'))
+        fast.start()
+        slow.join(10)
+        fast.join(10)
+        assert isinstance(results['slow'], TimeoutError)
+        assert results['fast'] == '1.5'
+        assert wait_dead(processes)
+    finally:
+        extractor.shutdown()
+
+
+def sleepy_recognize(data, languages, max_side, deadline):
+    # Stands in for extraction._recognize in the pool's workers
+    time.sleep(float(data))
+    return data.decode()
+
+
+def test_concurrent_ocr_survives_another_photo_timing_out(monkeypatch):
+    monkeypatch.setattr(extraction, '_recognize', sleepy_recognize)
+    ocr = ImageOcr(workers=2, image_timeout=2)
+    try:
+        warm = [threading.Thread(target=ocr.extract, args=(b'0.2',)) for _ in range(2)]
+        for thread in warm:
+            thread.start()
+        for thread in warm:
+            thread.join()
+        processes = list(ocr._pool._pool._processes.values())
+
+        results = {}
+
+        def extract(name, data):
+            try:
+                results[name] = ocr.extract(data)
+            except Exception as e:
+                results[name] = e
+        slow = threading.Thread(target=extract, args=('slow', b'60'))
+        slow.start()
+        time.sleep(1)
+        fast = threading.Thread(target=extract, args=('fast', b'1.5'))
+        fast.start()
+        slow.join(10)
+        fast.join(10)
+        assert isinstance(results['slow'], TimeoutError)
+        assert results['fast'] == '1.5'
+        assert wait_dead(processes)
+    finally:
+        ocr.shutdown()
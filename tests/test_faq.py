@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+
+import faq
+from faq import FaqIndex, normalize, numbers
+
+LOAN = "I earn 30000 rupees a month, can I get a loan?"
+
+
+def test_paraphrase_gets_the_stored_answer():
+    index = FaqIndex(threshold=0.8)
+    index.add('chat', 'en-US', "How do I open a savings account?", 'open it like this')
+    assert index.lookup('chat', 'en-US', "how do i open a savings account") == 'open it like this'
+    assert index.lookup('chat', 'hi-IN', "how do i open a savings account") is None
+    assert index.lookup('savings', 'en-US', "how do i open a savings account") is None
+
+
+def test_questions_that_differ_only_in_an_amount_do_not_match():
+    index = FaqIndex()
+    index.add('chat', 'en-US', LOAN, 'answer for 30000')
+    similarity, _, _ = index.search('chat', 'en-US', LOAN.replace('30000', '3000'))
+    assert similarity >= index.threshold
+    assert index.lookup('chat', 'en-US', LOAN.replace('30000', '3000')) is None
+    assert index.lookup('chat', 'en-US', LOAN.replace('30000', '30,000')) == 'answer for 30000'
+    assert (index.hits, index.misses) == (1, 1)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("3,00,000 rupees", ['300000']),
+    ("मुझे ३०००० रुपये", ['30000']),
+    ("7.5% for 12 months", ['12', '7.5']),
+    ("no amount", []),
+    ("007", ['7']),
+])
+def test_numbers(text, expected):
+    assert numbers(text) == expected
+
+
+def test_normalize_keeps_indic_vowel_signs():
+    assert normalize("  Balance  kaise KARE?? ") == 'balance kaise kare'
+    assert normalize("खाता कैसे खोलें?") == 'खाता कैसे खोलें'
+
+
+def test_oldest_entries_are_evicted_first():
+    index = FaqIndex(threshold=0.9, max_entries=4)
+    questions = [f"question about topic {letter * 5}" for letter in 'abcdef']
+    for i, question in enumerate(questions):
+        index.add('chat', 'en-US', question, str(i))
+    assert len(index) <= 4
+    assert index.lookup('chat', 'en-US', questions[0]) is None
+    assert index.lookup('chat', 'en-US', questions[-1]) == '5'
+
+
+def test_entries_are_not_served_past_max_age(clock, monkeypatch):
+    monkeypatch.setattr(faq, 'time', clock)
+    index = FaqIndex(threshold=0.9, max_age=100)
+    index.add('chat', 'en-US', "how do i open an account", 'old')
+    clock.advance(60)
+    index.add('chat', 'en-US', "how do i close an account", 'newer')
+    assert index.lookup('chat', 'en-US', "how do i open an account") == 'old'
+    clock.advance(40)
+    assert index.lookup('chat', 'en-US', "how do i open an account") is None
+    assert index.lookup('chat', 'en-US', "how do i close an account") == 'newer'
+    clock.advance(60)
+    assert index.lookup('chat', 'en-US', "how do i close an account") is None
+    assert len(index) == 0
+
+
+def test_persisted_index_reloads_and_forgets_evicted_rows(tmp_path):
+    path = str(tmp_path / 'faq.sqlite3')
+    index = FaqIndex(threshold=0.9, max_entries=2, path=path)
+    for letter in 'abc':
+        index.add('chat', 'en-US', f"question about topic {letter * 5}", letter)
+    (rows,) = sqlite3.connect(path).execute('SELECT COUNT(*) FROM faq_entries').fetchone()
+    assert rows == len(index) == 2
+
+    reloaded = FaqIndex(threshold=0.9, max_entries=2, path=path)
+    assert len(reloaded) == 2
+    assert reloaded.lookup('chat', 'en-US', "question about topic ccccc") == 'c'
+    assert reloaded.lookup('chat', 'en-US', "question about topic aaaaa") is None
+
+
+def test_index_from_before_entries_had_creation_times_opens(tmp_path):
+    path = str(tmp_path / 'faq.sqlite3')
+    db = sqlite3.connect(path)
+    db.execute('CREATE TABLE faq_entries (feature TEXT NOT NULL, language TEXT NOT NULL, '
+               'question TEXT NOT NULL, answer TEXT NOT NULL)')
+    db.execute("INSERT INTO faq_entries VALUES ('chat', 'en-US', 'how do i open an account', 'kept')")
+    db.commit()
+    assert FaqIndex(threshold=0.9, path=path).lookup('chat', 'en-US', 'how do i open an account') == 'kept'
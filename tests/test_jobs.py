@@ -0,0 +1,172 @@
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import jobs
+from jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue, MemoryJobStore, create_job_store
+
+
+class Retryable(Exception):
+    pass
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    return create_job_store(request.param, str(tmp_path / 'jobs.sqlite3'))
+
+
+@pytest.fixture
+def make_queue(store, tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(jobs, 'time', clock)
+
+    def make_queue(handler, **options):
+        # No worker threads: the tests claim and run jobs themselves
+        options = dict(dict(max_attempts=3, retry_backoff=10, ttl=100, lease=60, retry_on=(Retryable,)), **options)
+        return JobQueue(store, {'form': handler}, str(tmp_path / 'spool'), workers=0, **options)
+    return make_queue
+
+
+def run_next(queue, clock):
+    job = queue.store.claim(clock.time(), queue.lease)
+    if job is not None:
+        queue._run(job)
+    return job
+
+
+def test_job_runs_and_its_spooled_file_is_removed(make_queue, clock):
+    queue = make_queue(lambda params, data: {'size': len(data), 'language': params['language']})
+    job_id = queue.submit('form', {'language': 'hi-IN'}, b'%PDF-1.4', '.pdf')
+    path = queue.store.get(job_id)['path']
+    assert os.path.exists(path)
+    assert queue.status(job_id) == {'job_id': job_id, 'status': QUEUED, 'attempts': 0}
+
+    run_next(queue, clock)
+    assert queue.status(job_id) == {'job_id': job_id, 'status': DONE, 'attempts': 1,
+                                    'result': {'size': 8, 'language': 'hi-IN'}}
+    assert not os.path.exists(path)
+
+
+def test_retryable_errors_back_off_then_fail(make_queue, clock):
+    def handler(params, data):
+        raise Retryable('upstream busy')
+    queue = make_queue(handler)
+    job_id = queue.submit('form', {}, b'data')
+
+    run_next(queue, clock)
+    assert queue.status(job_id)['status'] == QUEUED
+    assert run_next(queue, clock) is None
+    clock.advance(10)
+    run_next(queue, clock)
+    assert queue.status(job_id)['attempts'] == 2
+    # The backoff doubles
+    clock.advance(10)
+    assert run_next(queue, clock) is None
+    clock.advance(10)
+    run_next(queue, clock)
+    assert queue.status(job_id) == {'job_id': job_id, 'status': FAILED, 'attempts': 3, 'error': 'upstream busy'}
+    assert os.listdir(queue.spool_dir) == []
+
+
+def test_other_errors_fail_at_once(make_queue, clock):
+    def handler(params, data):
+        raise ValueError('not a form')
+    queue = make_queue(handler)
+    job_id = queue.submit('form', {})
+    run_next(queue, clock)
+    assert queue.status(job_id)['status'] == FAILED
+    assert queue.status(job_id)['error'] == 'not a form'
+
+
+def test_job_of_a_dead_worker_is_claimed_again_after_its_lease(make_queue, store, clock):
+    queue = make_queue(lambda params, data: 'done', max_attempts=2)
+    job_id = queue.submit('form', {})
+    # Claimed by a worker that never finishes it
+    assert store.claim(clock.time(), queue.lease)['id'] == job_id
+    assert store.get(job_id)['status'] == RUNNING
+    clock.advance(59)
+    assert store.claim(clock.time(), queue.lease) is None
+    clock.advance(1)
+    assert store.claim(clock.time(), queue.lease)['attempts'] == 2
+    # That worker died too; the next claim is past max_attempts
+    clock.advance(60)
+    run_next(queue, clock)
+    assert queue.status(job_id) == {'job_id': job_id, 'status': FAILED, 'attempts': 3,
+                                    'error': 'Worker stopped while running the job'}
+
+
+def test_only_finished_jobs_expire(make_queue, store, clock):
+    queue = make_queue(lambda params, data: 'done')
+    finished = queue.submit('form', {})
+    run_next(queue, clock)
+    waiting = queue.submit('form', {}, b'upload')
+    running = queue.submit('form', {}, b'upload')
+    store.update(running, status=RUNNING, run_after=clock.time() + 10 ** 6)
+
+    clock.advance(101)
+    store.purge(clock.time())
+    assert queue.status(finished) is None
+    assert queue.status(waiting)['status'] == QUEUED
+    assert queue.status(running)['status'] == RUNNING
+    assert len(os.listdir(queue.spool_dir)) == 2
+
+    run_next(queue, clock)
+    clock.advance(99)
+    store.purge(clock.time())
+    assert queue.status(waiting)['status'] == DONE
+    clock.advance(1)
+    store.purge(clock.time())
+    assert queue.status(waiting) is None
+    assert queue.status(running)['status'] == RUNNING
+
+
+def test_unknown_kind_is_refused(make_queue):
+    with pytest.raises(ValueError):
+        make_queue(lambda params, data: None).submit('ocr', {})
+
+
+class FlakyStore(MemoryJobStore):
+    """Fails its first claim, as SQLite does when the database stays locked."""
+    failed = False
+
+    def claim(self, now, lease):
+        if not self.failed:
+            self.failed = True
+            raise sqlite3.OperationalError('database is locked')
+        return super().claim(now, lease)
+
+
+def test_worker_outlives_a_store_error(tmp_path):
+    done = threading.Event()
+
+    def handler(params, data):
+        done.set()
+        return 'done'
+    queue = JobQueue(FlakyStore(), {'form': handler}, str(tmp_path / 'spool'), workers=1, poll_interval=0.01)
+    try:
+        job_id = queue.submit('form', {})
+        assert done.wait(5)
+    finally:
+        queue.stop(5)
+    assert queue.store.failed
+    assert queue.status(job_id)['status'] == DONE
+
+
+def test_sweep_skips_files_removed_while_it_runs(make_queue, clock, monkeypatch):
+    queue = make_queue(lambda params, data: 'done', sweep_interval=60)
+    for name in ('job-gone.pdf', 'job-orphan.pdf'):
+        with open(os.path.join(queue.spool_dir, name), 'wb') as f:
+            f.write(b'upload')
+    clock.now = time.time() + 3600
+    getmtime = os.path.getmtime
+
+    def racing_getmtime(path):
+        # Another worker removes this job's file between listdir and getmtime
+        if path.endswith('job-gone.pdf'):
+            os.remove(path)
+        return getmtime(path)
+    monkeypatch.setattr(os.path, 'getmtime', racing_getmtime)
+    queue._maybe_sweep()
+    assert os.listdir(queue.spool_dir) == []
@@ -0,0 +1,115 @@
+import pytest
+
+from knowledge import Branch, KnowledgeBase, Scheme, place_key, read_branches, resolve_state
+
+VILLAGES = [
+    ('Uttar Pradesh', 'Sitapur', 'Rampur Kalan'),
+    ('Uttar Pradesh', 'Sitapur', 'Biswan'),
+    ('Uttar Pradesh', 'Rampur', 'Rampur Kalan'),
+    ('Uttar Pradesh', 'Bareilly', 'Nawabganj'),
+    ('Karnataka', 'Mandya', 'Maddur'),
+    ('Karnataka', 'Mysuru', 'Hunsur'),
+]
+SCHEMES = [
+    Scheme('PM-KISAN', 'farming', 'Income support.', None, None),
+    Scheme('Kanya Sumangala', 'girls', 'For daughters.', 'Uttar Pradesh', None),
+    Scheme('Sitapur Dairy', 'dairy', 'Cattle loans.', 'Uttar Pradesh', 'Sitapur'),
+]
+SBI_RAMPUR = Branch('State Bank of India', 'Rampur Kalan', 'SBIN0001234', 'Main Road', '05862 250000', 'yes')
+BOB_BISWAN = Branch('Bank of Baroda', 'Biswan', 'BARB0BISWAN', 'Station Road', '', 'no')
+CANARA_BISWAN = Branch('Canara Bank', 'Biswan', 'CNRB0000555', 'Bazaar', '', '')
+BRANCHES = [
+    ('UP', 'Sitapur', 'Rampur Kalan', SBI_RAMPUR),
+    ('Uttar Pradesh', 'Sitapur District', 'Biswan', BOB_BISWAN),
+    ('Uttar Pradesh', 'Sitapur', 'Biswan', CANARA_BISWAN),
+    ('Karnataka', 'Mandya', 'Mandya Town', Branch('Canara Bank', 'Mandya', 'CNRB0000001', '', '', 'yes')),
+]
+
+
+@pytest.fixture(scope='module')
+def kb():
+    return KnowledgeBase.build(VILLAGES, SCHEMES, BRANCHES)
+
+
+@pytest.mark.parametrize('name, state', [
+    ('uttar pradesh', 'Uttar Pradesh'), ('UP', 'Uttar Pradesh'), ('Orissa', 'Odisha'),
+    ('Karnatka', 'Karnataka'), ('Atlantis', None),
+])
+def test_resolve_state(name, state):
+    assert resolve_state(name) == state
+
+
+def test_place_key_drops_place_words():
+    assert place_key('Vill. Rampur Kalan, Taluk') == 'rampur kalan'
+    assert place_key('Village') == 'village'
+
+
+def test_exact_and_misspelled_villages_match(kb):
+    assert kb.find_villages('UP', 'Biswan')[0][:3] == ('Biswan', 'Sitapur', 'Uttar Pradesh')
+    assert kb.find_villages('Uttar Pradesh', 'village biswaan')[0].village == 'Biswan'
+    assert kb.find_villages('Karnataka', 'Madur')[0].village == 'Maddur'
+    assert kb.find_villages('Uttar Pradesh', 'Maddur') == []
+    assert kb.find_villages('Atlantis', 'Biswan') == []
+
+
+def test_district_picks_between_villages_of_the_same_name(kb):
+    assert {match.district for match in kb.find_villages('UP', 'Rampur Kalan')} == {'Sitapur', 'Rampur'}
+    assert kb.find_villages('UP', 'Rampur Kalan', district='Rampur')[0].district == 'Rampur'
+    # An unknown district does not hide the matches elsewhere
+    assert kb.find_villages('UP', 'Rampur Kalan', district='Agra')
+
+
+def test_sources_spelling_a_district_differently_give_one_village(kb):
+    # The branch list has Biswan in "Sitapur District", the directory in "Sitapur"
+    assert kb.find_villages('UP', 'Biswan') == [('Biswan', 'Sitapur', 'Uttar Pradesh', 1.0)]
+
+
+def test_towns_with_a_branch_can_be_found(kb):
+    assert kb.find_villages('Karnataka', 'Mandya Town')[0].district == 'Mandya'
+
+
+def test_schemes_for_state_and_district(kb):
+    names = lambda schemes: [scheme.name for scheme in schemes]  # noqa: E731
+    assert names(kb.schemes_for('Karnataka')) == ['PM-KISAN']
+    assert names(kb.schemes_for('UP')) == ['PM-KISAN', 'Kanya Sumangala']
+    assert names(kb.schemes_for('UP', 'sitapur')) == ['PM-KISAN', 'Kanya Sumangala', 'Sitapur Dairy']
+
+
+def test_branches_in_the_village_then_the_district(kb):
+    biswan = kb.find_villages('UP', 'Biswan')[0]
+    assert kb.branches_near(biswan) == ([BOB_BISWAN, CANARA_BISWAN], 'village')
+    # Branches known to have no lockers are left out
+    assert kb.branches_near(biswan, lockers=True) == ([CANARA_BISWAN], 'village')
+    [rampur] = kb.find_villages('UP', 'Rampur Kalan', district='Sitapur', limit=1)
+    assert kb.branches_near(rampur) == ([SBI_RAMPUR], 'village')
+    [other] = kb.find_villages('UP', 'Rampur Kalan', district='Rampur', limit=1)
+    assert kb.branches_near(other) == ([], 'district')
+    nawabganj = kb.find_villages('UP', 'Nawabganj')[0]
+    assert kb.branches_near(nawabganj) == ([], 'district')
+
+
+def test_branches_elsewhere_in_the_district(kb):
+    maddur = kb.find_villages('Karnataka', 'Maddur')[0]
+    branches, scope = kb.branches_near(maddur)
+    assert scope == 'district' and [branch.ifsc for branch in branches] == ['CNRB0000001']
+
+
+def test_pack_round_trip(kb, tmp_path):
+    path = str(tmp_path / 'knowledge.npz')
+    kb.save_pack(path)
+    loaded = KnowledgeBase.load_pack(path)
+    assert len(loaded) == len(kb) and loaded.branch_count == kb.branch_count
+    assert loaded.find_villages('UP', 'Biswan') == kb.find_villages('UP', 'Biswan')
+    biswan = loaded.find_villages('UP', 'Biswan')[0]
+    assert loaded.branches_near(biswan, lockers=True) == ([CANARA_BISWAN], 'village')
+    assert loaded.schemes == kb.schemes
+
+
+def test_rbi_ifsc_columns_are_read(tmp_path):
+    path = tmp_path / 'branches.csv'
+    path.write_text('﻿BANK,IFSC,BRANCH,CENTRE,DISTRICT,STATE,ADDRESS,CONTACT,CITY\n'
+                    'State Bank of India,sbin0001234,Rampur Kalan,Rampur Kalan,Sitapur,Uttar Pradesh,Main Road,'
+                    '05862 250000,Sitapur\n', encoding='utf-8')
+    [(state, district, village, branch)] = read_branches(str(path))
+    assert (state, district, village) == ('Uttar Pradesh', 'Sitapur', 'Rampur Kalan')
+    assert branch == SBI_RAMPUR._replace(locker='')
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import llm
+import upstream
+from llm import DEFAULT_PROFILE, LONG_PROFILE, ModelRegistry, StubBackend, create_backend
+
+INSTRUCTIONS = {'en-US': 'Answer in English.', 'hi-IN': 'Answer in Hindi.'}
+
+
+class FakeGenai:
+    """Stands in for google.generativeai, counting the models built."""
+
+    def __init__(self):
+        self.built = []
+        self.types = SimpleNamespace(GenerationConfig=lambda **config: config)
+
+    def GenerativeModel(self, model_name, generation_config, system_instruction=None):
+        self.built.append((model_name, generation_config, system_instruction))
+        return SimpleNamespace(model_name=model_name, config=generation_config, instruction=system_instruction)
+
+
+@pytest.fixture
+def genai(monkeypatch):
+    genai = FakeGenai()
+    monkeypatch.setattr(llm, 'load_genai', lambda: genai)
+    return genai
+
+
+@pytest.fixture
+def registry():
+    registry = ModelRegistry()
+    registry.register('chat', INSTRUCTIONS)
+    registry.register('form', profile=LONG_PROFILE)
+    return registry
+
+
+def test_model_is_built_once_per_feature_and_language(registry, genai):
+    first = registry.get('chat', 'hi-IN')
+    assert registry.get('chat', 'hi-IN') is first
+    assert first.instruction == 'Answer in Hindi.'
+    assert len(genai.built) == 1
+
+
+def test_unsupported_language_shares_the_english_model(registry, genai):
+    assert registry.get('chat', 'xx-XX') is registry.get('chat', 'en-US')
+    assert registry.resolve_language('chat', 'xx-XX') == 'en-US'
+    assert len(genai.built) == 1
+
+
+def test_feature_without_instructions_has_one_model(registry, genai):
+    assert registry.get('form', 'hi-IN') is registry.get('form', 'en-US')
+    assert registry.instruction('form', 'hi-IN') is None
+    assert genai.built == [('gemini-2.0-flash', {'temperature': 0.5, 'max_output_tokens': 2000}, None)]
+
+
+def test_profile_override_gets_its_own_model(registry, genai):
+    default = registry.get('chat')
+    lite = registry.get('chat', profile=DEFAULT_PROFILE._replace(model_name='gemini-2.0-flash-lite'))
+    assert lite is not default
+    assert lite.model_name == 'gemini-2.0-flash-lite'
+
+
+def test_concurrent_gets_build_one_model(registry, genai):
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(registry.get('chat', 'hi-IN'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(genai.built) == 1
+    assert all(model is models[0] for model in models)
+
+
+def test_warm_builds_every_feature_and_language(registry, genai):
+    assert registry.warm() == 3
+    registry.clear()
+    registry.get('chat')
+    assert len(genai.built) == 4
+
+
+def test_unknown_feature_is_refused(registry):
+    with pytest.raises(KeyError):
+        registry.get('weather')
+
+
+def stub(registry, **options):
+    return StubBackend(registry, **{'latency': 0, **options})
+
+
+def test_stub_answer_depends_only_on_the_call(registry):
+    first = stub(registry).generate('chat', 'en-US', 'Hello')
+    assert stub(registry, seed=7).generate('chat', 'en-US', 'Hello') == first
+    assert stub(registry).generate('chat', 'hi-IN', 'Hello') != first
+    assert first.output_tokens == len(first.text.split())
+
+
+def test_stub_answer_is_cut_to_the_profile_budget(registry):
+    completion = stub(registry).generate('chat', 'en-US', 'Hello', DEFAULT_PROFILE._replace(max_output_tokens=5))
+    assert completion.output_tokens == 5
+
+
+def test_stub_stream_and_async_match_generate(registry):
+    backend = stub(registry)
+    text = backend.generate('chat', 'en-US', 'Hello').text
+
+    async def run():
+        chunks = [chunk async for chunk in backend.stream_async('chat', 'en-US', 'Hello')]
+        return (await backend.generate_async('chat', 'en-US', 'Hello')).text, ''.join(chunks)
+
+    assert ''.join(backend.stream('chat', 'en-US', 'Hello')).strip() == text
+    assert asyncio.run(run()) == (text, text + ' ')
+
+
+def test_stub_waits_per_model_and_per_token(registry, clock, monkeypatch):
+    monkeypatch.setattr(llm, 'time', clock)
+    lite = DEFAULT_PROFILE._replace(model_name='gemini-2.0-flash-lite')
+    backend = stub(registry, latency=1.0, tokens_per_second=100, model_latency={'gemini-2.0-flash-lite': 0.25})
+    started = clock.now
+    completion = backend.generate('chat', 'en-US', 'Hello', lite)
+    assert clock.now - started == pytest.approx(0.25 + completion.output_tokens / 100)
+
+
+def test_stub_fails_a_repeatable_fraction_of_calls(registry):
+    def failures(seed):
+        backend = stub(registry, error_rate=0.3, seed=seed)
+        outcomes = []
+        for _ in range(200):
+            try:
+                backend.generate('chat', 'en-US', 'Hello')
+                outcomes.append(False)
+            except upstream.ServiceUnavailable:
+                outcomes.append(True)
+        return outcomes
+
+    assert failures(1) == failures(1)
+    assert 40 < sum(failures(1)) < 80
+
+
+def test_unknown_backend_is_refused(registry):
+    with pytest.raises(ValueError):
+        create_backend('openai', registry)
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+import metrics
+from metrics import Counter, Histogram
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, 'REGISTRY', [])
+    return metrics.REGISTRY
+
+
+def test_counter_renders_each_label_set(registry):
+    counter = Counter('test_calls_total', 'Calls.', ['route'])
+    counter.inc(route='/b')
+    counter.inc(2, route='/a')
+    counter.inc(route='/a')
+    assert counter.value(route='/a') == 3
+    assert metrics.render() == ('# HELP test_calls_total Calls.\n# TYPE test_calls_total counter\n'
+                                'test_calls_total{route="/a"} 3\ntest_calls_total{route="/b"} 1\n')
+
+
+def test_label_values_are_escaped(registry):
+    counter = Counter('test_escaped_total', 'Escaped.', ['route'])
+    counter.inc(route='say "hi"\n')
+    assert 'test_escaped_total{route="say \\"hi\\"\\n"} 1' in metrics.render()
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = Histogram('test_seconds', 'Seconds.', buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value)
+    lines = metrics.render().splitlines()
+    assert lines[2:] == ['test_seconds_bucket{le="0.1"} 1', 'test_seconds_bucket{le="1"} 2',
+                         'test_seconds_bucket{le="+Inf"} 3', 'test_seconds_sum 5.55', 'test_seconds_count 3']
+
+
+def test_request_records_its_phases_tokens_and_language():
+    token = metrics.start_request('/test-request')
+    metrics.set_language('hi-IN')
+    with metrics.phase('llm'):
+        metrics.record_tokens(10, 20)
+    metrics.record_cache('response', hit=False)
+    request = metrics.finish_request(token)
+    assert (request.route, request.language, request.status) == ('/test-request', 'hi-IN', 200)
+    assert (request.input_tokens, request.output_tokens) == (10, 20)
+    assert request.cache == {'response': 'miss'}
+    assert 'llm' in request.phases
+    assert metrics.LLM_TOKENS.value(route='/test-request', language='hi-IN', direction='output') == 20
+    assert metrics.current() is None
+
+
+def test_unknown_language_is_labelled_other():
+    token = metrics.start_request('/test-language')
+    metrics.set_language('xx-XX')
+    assert metrics.labels() == {'route': '/test-language', 'language': 'other'}
+    metrics.finish_request(token)
+
+
+def test_first_error_is_the_one_counted():
+    token = metrics.start_request('/test-errors')
+    metrics.record_error('timeout')
+    metrics.record_error('other')
+    metrics.finish_request(token, 503)
+    assert metrics.ERRORS.value(route='/test-errors', language='none', type='timeout') == 1
+    assert metrics.ERRORS.value(route='/test-errors', language='none', type='other') == 0
+
+
+def test_deferred_request_is_recorded_once_its_stream_ends():
+    token = metrics.start_request('/test-stream')
+    request = metrics.finish_request(token, deferred=True)
+    assert request.seconds is None
+    with metrics.resumed(request):
+        metrics.record_tokens(1, 5)
+    metrics.record_request(request)
+    assert request.output_tokens == 5
+    assert request.seconds is not None
+
+
+def test_concurrent_tasks_keep_their_own_requests():
+    async def serve(route):
+        token = metrics.start_request(route)
+        await asyncio.sleep(0)
+        metrics.record_tokens(1, len(route))
+        return metrics.finish_request(token)
+
+    async def run():
+        return await asyncio.gather(serve('/test-a'), serve('/test-bb'))
+
+    first, second = asyncio.run(run())
+    assert (first.route, first.output_tokens) == ('/test-a', 7)
+    assert (second.route, second.output_tokens) == ('/test-bb', 8)
+
+
+def test_outside_a_request_labels_are_none():
+    assert metrics.labels() == {'route': 'none', 'language': 'none'}
+    with metrics.phase('llm'):
+        pass
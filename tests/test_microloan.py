@@ -0,0 +1,78 @@
+import pytest
+
+from microloan import InvalidAnswers, assess, explain, parse_answers, parse_query, read_batch, score_batch
+
+GOOD = {'owns_asset': 'yes', 'steady_income': 'yes', 'existing_loans': 'no', 'dependents': '3',
+        'bank_account': 'yes', 'monthly_earnings': '12,000 rupees', 'job': 'farmer', 'purpose': 'buy seeds'}
+
+
+def test_parse_answers_accepts_form_names():
+    answers = parse_answers({'q1': 'haan', 'q2': True, 'q3': 'nahi', 'q4': 2, 'q5': 'Y', 'q6': '8000'})
+    assert answers == {'owns_asset': True, 'steady_income': True, 'existing_loans': False, 'dependents': 2.0,
+                       'bank_account': True, 'monthly_earnings': 8000.0, 'job': '', 'purpose': ''}
+
+
+@pytest.mark.parametrize('change, message', [
+    ({'dependents': ''}, 'Missing answers: dependents'),
+    ({'owns_asset': 'maybe'}, 'owns_asset must be yes or no'),
+    ({'monthly_earnings': 'lots'}, 'monthly_earnings must be a number'),
+    ({'dependents': '-1'}, 'dependents must be a non-negative number'),
+    ({'monthly_earnings': 'nan'}, 'monthly_earnings must be a non-negative number'),
+])
+def test_parse_answers_rejects(change, message):
+    with pytest.raises(InvalidAnswers, match=message):
+        parse_answers(dict(GOOD, **change))
+
+
+@pytest.mark.parametrize('change, verdict, reasons', [
+    ({}, 'Eligible', ['steady_income', 'owns_asset', 'clear_purpose']),
+    ({'monthly_earnings': '3000'}, 'Possibly Eligible', ['low_earnings', 'steady_income', 'owns_asset', 'clear_purpose']),
+    ({'monthly_earnings': '3000', 'purpose': ''}, 'Not Eligible',
+     ['low_earnings', 'no_purpose', 'steady_income', 'owns_asset']),
+    ({'dependents': '8', 'existing_loans': 'yes', 'steady_income': 'no'}, 'Not Eligible',
+     ['large_family_with_loans', 'no_steady_income', 'owns_asset', 'clear_purpose']),
+    ({'existing_loans': 'yes', 'owns_asset': 'no', 'bank_account': 'no'}, 'Possibly Eligible',
+     ['existing_loans', 'no_bank_account', 'steady_income', 'clear_purpose']),
+])
+def test_assess(change, verdict, reasons):
+    assessment = assess(parse_answers(dict(GOOD, **change)))
+    assert assessment.verdict == verdict
+    assert assessment.reasons == reasons
+
+
+def test_explain():
+    text = explain(assess(parse_answers(GOOD)))
+    assert text.splitlines()[0] == 'Estimate: Eligible'
+    assert len(text.splitlines()) == 4 and all(line.startswith('- ') for line in text.splitlines()[1:])
+
+
+def test_parse_query():
+    query = ("Microloan questionnaire:\n- Owns land or business: yes\n- Steady income: no\n- Existing loans: no\n"
+             "- Dependents: 4\n- Has bank account: yes\n- Monthly earnings: 6000\n- Job: tailor\n- Loan purpose: \n")
+    answers = parse_query(query)
+    assert answers['steady_income'] is False and answers['monthly_earnings'] == 6000.0
+    assert answers['job'] == 'tailor' and answers['purpose'] == ''
+    assert parse_query('How do I get a loan?') is None
+
+
+def test_batch_keeps_invalid_rows_in_place():
+    body = ('id,owns_asset,steady_income,existing_loans,dependents,bank_account,monthly_earnings,purpose\n'
+            'a,yes,yes,no,2,yes,9000,cow\n'
+            'b,yes,yes,no,2,yes,,cow\n'
+            'c,no,no,no,2,no,1000,\n')
+    results = list(score_batch(list(read_batch(body.encode('utf-8-sig'), 'text/csv'))))
+    assert [result['id'] for result in results] == ['a', 'b', 'c']
+    assert results[0]['verdict'] == 'Eligible'
+    assert results[1] == {'id': 'b', 'error': 'Missing answers: monthly_earnings'}
+    assert results[2]['verdict'] == 'Not Eligible'
+
+
+def test_jsonl_batch_with_a_broken_line():
+    body = '{"id": 7, "q1": "yes", "q2": "yes", "q3": "no", "q4": 1, "q5": "yes", "q6": 20000}\nnot json\n'
+    results = list(score_batch(list(read_batch(body, 'application/jsonl'))))
+    assert results[0]['id'] == 7 and results[0]['verdict'] == 'Eligible'
+    assert results[1] == {'id': 1, 'error': 'Each line must be a JSON object'}
+
+
+def test_batch_of_only_invalid_rows():
+    assert list(score_batch([(0, InvalidAnswers('bad'))])) == [{'id': 0, 'error': 'bad'}]
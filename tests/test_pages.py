@@ -0,0 +1,85 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+import pages
+from pages import PageStore
+
+PAGE = '<html><body>' + 'Open a savings account at your nearest branch. ' * 40 + '</body></html>'
+
+
+@pytest.fixture
+def store():
+    store = PageStore()
+    store.add('index.html', PAGE, 'text/html', 'public, max-age=300')
+    store.add('small.css', 'body{}', 'text/css', 'public, max-age=31536000, immutable')
+    return store
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def get(app, store, key, **headers):
+    with app.test_request_context('/', headers=headers):
+        return store.response(key)
+
+
+def test_unknown_key_has_no_response(app, store):
+    assert get(app, store, 'missing.html') is None
+
+
+def test_page_is_served_with_its_etag_and_cache_headers(app, store):
+    response = get(app, store, 'index.html')
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == PAGE
+    assert response.headers['ETag'] == f'"{store.digest("index.html")}"'
+    assert response.headers['Cache-Control'] == 'public, max-age=300'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_gzip_is_served_when_accepted(app, store, monkeypatch):
+    monkeypatch.setattr(pages, 'brotli', None)
+    store.add('index.html', PAGE, 'text/html', 'public, max-age=300')
+    response = get(app, store, 'index.html', **{'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.get_data()).decode() == PAGE
+    assert response.headers['ETag'] == f'"{store.digest("index.html")}-gzip"'
+
+
+def test_matching_etag_gets_an_empty_304(app, store):
+    etag = get(app, store, 'index.html').headers['ETag']
+    response = get(app, store, 'index.html', **{'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == etag
+    assert response.headers['Cache-Control'] == 'public, max-age=300'
+
+
+def test_etag_of_another_encoding_does_not_match(app, store):
+    etag = get(app, store, 'index.html', **{'Accept-Encoding': 'gzip'}).headers['ETag']
+    response = get(app, store, 'index.html', **{'If-None-Match': etag})
+    assert response.status_code == 200
+
+
+def test_weak_etag_from_a_proxy_still_matches(app, store):
+    response = get(app, store, 'index.html', **{'If-None-Match': f'W/"{store.digest("index.html")}"'})
+    assert response.status_code == 304
+
+
+def test_changed_page_gets_a_new_etag(app, store):
+    old = store.digest('index.html')
+    store.add('index.html', PAGE + '<!-- v2 -->', 'text/html', 'public, max-age=300')
+    assert store.digest('index.html') != old
+    response = get(app, store, 'index.html', **{'If-None-Match': f'"{old}"'})
+    assert response.status_code == 200
+
+
+def test_small_bodies_are_not_compressed(app, store):
+    assert store.size('small.css', 'gzip') == 0
+    response = get(app, store, 'small.css', **{'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data() == b'body{}'
@@ -0,0 +1,54 @@
+import pytest
+
+import prompts
+from prompts import LANGUAGES, SYSTEM_INSTRUCTIONS, TEMPLATES, render, state_language
+
+
+def test_every_template_is_compiled_for_every_language():
+    features = {feature for feature, _ in TEMPLATES}
+    assert {(feature, language) for feature in features for language in LANGUAGES} == set(TEMPLATES)
+    assert all(set(table) == set(LANGUAGES) for table in SYSTEM_INSTRUCTIONS.values())
+
+
+def test_render_fills_in_the_language_and_fields():
+    prompt = render('schemes', 'hi-IN', village='Rampur', state='Bihar')
+    assert 'village/town Rampur in the state Bihar' in prompt
+    assert 'Respond in hi-IN.' in prompt
+
+
+def test_unsupported_language_renders_in_english():
+    fields = {'village': 'Rampur', 'state': 'Bihar'}
+    assert render('schemes', 'fr-FR', **fields) == render('schemes', 'en-US', **fields)
+
+
+def test_prompt_instruction_is_filled_in_per_language():
+    english = render('locker', 'en-US', village='Rampur', state='Bihar')
+    kannada = render('locker', 'kn-IN', village='Rampur', state='Bihar')
+    assert english.startswith(prompts.locker_instructions['en-US'])
+    assert kannada.startswith(prompts.locker_instructions['kn-IN'])
+
+
+def test_braces_in_a_translation_survive_rendering(monkeypatch):
+    instructions = {**prompts.locker_instructions, 'en-US': 'Use {curly} braces.'}
+    monkeypatch.setitem(prompts._PROMPT_INSTRUCTIONS, 'locker', instructions)
+    _, templates = prompts._compile()
+    assert templates[('locker', 'en-US')].format(village='Rampur', state='Bihar').startswith('Use {curly} braces.')
+
+
+def test_missing_translation_fails_the_compile(monkeypatch):
+    incomplete = {language: text for language, text in prompts.chat_instructions.items() if language != 'ta-IN'}
+    monkeypatch.setitem(prompts._SYSTEM_INSTRUCTIONS, 'chat', incomplete)
+    with pytest.raises(ValueError, match='chat/ta-IN'):
+        prompts._compile()
+
+
+def test_tables_are_read_only():
+    with pytest.raises(TypeError):
+        TEMPLATES[('chat', 'en-US')] = 'changed'
+    with pytest.raises(TypeError):
+        SYSTEM_INSTRUCTIONS['chat']['en-US'] = 'changed'
+
+
+def test_state_language_defaults_to_english():
+    assert state_language(' Karnataka ') == 'kn-IN'
+    assert state_language('Goa') == 'en-US'
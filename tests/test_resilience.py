@@ -0,0 +1,204 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from google.api_core.exceptions import InvalidArgument, ServiceUnavailable
+
+import resilience
+from llm import Completion, LLMBackend, ModelRegistry
+from resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, ResilientBackend, Saturated
+
+
+@pytest.fixture
+def breaker(clock, monkeypatch):
+    monkeypatch.setattr(resilience, 'time', clock)
+    return CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+
+def test_breaker_opens_after_consecutive_failures(breaker):
+    for _ in range(2):
+        breaker.before_call()
+        breaker.failure()
+    assert breaker.state == 'closed'
+    breaker.success()
+    for _ in range(3):
+        breaker.before_call()
+        breaker.failure()
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+
+def test_half_open_breaker_lets_one_probe_through(breaker, clock):
+    for _ in range(3):
+        breaker.failure()
+    clock.advance(30)
+    assert breaker.state == 'half_open'
+    breaker.before_call()
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+
+def test_failed_probe_reopens_the_breaker(breaker, clock):
+    for _ in range(3):
+        breaker.failure()
+    clock.advance(30)
+    breaker.before_call()
+    breaker.failure()
+    assert breaker.state == 'open'
+    clock.advance(29)
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+
+def test_successful_probe_closes_the_breaker(breaker, clock):
+    for _ in range(3):
+        breaker.failure()
+    clock.advance(30)
+    breaker.before_call()
+    breaker.success()
+    assert breaker.state == 'closed'
+    breaker.before_call()
+    breaker.before_call()
+
+
+class ScriptedBackend(LLMBackend):
+    """Raises or answers in turn from outcomes; waits on block first, if given."""
+
+    def __init__(self, outcomes, block=None):
+        super().__init__(ModelRegistry())
+        self.outcomes = list(outcomes)
+        self.block = block
+        self.calls = 0
+
+    def generate(self, feature, language, prompt, profile=None):
+        self.calls += 1
+        if self.block is not None:
+            self.block.wait(5)
+        outcome = self.outcomes.pop(0) if self.outcomes else 'ok'
+        if isinstance(outcome, Exception):
+            raise outcome
+        return Completion(outcome, 1, 1)
+
+
+def test_transient_errors_are_retried():
+    backend = ScriptedBackend([ServiceUnavailable('down'), ServiceUnavailable('down'), 'answer'])
+    llm = ResilientBackend(backend, retries=2, backoff=0)
+    assert llm.generate('chat', 'en-US', 'q').text == 'answer'
+    assert backend.calls == 3
+    assert llm.breaker.state == 'closed'
+
+
+def test_retries_stop_at_the_limit():
+    backend = ScriptedBackend([ServiceUnavailable('down')] * 5)
+    llm = ResilientBackend(backend, retries=2, backoff=0)
+    with pytest.raises(ServiceUnavailable):
+        llm.generate('chat', 'en-US', 'q')
+    assert backend.calls == 3
+
+
+def test_other_errors_are_not_retried_and_do_not_trip_the_breaker():
+    backend = ScriptedBackend([InvalidArgument('bad prompt')])
+    llm = ResilientBackend(backend, retries=2, backoff=0, breaker=CircuitBreaker(failure_threshold=1))
+    with pytest.raises(InvalidArgument):
+        llm.generate('chat', 'en-US', 'q')
+    assert backend.calls == 1
+    assert llm.breaker.state == 'closed'
+
+
+def test_open_breaker_refuses_without_calling_upstream():
+    backend = ScriptedBackend([ServiceUnavailable('down')])
+    llm = ResilientBackend(backend, retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    with pytest.raises(ServiceUnavailable):
+        llm.generate('chat', 'en-US', 'q')
+    with pytest.raises(CircuitOpen):
+        llm.generate('chat', 'en-US', 'q')
+    assert backend.calls == 1
+
+
+def test_slow_call_fails_at_its_deadline_and_a_full_pool_fails_fast():
+    block = threading.Event()
+    backend = ScriptedBackend([], block=block)
+    llm = ResilientBackend(backend, deadlines={'default': 0.05}, retries=0, workers=1)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            llm.generate('chat', 'en-US', 'q')
+        # The abandoned attempt still holds the only thread
+        with pytest.raises(Saturated):
+            llm.generate('chat', 'en-US', 'q')
+        assert backend.calls == 1
+    finally:
+        block.set()
+    llm._pool.shutdown(wait=True)
+    assert llm._busy == 0
+
+
+def test_no_retry_is_started_without_a_free_thread():
+    block = threading.Event()
+    backend = ScriptedBackend([], block=block)
+    llm = ResilientBackend(backend, deadlines={'default': 0.05}, retries=3, backoff=0, workers=2)
+    # One thread is already taken by another caller's stuck attempt
+    llm._submit(block.wait, 5)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            llm.generate('chat', 'en-US', 'q')
+        assert backend.calls == 1
+    finally:
+        block.set()
+    llm._pool.shutdown(wait=True)
+
+
+def wait_idle(llm):
+    # The pool frees a thread in a done callback, just after the result is set
+    for _ in range(100):
+        if llm._busy == 0:
+            return
+        time.sleep(0.01)
+
+
+def test_probe_refused_by_a_full_pool_does_not_wedge_the_breaker():
+    block = threading.Event()
+    backend = ScriptedBackend([ServiceUnavailable('down')])
+    llm = ResilientBackend(backend, retries=0, workers=1, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+    with pytest.raises(ServiceUnavailable):
+        llm.generate('chat', 'en-US', 'q')
+    stuck = llm._submit(block.wait, 5)
+    with pytest.raises(Saturated):
+        llm.generate('chat', 'en-US', 'q')
+    assert not llm.breaker._probing
+    block.set()
+    stuck.result()
+    wait_idle(llm)
+    assert llm.generate('chat', 'en-US', 'q').text == 'ok'
+    assert llm.breaker.state == 'closed'
+    assert backend.calls == 2
+
+
+class HangingBackend(ScriptedBackend):
+    """Hangs on its second call, until cancelled."""
+    hung = False
+
+    async def generate_async(self, feature, language, prompt, profile=None):
+        if self.calls == 1 and not self.hung:
+            self.hung = True
+            await asyncio.sleep(60)
+        return self.generate(feature, language, prompt, profile)
+
+
+def test_cancelled_async_probe_frees_the_probe_slot():
+    backend = HangingBackend([ServiceUnavailable('down')])
+    llm = ResilientBackend(backend, retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+
+    async def scenario():
+        with pytest.raises(ServiceUnavailable):
+            await llm.generate_async('chat', 'en-US', 'q')
+        probe = asyncio.ensure_future(llm.generate_async('chat', 'en-US', 'q'))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return await llm.generate_async('chat', 'en-US', 'q')
+
+    assert asyncio.run(scenario()).text == 'ok'
+    assert llm.breaker.state == 'closed'
@@ -0,0 +1,89 @@
+import pytest
+
+from llm import LONG_PROFILE, ModelRegistry
+from router import ModelRouter
+
+CONFIG = {
+    'profiles': {
+        'lite': {'model_name': 'gemini-2.0-flash-lite', 'temperature': 0.3, 'max_output_tokens': 600},
+        'standard': {'model_name': 'gemini-2.0-flash', 'temperature': 0.5, 'max_output_tokens': 1000},
+    },
+    'features': {
+        'default': {'profile': 'standard', 'light_profile': 'lite', 'light_max_input_tokens': 40},
+        'form': {'profile': None, 'light_profile': None},
+    },
+    'routes': {'/insurance_chat': {'light_profile': None}},
+}
+
+SHORT = 'How do I open an account?'
+LONG = 'Please explain every step of opening a savings account at a rural branch. ' * 20
+
+
+@pytest.fixture
+def router():
+    registry = ModelRegistry()
+    registry.register('chat')
+    registry.register('form', profile=LONG_PROFILE)
+    return ModelRouter(registry, CONFIG, max_error_rate=0.2, min_samples=5, probe_every=4)
+
+
+def test_short_input_goes_to_the_light_profile(router):
+    choice = router.choose('chat', '/chat', SHORT)
+    assert (choice.name, choice.reason) == ('lite', 'short_input')
+    assert choice.profile.model_name == 'gemini-2.0-flash-lite'
+
+
+def test_long_input_keeps_the_main_profile(router):
+    choice = router.choose('chat', '/chat', LONG)
+    assert (choice.name, choice.reason) == ('standard', 'default')
+    assert choice.profile.max_output_tokens == 1000
+
+
+def test_feature_without_a_profile_keeps_its_registered_one(router):
+    choice = router.choose('form', '/upload_form', SHORT)
+    assert (choice.name, choice.reason) == ('default', 'default')
+    assert choice.profile == LONG_PROFILE
+
+
+def test_route_entry_overrides_the_feature(router):
+    choice = router.choose('chat', '/insurance_chat', SHORT)
+    assert choice.name == 'standard'
+
+
+def test_failing_light_profile_is_skipped_but_probed(router):
+    light = router.choose('chat', '/chat', SHORT)
+    for _ in range(5):
+        router.observe(light, 0.1, ok=False)
+    reasons = [router.choose('chat', '/chat', SHORT).reason for _ in range(8)]
+    assert reasons == ['light_unhealthy'] * 3 + ['probe'] + ['light_unhealthy'] * 3 + ['probe']
+
+
+def test_slower_light_profile_is_skipped(router):
+    light = router.choose('chat', '/chat', SHORT)
+    main = router.choose('chat', '/chat', LONG)
+    for _ in range(5):
+        router.observe(light, 2.0)
+        router.observe(main, 0.5)
+    assert router.choose('chat', '/chat', SHORT).reason == 'light_unhealthy'
+
+
+def test_faster_light_profile_is_kept(router):
+    light = router.choose('chat', '/chat', SHORT)
+    main = router.choose('chat', '/chat', LONG)
+    for _ in range(5):
+        router.observe(light, 0.2)
+        router.observe(main, 0.5)
+    assert router.choose('chat', '/chat', SHORT).reason == 'short_input'
+
+
+def test_timed_records_a_failure(router):
+    choice = router.choose('chat', '/chat', SHORT)
+    with pytest.raises(RuntimeError):
+        with router.timed(choice):
+            raise RuntimeError("upstream failed")
+    assert router.stats('chat', 'lite').snapshot()['error_rate'] == 1.0
+
+
+def test_unknown_profile_is_refused():
+    with pytest.raises(ValueError, match='nope'):
+        ModelRouter(ModelRegistry(), {'features': {'chat': {'light_profile': 'nope'}}})
@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import sessions
+from sessions import ChatSessions, MemoryStore, SQLiteStore, create_session_store, format_turns
+
+# 20 tokens each, so one exchange is 40 of a 100-token budget
+MESSAGE = 'a' * 80
+
+
+def summarize(summary, turns):
+    return f"{summary}+{len(turns)}"
+
+
+def test_new_session_has_no_context():
+    assert ChatSessions(MemoryStore()).context('s') == ('', [])
+
+
+def test_turns_are_recorded_in_order():
+    chats = ChatSessions(MemoryStore())
+    chats.record('s', 'Hello', 'Hi, how can I help?')
+    chats.record('s', 'Open an account', 'Bring your Aadhaar card.')
+    summary, turns = chats.context('s')
+    assert summary == ''
+    assert [role for role, _ in turns] == ['user', 'assistant', 'user', 'assistant']
+    assert format_turns(turns[:2]) == 'User: Hello\nAssistant: Hi, how can I help?'
+
+
+def test_old_turns_are_folded_into_the_summary():
+    chats = ChatSessions(MemoryStore(), token_budget=100, summarize=summarize)
+    for _ in range(3):
+        chats.record('s', MESSAGE, MESSAGE)
+    summary, turns = chats.context('s')
+    assert summary == '+4'
+    assert len(turns) == 2
+
+
+def test_summary_builds_on_the_previous_one():
+    chats = ChatSessions(MemoryStore(), token_budget=100, summarize=summarize)
+    for _ in range(5):
+        chats.record('s', MESSAGE, MESSAGE)
+    summary, turns = chats.context('s')
+    assert summary == '+4+4'
+    assert len(turns) == 2
+
+
+def test_failed_summary_drops_the_old_turns():
+    def failing(summary, turns):
+        raise RuntimeError("model unavailable")
+
+    chats = ChatSessions(MemoryStore(), token_budget=100, summarize=failing)
+    for _ in range(3):
+        chats.record('s', MESSAGE, MESSAGE)
+    assert chats.context('s') == ('', [['user', MESSAGE], ['assistant', MESSAGE]])
+
+
+def test_summary_is_cut_to_its_budget():
+    chats = ChatSessions(MemoryStore(), token_budget=100, summary_tokens=5, summarize=lambda summary, turns: 'word ' * 50)
+    for _ in range(3):
+        chats.record('s', MESSAGE, MESSAGE)
+    summary, _ = chats.context('s')
+    assert sessions.estimate_tokens(summary) <= 5
+
+
+def test_context_stays_within_budget_while_compaction_is_pending():
+    store = MemoryStore()
+    store.put('s', {'summary': '', 'turns': [['user', MESSAGE], ['assistant', MESSAGE]] * 4})
+    _, turns = ChatSessions(store, token_budget=100).context('s')
+    assert len(turns) == 5
+    assert sum(sessions.estimate_tokens(text) for _, text in turns) <= 100
+
+
+def test_long_message_is_truncated_to_half_the_budget():
+    chats = ChatSessions(MemoryStore(), token_budget=100)
+    chats.record('s', 'word ' * 500, 'ok')
+    _, turns = chats.context('s')
+    assert sessions.estimate_tokens(turns[0][1]) <= 50
+
+
+def test_compaction_runs_on_the_executor():
+    with ThreadPoolExecutor(1) as executor:
+        chats = ChatSessions(MemoryStore(), token_budget=100, summarize=summarize, executor=executor)
+        for _ in range(3):
+            chats.record('s', MESSAGE, MESSAGE)
+    summary, turns = chats.context('s')
+    assert summary == '+4'
+    assert len(turns) == 2
+
+
+def test_sessions_expire_when_idle(clock, monkeypatch):
+    monkeypatch.setattr(sessions, 'time', clock)
+    store = MemoryStore(idle_timeout=60)
+    store.put('s', {'summary': '', 'turns': []})
+    clock.advance(59)
+    assert store.get('s') is not None
+    clock.advance(61)
+    assert store.get('s') is None
+
+
+def test_least_recently_used_session_is_evicted():
+    store = MemoryStore(max_sessions=2)
+    for session_id in ('a', 'b', 'c'):
+        store.put(session_id, {'summary': '', 'turns': []})
+    assert store.get('a') is None
+    assert len(store) == 2
+
+
+def test_sqlite_sessions_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'sessions.sqlite3')
+    ChatSessions(SQLiteStore(path)).record('s', 'Hello', 'Namaste')
+    assert ChatSessions(SQLiteStore(path)).context('s') == ('', [['user', 'Hello'], ['assistant', 'Namaste']])
+
+
+def test_unknown_backend_is_refused():
+    with pytest.raises(ValueError):
+        create_session_store('redis')
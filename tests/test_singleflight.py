@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def run_follower(flight, key, fn):
+    outcome = {}
+
+    def follow():
+        try:
+            outcome['result'] = flight.do(key, fn)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=follow)
+    thread.start()
+    return thread, outcome
+
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def leader():
+        calls.append('leader')
+        release.wait(5)
+        return 'answer'
+
+    thread = threading.Thread(target=flight.do, args=('k', leader))
+    thread.start()
+    wait_for(lambda: calls)
+    follower, outcome = run_follower(flight, 'k', lambda: calls.append('follower'))
+    wait_for(lambda: flight.coalesced == 1)
+    release.set()
+    thread.join()
+    follower.join()
+    assert outcome['result'] == ('answer', True)
+    assert calls == ['leader']
+
+
+def test_leaders_exception_reaches_every_follower():
+    flight = SingleFlight()
+    release = threading.Event()
+    started = threading.Event()
+
+    def leader():
+        started.set()
+        release.wait(5)
+        raise ValueError('upstream failed')
+
+    leader_outcome = {}
+
+    def lead():
+        try:
+            flight.do('k', leader)
+        except ValueError as e:
+            leader_outcome['error'] = e
+
+    thread = threading.Thread(target=lead)
+    thread.start()
+    started.wait(5)
+    followers = [run_follower(flight, 'k', lambda: 'not called') for _ in range(3)]
+    wait_for(lambda: flight.coalesced == 3)
+    release.set()
+    thread.join()
+    for follower, outcome in followers:
+        follower.join()
+        assert outcome['error'] is leader_outcome['error']
+
+
+def test_key_is_released_after_a_failure():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        flight.do('k', fail)
+    assert flight.do('k', lambda: 'retried') == ('retried', False)
+    assert flight.leaders == 2
+
+
+def test_async_followers_get_the_leaders_exception():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def leader():
+            await release.wait()
+            raise ValueError('upstream failed')
+
+        async def follower():
+            return 'not called'
+
+        tasks = [asyncio.ensure_future(flight.do_async('k', leader))]
+        await asyncio.sleep(0)
+        tasks += [asyncio.ensure_future(flight.do_async('k', follower)) for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True), flight
+
+    results, flight = asyncio.run(scenario())
+    assert [type(result) for result in results] == [ValueError] * 3
+    assert flight.coalesced == 2
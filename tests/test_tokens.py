@@ -0,0 +1,56 @@
+from tokens import estimate_tokens, split_fields, truncate_tokens
+
+
+def test_latin_text_is_about_four_characters_a_token():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('abcd') == 1
+    assert estimate_tokens('abcde') == 2
+    assert estimate_tokens('a' * 400) == 100
+
+
+def test_indic_text_is_about_two_characters_a_token():
+    assert estimate_tokens('नमस्ते') == 3
+    assert estimate_tokens('bank बैंक') == 4
+
+
+def test_truncate_keeps_short_text():
+    assert truncate_tokens('Open an account', 10) == 'Open an account'
+
+
+def test_truncate_cuts_at_a_word_boundary():
+    text = 'savings ' * 100
+    cut = truncate_tokens(text, 20)
+    assert estimate_tokens(cut) <= 20
+    assert cut.endswith('savings')
+    assert text.startswith(cut)
+
+
+def test_truncate_cuts_text_without_spaces():
+    cut = truncate_tokens('x' * 1000, 10)
+    assert cut == 'x' * 40
+
+
+def test_split_keeps_lines_within_the_budget():
+    text = '\n'.join(f"Field {n}: ________" for n in range(100))
+    chunks = split_fields(text, 50)
+    assert len(chunks) > 1
+    assert all(sum(estimate_tokens(line) + 1 for line in chunk.splitlines()) <= 50 for chunk in chunks)
+    assert '\n'.join(chunks) == text
+
+
+def test_split_cuts_an_overlong_line():
+    chunks = split_fields('x' * 1000, 50)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 50 for chunk in chunks)
+    assert ''.join(chunks) == 'x' * 1000
+
+
+def test_split_drops_chunks_without_fields():
+    text = '\n'.join(['Terms and conditions apply. ' * 10] * 3 + ['Account number: ____'])
+    chunks = split_fields(text, 72)
+    assert chunks == ['Account number: ____']
+
+
+def test_split_keeps_everything_when_nothing_looks_like_a_field():
+    text = '\n'.join(['Terms and conditions apply. ' * 10] * 3)
+    assert len(split_fields(text, 72)) == 3
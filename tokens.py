@@ -0,0 +1,60 @@
+"""Token estimates and budget-aware chunking for long prompt inputs.
+
+Counting tokens exactly needs a round trip to the API, so prompts are
+measured locally: roughly four characters per token for Latin text and two
+for Indic scripts, which errs on the high side for Gemini's tokenizer.
+"""
+import re
+
+# Lines that look like form fields: "Name:", "Date ____", "[ ] Savings", "☐ Yes"
+_FIELD_MARKERS = re.compile(r':|_{2,}|\.{4,}|\[\s?\]|[☐☑□]')
+
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ch < '\x80')
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars + 1) // 2
+
+
+def truncate_tokens(text, max_tokens):
+    """text cut down, at a word boundary where possible, to at most max_tokens."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = len(text) * max_tokens // estimate_tokens(text)
+    while cut > 0 and estimate_tokens(text[:cut]) > max_tokens:
+        cut = cut * 9 // 10
+    space = text.rfind(' ', 0, cut)
+    return text[:space if space > cut // 2 else cut].rstrip()
+
+
+def split_fields(text, max_tokens):
+    """Split text on line boundaries into chunks of at most max_tokens.
+
+    Chunks without anything that looks like a form field are dropped, unless
+    that would drop everything.
+    """
+    chunks = []
+    lines = []
+    size = 0
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        tokens = estimate_tokens(line) + 1
+        if lines and size + tokens > max_tokens:
+            chunks.append('\n'.join(lines))
+            lines, size = [], 0
+        # A single overlong line is cut into pieces of the chunk size
+        while tokens > max_tokens:
+            cut = max(len(line) * max_tokens // tokens, 1)
+            chunks.append(line[:cut])
+            line = line[cut:]
+            tokens = estimate_tokens(line) + 1
+        lines.append(line)
+        size += tokens
+    if lines:
+        chunks.append('\n'.join(lines))
+
+    with_fields = [chunk for chunk in chunks if _FIELD_MARKERS.search(chunk)]
+    return with_fields or chunks
@@ -0,0 +1,50 @@
+"""Errors from the Gemini API, loaded on first use.
+
+google.api_core.exceptions imports gRPC and protobuf, which takes about half
+a second, and an app running the stub backend, or one whose calls all
+succeed, never needs it. So modules name these classes through this one
+(upstream.GoogleAPIError, upstream.ServiceUnavailable, ...) rather than
+importing them: the first attribute lookup imports the module. An except
+clause looks its classes up only when an exception reaches it, so the
+import happens on the error path, or when google.generativeai loads it for
+the first Gemini call.
+
+CircuitOpen and Saturated, which ResilientBackend raises in place of a call
+it did not make, are ServiceUnavailable errors and are defined here too, as
+is TRANSIENT_ERRORS, the errors worth retrying.
+"""
+import importlib
+import threading
+
+TRANSIENT = ('DeadlineExceeded', 'InternalServerError', 'ResourceExhausted', 'ServiceUnavailable', 'TooManyRequests')
+
+_lock = threading.Lock()
+
+
+def _load():
+    exceptions = importlib.import_module('google.api_core.exceptions')
+
+    class CircuitOpen(exceptions.ServiceUnavailable):
+        pass
+
+    class Saturated(exceptions.ServiceUnavailable):
+        pass
+
+    for error in (CircuitOpen, Saturated):
+        error.__qualname__ = error.__name__
+    names = {name: value for name, value in vars(exceptions).items()
+             if isinstance(value, type) and issubclass(value, Exception)}
+    names.update(CircuitOpen=CircuitOpen, Saturated=Saturated,
+                 TRANSIENT_ERRORS=tuple(names[name] for name in TRANSIENT))
+    return names
+
+
+def __getattr__(name):
+    # Defined once, under the lock, so every thread sees the same classes
+    with _lock:
+        if 'GoogleAPIError' not in globals():
+            globals().update(_load())
+    try:
+        return globals()[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None